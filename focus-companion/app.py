@@ -18,6 +18,7 @@ from data.storage import save_user_profile, load_user_profile, reset_user_profil
 
 # Import the assistant system
 from assistant.fallback import FallbackAssistant
+from assistant.weekly_analysis import get_week_date_range, get_week_data, analyze_weekly_patterns
 
 # Import authentication
 from auth import require_beta_access, get_user_email, logout
@@ -463,8 +464,15 @@ def main():
         st.metric("Weekly Consistency", f"{consistency:.0f}%")
         st.caption("📊 % of days you checked in this week")
     
+    # Get recent mood data
+    recent_moods = mood_data[-5:] if mood_data else []
+    recent_checkins = checkin_data[-5:] if checkin_data else []
+    
+    # Greeting, encouragement and tip are generated concurrently in one round trip
+    home_content = assistant.get_home_content(include_insights=bool(recent_moods or recent_checkins))
+    
     # Personalized greeting with enhanced styling
-    greeting = assistant.get_personalized_greeting()
+    greeting = home_content['greeting']
     if greeting:
         st.success(f"🤖 **AI Greeting:** {greeting}")
     
@@ -472,10 +480,6 @@ def main():
     st.write("---")
     st.subheader("😊 How You've Been Feeling")
     
-    # Get recent mood data
-    recent_moods = mood_data[-5:] if mood_data else []
-    recent_checkins = checkin_data[-5:] if checkin_data else []
-    
     if recent_moods or recent_checkins:
         col1, col2, col3 = st.columns(3)
         
@@ -534,13 +538,13 @@ def main():
         col1, col2 = st.columns(2)
         
         with col1:
-            encouragement = assistant.get_daily_encouragement()
+            encouragement = home_content['encouragement']
             if encouragement:
                 st.markdown("💬 **Encouragement:**")
                 st.write(encouragement)
         
         with col2:
-            tip = assistant.get_productivity_tip()
+            tip = home_content['productivity_tip']
             if tip:
                 st.markdown("💡 **Today's Tip:**")
                 st.write(tip)
@@ -592,8 +596,8 @@ def main():
                 st.success("🔓 **Admin Access**: You can access Database Insights from the sidebar or navigation.")
             else:
                 st.info("🔒 **Beta Testing**: Database Insights are admin-only during beta testing.")
-            from assistant.usage_limiter import UsageLimiter
-            usage_limiter = UsageLimiter()
+            from assistant.services import get_usage_limiter
+            usage_limiter = get_usage_limiter()
             stats = usage_limiter.get_usage_stats(user_email)
             
             with st.expander("🤖 AI Usage Statistics", expanded=False):
@@ -666,7 +670,7 @@ def main():
                         cache_stats = ai_cache.get_cache_stats()
                         if cache_stats['total_entries'] > 0:
                             st.subheader("⚡ Cache Performance")
-                            st.info(f"**Cache hits:** {cache_stats['total_entries']} entries | **Size:** {cache_stats['cache_size_mb']:.2f} MB")
+                            st.info(f"**Cache hits:** {cache_stats['hits']} ({cache_stats['hit_rate']}%) | **Entries:** {cache_stats['total_entries']} | **Size:** {cache_stats['cache_size_mb']:.2f} MB")
                             st.write("💡 *Smart caching is reducing API calls and improving response times*")
                     except Exception:
                         pass  # Silently fail if cache not available
@@ -679,12 +683,11 @@ def display_gpt_quota_badge(user_email):
         return
     
     try:
-        from assistant.usage_limiter import UsageLimiter
-        usage_limiter = UsageLimiter()
+        from assistant.services import get_usage_limiter
+        usage_limiter = get_usage_limiter()
         
         # Get user's current usage
-        user_usage = usage_limiter.db.get_user_api_usage(user_email, days=1)
-        daily_used = sum(user_usage["daily_usage"].values())
+        daily_used = usage_limiter.counter.get_counts(user_email)["user_daily"]
         daily_limit = usage_limiter.user_daily_limit
         
         # Calculate usage percentage
@@ -721,27 +724,13 @@ def generate_weekly_summary_inline(user_email, user_profile, mood_data, checkin_
         return
     
     # Get week date range
-    today = datetime.now()
-    monday = today - timedelta(days=today.weekday())
-    sunday = monday + timedelta(days=6)
-    start_date, end_date = monday.date(), sunday.date()
+    start_date, end_date = get_week_date_range()
     
     # Filter data for current week
-    week_checkins = []
-    week_moods = []
-    
-    for checkin in checkin_data:
-        checkin_date = datetime.fromisoformat(checkin['timestamp']).date()
-        if start_date <= checkin_date <= end_date:
-            week_checkins.append(checkin)
-    
-    for mood in mood_data:
-        mood_date = datetime.fromisoformat(mood['timestamp']).date()
-        if start_date <= mood_date <= end_date:
-            week_moods.append(mood)
+    week_checkins, week_moods = get_week_data(checkin_data, mood_data, start_date, end_date)
     
-    # Analyze patterns
-    week_analysis = analyze_weekly_patterns_inline(week_checkins, week_moods)
+    # Analyze patterns (shared with the weekly summary page and the batch job, so the cached summary matches)
+    week_analysis = analyze_weekly_patterns(week_checkins, week_moods)
     
     if not week_analysis or (week_analysis['total_checkins'] == 0 and week_analysis['total_mood_entries'] == 0):
         st.info("📝 **No data for this week yet!** Start your wellness journey by completing your first check-in or mood entry.")
@@ -783,64 +772,6 @@ def generate_weekly_summary_inline(user_email, user_profile, mood_data, checkin_
             st.warning("🤖 AI summary temporarily unavailable. Here's your weekly overview:")
             generate_fallback_summary_inline(week_analysis, user_profile)
 
-def analyze_weekly_patterns_inline(checkins, moods):
-    """Analyze patterns in weekly data for inline summary"""
-    if not checkins and not moods:
-        return None
-    
-    analysis = {
-        'total_checkins': len(checkins),
-        'total_mood_entries': len(moods),
-        'checkin_days': [],
-        'mood_days': [],
-        'energy_patterns': {},
-        'mood_patterns': {},
-        'time_periods': {},
-        'accomplishments': [],
-        'challenges': []
-    }
-    
-    # Analyze check-ins
-    for checkin in checkins:
-        date = datetime.fromisoformat(checkin['timestamp']).date()
-        day_name = date.strftime('%A')
-        analysis['checkin_days'].append(day_name)
-        
-        # Energy patterns
-        if 'energy_level' in checkin:
-            energy = checkin['energy_level']
-            if day_name not in analysis['energy_patterns']:
-                analysis['energy_patterns'][day_name] = []
-            analysis['energy_patterns'][day_name].append(energy)
-        
-        # Time periods
-        time_period = checkin.get('time_period', 'unknown')
-        if time_period not in analysis['time_periods']:
-            analysis['time_periods'][time_period] = 0
-        analysis['time_periods'][time_period] += 1
-        
-        # Accomplishments and challenges
-        if 'accomplishments' in checkin and checkin['accomplishments']:
-            analysis['accomplishments'].append(checkin['accomplishments'])
-        if 'challenges' in checkin and checkin['challenges']:
-            analysis['challenges'].append(checkin['challenges'])
-    
-    # Analyze mood data
-    for mood in moods:
-        date = datetime.fromisoformat(mood['timestamp']).date()
-        day_name = date.strftime('%A')
-        analysis['mood_days'].append(day_name)
-        
-        mood_type = mood.get('mood', 'unknown')
-        intensity = mood.get('intensity', 5)
-        
-        if day_name not in analysis['mood_patterns']:
-            analysis['mood_patterns'][day_name] = {'moods': [], 'intensities': []}
-        analysis['mood_patterns'][day_name]['moods'].append(mood_type)
-        analysis['mood_patterns'][day_name]['intensities'].append(intensity)
-    
-    return analysis
-
 def generate_weekly_summary_prompt_inline(user_profile, week_analysis, start_date, end_date):
     """Generate optimized prompt for inline weekly summary"""
     
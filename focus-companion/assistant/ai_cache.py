@@ -3,59 +3,262 @@ AI Cache Manager for Focus Companion
 Smart caching system to optimize API calls and reduce costs
 """
 
+import copy
 import hashlib
 import json
 import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable, Tuple
 import streamlit as st
+from .cache_keys import DEFAULT_KEY_NORMALIZERS
+from .prompt_budget import PromptSection, truncate_to_tokens
+from data.journal import JsonlJournal
 
 class AICache:
-    """Smart caching system for AI responses"""
+    """
+    Smart caching system for AI responses
     
-    def __init__(self, cache_file: str = "data/ai_cache.json", max_cache_age_hours: int = 24):
+    Two tiers: a bounded in-process LRU serves the hot set from memory, backed by a
+    small SQLite database (one row per key, indexed by expiry) where inserts are
+    single-row upserts no matter how large the cache grows. Each tier has its own
+    TTL per feature; features without one use max_cache_age_hours.
+    
+    Keys are built from each feature's normalized input (see cache_keys), so
+    requests whose prompts would come out the same share an entry. Lookups can be
+    recorded to a JSONL traffic log and replayed offline with cache_replay_cli.py.
+    
+    Features with a stale grace period keep their rows past expiry so callers can
+    serve the stale response immediately and regenerate it in the background
+    (stale-while-revalidate, see CacheRefresher).
+    """
+    
+    SWEEP_EVERY_WRITES = 500
+    SWEEP_BATCH_SIZE = 1000
+    
+    # Persistent tier: greetings follow the time of day, summaries and plans stay useful for days
+    DEFAULT_FEATURE_TTL_HOURS = {
+        'greeting': 1,
+        'encouragement': 6,
+        'productivity_tip': 6,
+        'task_planning': 72,
+        'weekly_summary': 168
+    }
+    
+    # Memory tier: shorter, so long-lived entries don't pin RAM in long-running workers
+    DEFAULT_MEMORY_TTL_HOURS = {
+        'greeting': 1,
+        'task_planning': 12,
+        'weekly_summary': 24
+    }
+    
+    # Stale-while-revalidate: how long past expiry an entry may still be served while it is refreshed
+    DEFAULT_STALE_GRACE_HOURS = {
+        'greeting': 12,
+        'encouragement': 24,
+        'productivity_tip': 24
+    }
+    
+    # Upper bounds (ms) of the lookup latency histogram buckets
+    LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, float('inf'))
+    
+    def __init__(self, cache_file: str = "data/ai_cache.json", max_cache_age_hours: int = 24,
+                 feature_ttl_hours: Dict[str, float] = None, memory_ttl_hours: Dict[str, float] = None,
+                 max_memory_entries: int = 1000, max_memory_bytes: int = 8 * 1024 * 1024,
+                 key_normalizers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+                 traffic_log: Optional[str] = None, stale_grace_hours: Dict[str, float] = None):
         self.cache_file = cache_file
         self.max_cache_age_hours = max_cache_age_hours
-        self.cache = self._load_cache()
+        self.feature_ttl_hours = {**self.DEFAULT_FEATURE_TTL_HOURS, **(feature_ttl_hours or {})}
+        self.memory_ttl_hours = {**self.DEFAULT_MEMORY_TTL_HOURS, **(memory_ttl_hours or {})}
+        self.max_memory_entries = max_memory_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.stale_grace_hours = {**self.DEFAULT_STALE_GRACE_HOURS, **(stale_grace_hours or {})}
+        self.key_normalizers = {**DEFAULT_KEY_NORMALIZERS, **(key_normalizers or {})}
+        # Recording is opt-in, e.g. FOCUS_AI_CACHE_TRAFFIC_LOG=data/ai_cache_traffic.jsonl
+        traffic_log = traffic_log or os.environ.get("FOCUS_AI_CACHE_TRAFFIC_LOG")
+        self._traffic = JsonlJournal(traffic_log) if traffic_log else None
+        # The store sits next to the legacy JSON file, which is imported on first use
+        self.db_path = os.path.splitext(cache_file)[0] + ".db"
+        self._conn = None
+        self._lock = threading.RLock()
+        self._writes_since_sweep = 0
+        # cache_key -> entry dict, least recently used first
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # In-process counters since startup
+        self._feature_stats = {}
+        self._user_stats = {}
+        self._latency_counts = [0] * len(self.LATENCY_BUCKETS_MS)
+        self._lookup_count = 0
+        self._lookup_total_ms = 0.0
+        self._swept = 0
+    
+    def _count(self, feature: str, user_email: Optional[str], **amounts):
+        """Add to the per-feature and per-user counters"""
+        for stats, key in ((self._feature_stats, feature), (self._user_stats, user_email or 'anonymous')):
+            counters = stats.setdefault(key, {
+                'hits': 0, 'misses': 0, 'stale_hits': 0, 'expirations': 0, 'evictions': 0,
+                'bytes_stored': 0, 'tokens_saved': 0, 'cost_saved_usd': 0.0
+            })
+            for name, amount in amounts.items():
+                counters[name] += amount
+    
+    def _record_latency(self, elapsed_ms: float):
+        """Add a lookup to the latency histogram"""
+        for i, bound in enumerate(self.LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self._latency_counts[i] += 1
+                break
+        self._lookup_count += 1
+        self._lookup_total_ms += elapsed_ms
+    
+    def _ttl_seconds(self, feature: str) -> float:
+        """TTL of the persistent tier for a feature"""
+        return self.feature_ttl_hours.get(feature, self.max_cache_age_hours) * 3600
+    
+    def _stale_seconds(self, feature: str) -> float:
+        """How long past expiry a feature's entries may still be served stale"""
+        return self.stale_grace_hours.get(feature, 0) * 3600
+    
+    def _memory_ttl_seconds(self, feature: str) -> float:
+        """TTL of the memory tier for a feature, never longer than the persistent one"""
+        ttl_hours = self.memory_ttl_hours.get(feature, self.feature_ttl_hours.get(feature, self.max_cache_age_hours))
+        return min(ttl_hours * 3600, self._ttl_seconds(feature))
+    
+    def _memory_put(self, cache_key: str, entry: Dict[str, Any]):
+        """Insert into the memory tier and evict least recently used entries past the caps"""
+        self._memory_discard(cache_key)
+        entry['size'] = len(entry['response'].encode('utf-8')) + len(cache_key)
+        if entry['size'] > self.max_memory_bytes:
+            return
+        self._memory[cache_key] = entry
+        self._memory_bytes += entry['size']
+        while len(self._memory) > self.max_memory_entries or self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted['size']
+            self._count(evicted['feature'], evicted['user_email'], evictions=1)
+    
+    def _memory_discard(self, cache_key: str):
+        """Remove a key from the memory tier if present"""
+        entry = self._memory.pop(cache_key, None)
+        if entry:
+            self._memory_bytes -= entry['size']
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Open the cache database on first use"""
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ai_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    feature TEXT NOT NULL,
+                    user_email TEXT,
+                    response TEXT NOT NULL,
+                    input_hash TEXT,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    tokens_used INTEGER,
+                    cost_usd REAL,
+                    stale_until REAL
+                ) WITHOUT ROWID
+            """)
+            # Stores created before token accounting and stale-while-revalidate
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(ai_cache)")]
+            for column, column_type in (("tokens_used", "INTEGER"), ("cost_usd", "REAL"), ("stale_until", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE ai_cache ADD COLUMN {column} {column_type}")
+            conn.execute("UPDATE ai_cache SET stale_until = expires_at WHERE stale_until IS NULL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_expires ON ai_cache(expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_stale_until ON ai_cache(stale_until)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_user ON ai_cache(user_email)")
+            conn.commit()
+            self._conn = conn
+            self._import_legacy_cache()
+        return self._conn
     
-    def _load_cache(self) -> Dict[str, Any]:
-        """Load cache from file"""
+    def _import_legacy_cache(self):
+        """Carry unexpired entries from the old JSON cache file into an empty store"""
+        if not os.path.exists(self.cache_file):
+            return
+        if self._conn.execute("SELECT 1 FROM ai_cache LIMIT 1").fetchone():
+            return
         try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r') as f:
-                    cache_data = json.load(f)
-                    # Clean expired entries
-                    return self._clean_expired_entries(cache_data)
+            with open(self.cache_file, 'r') as f:
+                cache_data = json.load(f)
+            rows = []
+            for key, entry in cache_data.items():
+                created_at = datetime.fromisoformat(entry['timestamp']).timestamp()
+                feature = entry.get('feature', 'unknown')
+                expires_at = created_at + self._ttl_seconds(feature)
+                rows.append((key, feature, entry.get('user_email'), entry['response'],
+                             entry.get('input_hash'), created_at, expires_at, expires_at + self._stale_seconds(feature)))
+            with self._conn:
+                self._conn.executemany("""
+                    INSERT OR IGNORE INTO ai_cache
+                        (cache_key, feature, user_email, response, input_hash, created_at, expires_at, stale_until)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
         except Exception:
-            pass
-        return {}
+            pass  # A corrupt legacy cache is simply not imported
     
-    def _save_cache(self):
-        """Save cache to file"""
+    def _sweep_expired(self, now: float) -> int:
+        """Delete one batch of entries past their stale grace period using its index"""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute("""
+                DELETE FROM ai_cache WHERE cache_key IN (
+                    SELECT cache_key FROM ai_cache WHERE stale_until <= ? LIMIT ?
+                )
+            """, (now, self.SWEEP_BATCH_SIZE))
+        return cursor.rowcount
+    
+    def purge_expired(self) -> int:
+        """Remove all entries that can no longer be served, even stale, one batch at a time"""
+        removed = 0
+        with self._lock:
+            now = time.time()
+            while True:
+                batch = self._sweep_expired(now)
+                self._swept += batch
+                removed += batch
+                if batch < self.SWEEP_BATCH_SIZE:
+                    return removed
+    
+    def register_key_normalizer(self, feature: str, normalizer: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        """Project a feature's input onto the fields that shape its prompt before it is hashed"""
+        self.key_normalizers[feature] = normalizer
+    
+    def _normalize_input(self, feature: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply the feature's key normalizer, falling back to the raw input"""
+        normalizer = self.key_normalizers.get(feature)
+        if normalizer is None:
+            return input_data
         try:
-            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
-            with open(self.cache_file, 'w') as f:
-                json.dump(self.cache, f, indent=2)
+            return normalizer(input_data)
         except Exception:
-            pass  # Silently fail if we can't save cache
+            return input_data  # Unexpected input shape: key on everything rather than fail
     
-    def _clean_expired_entries(self, cache_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Remove expired cache entries"""
-        current_time = datetime.now()
-        cleaned_cache = {}
-        
-        for key, entry in cache_data.items():
-            try:
-                cache_time = datetime.fromisoformat(entry['timestamp'])
-                if current_time - cache_time < timedelta(hours=self.max_cache_age_hours):
-                    cleaned_cache[key] = entry
-            except Exception:
-                continue  # Skip invalid entries
-        
-        return cleaned_cache
+    def cache_key(self, feature: str, user_email: str, input_data: Dict[str, Any], normalize: bool = True) -> str:
+        """The key a response to this input is cached under; requests that would share a response share it"""
+        return self._generate_cache_key(feature, user_email, input_data, normalize)
     
-    def _generate_cache_key(self, feature: str, user_email: str, input_data: Dict[str, Any]) -> str:
-        """Generate a unique cache key for the input"""
+    def _generate_cache_key(self, feature: str, user_email: str, input_data: Dict[str, Any],
+                            normalize: bool = True) -> str:
+        """Generate a cache key from the (normalized) input"""
+        if normalize:
+            input_data = self._normalize_input(feature, input_data)
+        
         # Create a normalized version of input data for consistent hashing
         normalized_data = {
             'feature': feature,
@@ -94,103 +297,294 @@ class AICache:
         cleaned_data = clean_nested_data(clean_data)
         
         # Create hash of cleaned data
-        return hashlib.md5(json.dumps(cleaned_data, sort_keys=True).encode()).hexdigest()
+        return hashlib.md5(json.dumps(cleaned_data, sort_keys=True, default=str).encode()).hexdigest()
+    
+    def _record_traffic(self, feature: str, user_email: str, input_data: Dict[str, Any]):
+        """Append a lookup to the traffic log for offline replay"""
+        try:
+            self._traffic.append({
+                'ts': time.time(),
+                'feature': feature,
+                'user_email': user_email,
+                'input': json.loads(json.dumps(input_data, default=str))
+            })
+        except (OSError, TypeError, ValueError):
+            pass  # Recording must never break a lookup
     
     def get_cached_response(self, feature: str, user_email: str, input_data: Dict[str, Any]) -> Optional[str]:
         """Get cached response if available and not expired"""
+        response, _ = self._get(feature, user_email, input_data, allow_stale=False)
+        return response
+    
+    def get_cached_or_stale(self, feature: str, user_email: str, input_data: Dict[str, Any]) -> Tuple[Optional[str], bool]:
+        """
+        Get a cached response, falling back to an expired one within the feature's stale grace period
+        Returns (response, is_stale); stale responses should be refreshed by the caller.
+        """
+        return self._get(feature, user_email, input_data, allow_stale=True)
+    
+    def _get(self, feature: str, user_email: str, input_data: Dict[str, Any], allow_stale: bool) -> Tuple[Optional[str], bool]:
+        """Look up a response and update the hit/miss counters"""
+        started = time.perf_counter()
+        if self._traffic:
+            self._record_traffic(feature, user_email, input_data)
         cache_key = self._generate_cache_key(feature, user_email, input_data)
+        now = time.time()
         
-        if cache_key in self.cache:
-            entry = self.cache[cache_key]
-            cache_time = datetime.fromisoformat(entry['timestamp'])
+        with self._lock:
+            try:
+                entry = self._lookup(cache_key, feature, user_email, now, allow_stale)
+            except sqlite3.Error:
+                entry = None
             
-            # Check if cache is still valid
-            if datetime.now() - cache_time < timedelta(hours=self.max_cache_age_hours):
-                return entry['response']
+            if entry and entry.get('stale'):
+                # No savings: the refresh makes the API call anyway, just off the request path
+                self._count(feature, user_email, hits=1, stale_hits=1)
+            elif entry:
+                self._count(feature, user_email, hits=1, tokens_saved=entry['tokens_used'] or 0,
+                            cost_saved_usd=entry['cost_usd'] or 0.0)
             else:
-                # Remove expired entry
-                del self.cache[cache_key]
-                self._save_cache()
+                self._count(feature, user_email, misses=1)
+            self._record_latency((time.perf_counter() - started) * 1000)
         
-        return None
+        if not entry:
+            return None, False
+        return entry['response'], bool(entry.get('stale'))
     
-    def cache_response(self, feature: str, user_email: str, input_data: Dict[str, Any], response: str):
-        """Cache a response"""
-        cache_key = self._generate_cache_key(feature, user_email, input_data)
+    def _lookup(self, cache_key: str, feature: str, user_email: str, now: float,
+                allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+        """Find a live entry in memory, then in the persistent store; stale ones are flagged and not promoted"""
+        # Tier one: memory
+        entry = self._memory.get(cache_key)
+        if entry:
+            if entry['expires_at'] > now:
+                self._memory.move_to_end(cache_key)
+                return entry
+            self._memory_discard(cache_key)
         
-        self.cache[cache_key] = {
+        # Tier two: persistent store; expired rows are left for the batched sweep
+        row = self._connection().execute(
+            "SELECT response, expires_at, tokens_used, cost_usd, stale_until FROM ai_cache WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        if not row:
+            return None
+        if row[1] <= now:
+            self._count(feature, user_email, expirations=1)
+            if allow_stale and row[4] is not None and row[4] > now:
+                return {'response': row[0], 'stale': True}
+            return None
+        
+        entry = {
+            'response': row[0],
+            'expires_at': min(row[1], now + self._memory_ttl_seconds(feature)),
             'feature': feature,
             'user_email': user_email,
-            'response': response,
-            'timestamp': datetime.now().isoformat(),
-            'input_hash': self._hash_input(input_data)
+            'tokens_used': row[2],
+            'cost_usd': row[3]
         }
+        self._memory_put(cache_key, entry)
+        return entry
+    
+    def cache_response(self, feature: str, user_email: str, input_data: Dict[str, Any], response: str,
+                       tokens_used: int = None, cost_usd: float = None):
+        """Cache a response, with the tokens and cost it took to generate"""
+        cache_key = self._generate_cache_key(feature, user_email, input_data)
+        now = time.time()
         
-        self._save_cache()
+        try:
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    conn.execute("""
+                        INSERT INTO ai_cache (cache_key, feature, user_email, response, input_hash,
+                                              created_at, expires_at, tokens_used, cost_usd, stale_until)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(cache_key) DO UPDATE SET
+                            response = excluded.response,
+                            input_hash = excluded.input_hash,
+                            created_at = excluded.created_at,
+                            expires_at = excluded.expires_at,
+                            tokens_used = excluded.tokens_used,
+                            cost_usd = excluded.cost_usd,
+                            stale_until = excluded.stale_until
+                    """, (cache_key, feature, user_email, response,
+                          self._hash_input(self._normalize_input(feature, input_data)),
+                          now, now + self._ttl_seconds(feature), tokens_used, cost_usd,
+                          now + self._ttl_seconds(feature) + self._stale_seconds(feature)))
+                self._memory_put(cache_key, {
+                    'response': response,
+                    'expires_at': now + self._memory_ttl_seconds(feature),
+                    'feature': feature,
+                    'user_email': user_email,
+                    'tokens_used': tokens_used,
+                    'cost_usd': cost_usd
+                })
+                self._count(feature, user_email, bytes_stored=len(response.encode('utf-8')))
+                
+                self._writes_since_sweep += 1
+                if self._writes_since_sweep >= self.SWEEP_EVERY_WRITES:
+                    self._writes_since_sweep = 0
+                    self._swept += self._sweep_expired(now)
+        except sqlite3.Error:
+            pass  # Silently fail if we can't save cache
     
     def get_cache_stats(self) -> Dict[str, Any]:
-        """Get cache statistics"""
-        total_entries = len(self.cache)
-        features = {}
-        
-        for entry in self.cache.values():
-            feature = entry.get('feature', 'unknown')
-            features[feature] = features.get(feature, 0) + 1
+        """Get cache contents plus hit/miss, savings and latency counters since startup"""
+        with self._lock:
+            rows = self._connection().execute("""
+                SELECT feature, COUNT(*), SUM(LENGTH(CAST(response AS BLOB)))
+                FROM ai_cache WHERE expires_at > ? GROUP BY feature
+            """, (time.time(),)).fetchall()
+            by_feature = copy.deepcopy(self._feature_stats)
+            by_user = copy.deepcopy(self._user_stats)
+            latency = {
+                'count': self._lookup_count,
+                'avg_ms': round(self._lookup_total_ms / self._lookup_count, 3) if self._lookup_count else 0,
+                'buckets': {
+                    (f"<= {bound} ms" if bound != float('inf') else f"> {self.LATENCY_BUCKETS_MS[-2]} ms"): count
+                    for bound, count in zip(self.LATENCY_BUCKETS_MS, self._latency_counts)
+                }
+            }
+            memory_entries = len(self._memory)
+            memory_bytes = self._memory_bytes
+            swept = self._swept
+        features = {feature: count for feature, count, _ in rows}
         
+        totals = self._sum_counters(by_feature.values())
         return {
-            'total_entries': total_entries,
+            'total_entries': sum(features.values()),
             'features': features,
-            'cache_size_mb': self._get_cache_size_mb()
+            'stored_bytes': {feature: size or 0 for feature, _, size in rows},
+            'cache_size_mb': self._get_cache_size_mb(),
+            'memory_entries': memory_entries,
+            'memory_bytes': memory_bytes,
+            'swept_expired': swept,
+            **totals,
+            'by_feature': by_feature,
+            'by_user': by_user,
+            'lookup_latency_ms': latency
         }
     
+    @staticmethod
+    def _sum_counters(counters) -> Dict[str, Any]:
+        """Total a group of counter dicts and derive the hit rate"""
+        totals = {'hits': 0, 'misses': 0, 'stale_hits': 0, 'expirations': 0, 'evictions': 0,
+                  'bytes_stored': 0, 'tokens_saved': 0, 'cost_saved_usd': 0.0}
+        for counter in counters:
+            for name in totals:
+                totals[name] += counter[name]
+        lookups = totals['hits'] + totals['misses']
+        totals['hit_rate'] = round(totals['hits'] / lookups * 100, 1) if lookups else 0
+        return totals
+    
     def _get_cache_size_mb(self) -> float:
-        """Get cache file size in MB"""
-        try:
-            if os.path.exists(self.cache_file):
-                return os.path.getsize(self.cache_file) / (1024 * 1024)
-        except Exception:
-            pass
-        return 0.0
+        """Get cache database size (including its WAL) in MB"""
+        size = 0
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size / (1024 * 1024)
     
     def clear_cache(self, user_email: str = None):
         """Clear cache for specific user or all cache"""
-        if user_email:
-            # Clear cache for specific user
-            keys_to_remove = []
-            for key, entry in self.cache.items():
-                if entry.get('user_email') == user_email:
-                    keys_to_remove.append(key)
-            
-            for key in keys_to_remove:
-                del self.cache[key]
-        else:
-            # Clear all cache
-            self.cache = {}
-        
-        self._save_cache()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                if user_email:
+                    # Clear cache for specific user
+                    conn.execute("DELETE FROM ai_cache WHERE user_email = ?", (user_email,))
+                    for key in [key for key, entry in self._memory.items() if entry['user_email'] == user_email]:
+                        self._memory_discard(key)
+                else:
+                    # Clear all cache
+                    conn.execute("DELETE FROM ai_cache")
+                    self._memory.clear()
+                    self._memory_bytes = 0
     
     def get_cache_hit_rate(self, user_email: str = None) -> Dict[str, float]:
-        """Calculate cache hit rate (requires tracking hits/misses)"""
-        # This would require additional tracking in the AI service
-        # For now, return basic stats
+        """Hit rate and tokens/dollars saved for a user, or across all users"""
+        with self._lock:
+            if user_email:
+                counters = [self._user_stats[user_email]] if user_email in self._user_stats else []
+            else:
+                counters = list(self._feature_stats.values())
+            totals = self._sum_counters(counters)
         return {
-            'total_entries': len(self.cache),
-            'estimated_savings': len(self.cache) * 0.1  # Rough estimate of API calls saved
+            'hits': totals['hits'],
+            'misses': totals['misses'],
+            'hit_rate': totals['hit_rate'],
+            'tokens_saved': totals['tokens_saved'],
+            'cost_saved_usd': totals['cost_saved_usd']
         }
 
+class CacheRefresher:
+    """
+    Regenerates stale cache entries on background threads
+    At most one refresh per cache key is in flight; further requests for a key
+    that is already being refreshed are dropped. Refresh functions run off the
+    Streamlit script thread, so they must not call st.* themselves.
+    """
+    
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-cache-refresh")
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+    
+    def submit(self, cache_key: str, refresh: Callable[[], Any]) -> Optional[Future]:
+        """Schedule a refresh unless one is already running for the key"""
+        with self._lock:
+            if cache_key in self._in_flight:
+                self.deduplicated += 1
+                return None
+            self._in_flight.add(cache_key)
+            self.scheduled += 1
+        return self._executor.submit(self._run, cache_key, refresh)
+    
+    def _run(self, cache_key: str, refresh: Callable[[], Any]):
+        """Run a refresh and release its key"""
+        try:
+            refresh()
+        except Exception:
+            with self._lock:
+                self.failed += 1
+        else:
+            with self._lock:
+                self.completed += 1
+        finally:
+            with self._lock:
+                self._in_flight.discard(cache_key)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Refresh counters and the number of refreshes in flight"""
+        with self._lock:
+            return {
+                'in_flight': len(self._in_flight),
+                'scheduled': self.scheduled,
+                'deduplicated': self.deduplicated,
+                'completed': self.completed,
+                'failed': self.failed
+            }
+
 class PromptOptimizer:
     """Optimize prompts for better token efficiency"""
     
     @staticmethod
-    def optimize_weekly_summary_prompt(user_profile: Dict, week_analysis: Dict) -> str:
-        """Create an optimized prompt for weekly summaries"""
+    def weekly_summary_sections(user_profile: Dict, week_analysis: Dict) -> List[PromptSection]:
+        """Weekly summary prompt sections; the raw cost is the same prompt with the goal in full"""
         
         # Extract only essential data
+        goal = user_profile.get('goal', 'Improve focus and productivity')
         essential_data = {
             'checkins': week_analysis['total_checkins'],
             'moods': week_analysis['total_mood_entries'],
             'active_days': len(set(week_analysis['checkin_days'])),
-            'goal': user_profile.get('goal', 'Improve focus and productivity'),
+            'goal': truncate_to_tokens(goal, 40),
             'tone': user_profile.get('tone', 'Friendly')
         }
         
@@ -207,17 +601,24 @@ class PromptOptimizer:
                 essential_data['top_mood'] = max(set(all_moods), key=all_moods.count)
         
         # Create concise prompt
-        prompt = f"""
+        def render(goal_text: str) -> str:
+            return f"""
 Analyze weekly wellness data and provide encouraging insights.
 
-User: {essential_data['goal']} | Tone: {essential_data['tone']}
+User: {goal_text} | Tone: {essential_data['tone']}
 Data: {essential_data['checkins']} check-ins, {essential_data['moods']} moods, {essential_data['active_days']} active days
-Patterns: Energy peaks on {essential_data.get('energy_days', ['N/A'])} | Top mood: {essential_data.get('top_mood', 'N/A')}
+Patterns: Energy peaks on {', '.join(essential_data.get('energy_days', ['N/A']))} | Top mood: {essential_data.get('top_mood', 'N/A')}
 
 Write 2-3 encouraging paragraphs celebrating progress and suggesting improvements.
 """
-        
-        return prompt
+        # Only the goal is compacted, so that is all the savings count
+        return [PromptSection(render(essential_data['goal']), raw=render(goal))]
+    
+    @staticmethod
+    def optimize_weekly_summary_prompt(user_profile: Dict, week_analysis: Dict) -> str:
+        """Create an optimized prompt for weekly summaries"""
+        sections = PromptOptimizer.weekly_summary_sections(user_profile, week_analysis)
+        return "\n\n".join(section.text for section in sections)
     
     @staticmethod
     def optimize_greeting_prompt(user_profile: Dict, recent_data: Dict) -> str:
@@ -260,4 +661,5 @@ Write 1-2 motivating sentences.
         return prompt
 
 # Global cache instance
-ai_cache = AICache() 
\ No newline at end of file
+ai_cache = AICache()
+cache_refresher = CacheRefresher() 
\ No newline at end of file
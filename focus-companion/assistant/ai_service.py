@@ -3,37 +3,58 @@ AI Service for Focus Companion
 Handles OpenAI API calls for personalized responses
 """
 
-import os
-import openai
-from typing import Dict, List, Optional
+import asyncio
+import time
+from typing import Any, Dict, Iterator, List, Optional, Callable, Tuple
 from datetime import datetime
 import streamlit as st
+from openai import NOT_GIVEN
 from dotenv import load_dotenv
 from .prompts import PromptTemplates
-from .usage_limiter import UsageLimiter
-from .ai_cache import ai_cache, PromptOptimizer
+from .usage_limiter import UsageLimitError
+from .ai_cache import ai_cache, cache_refresher, PromptOptimizer
+from .single_flight import ai_single_flight
+from .deadlines import ai_deadlines, DeadlineExceeded
+from .resilience import openai_resilience, CircuitOpenError
+from .scheduler import ai_scheduler, SchedulerBusy
+from .model_router import model_router
+from .structured_output import task_plan_parser
+from .prompt_budget import (
+    prompt_budget, PromptSection, truncate_to_tokens, join_free_text, summarize_moods, summarize_energy
+)
+from .services import get_openai_client, get_async_openai_client, get_usage_limiter, run_async
 
 # Load environment variables
 load_dotenv()
 
+# Errors after which callers show rule-based content rather than an error
+FALLBACK_ERRORS = (DeadlineExceeded, CircuitOpenError, SchedulerBusy)
+
+# Recorded with calls whose response failed validation (the call was still paid for)
+INVALID_OUTPUT_ERROR = "Invalid structured output"
+
 class AIService:
     """Service for handling AI-powered responses"""
     
+    # Home page content: feature -> (request builder, label used in messages, spinner text)
+    HOME_CONTENT = {
+        'greeting': ('_greeting_request', "AI greeting", "🤖 AI is crafting your personalized greeting..."),
+        'encouragement': ('_encouragement_request', "AI encouragement", "🤖 AI is crafting your daily encouragement..."),
+        'productivity_tip': ('_productivity_tip_request', "AI productivity tip", "🤖 AI is crafting your personalized productivity tip...")
+    }
+    
     def __init__(self):
-        # Initialize OpenAI client
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
+        # Shared process-wide OpenAI client (pooled keep-alive connections)
+        self.client = get_openai_client()
+        if self.client is None:
             st.warning("⚠️ OpenAI API key not found. AI features will be disabled.")
-            self.client = None
-        else:
-            self.client = openai.OpenAI(api_key=api_key)
         
-        # Initialize usage limiter
-        self.usage_limiter = UsageLimiter()
+        # Shared usage limiter and database
+        self.usage_limiter = get_usage_limiter()
     
     def is_available(self) -> bool:
-        """Check if AI service is available"""
-        return self.client is not None
+        """Check if AI service is available (configured, and OpenAI not known to be down)"""
+        return self.client is not None and not openai_resilience.breaker.is_open()
     
     def can_use_feature(self, feature: str, user_email: str = None) -> tuple[bool, str]:
         """
@@ -45,6 +66,9 @@ class AIService:
         if user_email == ADMIN_EMAIL:
             return True, "Admin user - unlimited access"
         
+        if openai_resilience.breaker.is_open():
+            return False, "AI service is temporarily unavailable"
+        
         if not self.is_available():
             return False, "AI service not available"
         
@@ -55,15 +79,303 @@ class AIService:
         # Check usage limits
         return self.usage_limiter.can_make_api_call(user_email)
     
-    def generate_personalized_greeting(self, user_profile: Dict, mood_data: List[Dict], 
-                                     checkin_data: List[Dict], user_email: str = None) -> str:
-        """Generate a personalized AI greeting"""
-        # Check if we can use this feature
-        can_use, reason = self.can_use_feature("greeting", user_email)
-        if not can_use:
-            st.warning(f"🤖 AI greeting limited: {reason}")
-            return None
+    def _chat_completion(self, feature: str, user_email: Optional[str], messages: List[Dict],
+                         max_tokens: int, temperature: float, usage: Optional[Dict] = None,
+                         tokens_saved: Optional[int] = None, validate: Callable[[str], bool] = None,
+                         response_format: Optional[Dict] = None, first_step: int = 0) -> str:
+        """
+        Run a chat completion inside a usage reservation
+        The slot is reserved before the request, committed with the actual token
+        count on success and released on failure, so concurrent sessions can't
+        overshoot the limits. Raises UsageLimitError if no slot is available.
+        If a usage dict is passed it is filled with tokens_used and cost_usd.
+        tokens_saved (by prompt compaction) is recorded with the call.
+        The feature's routed model answers; with validate, a response that fails
+        it is recorded as a failed call and escalated to the next model of the
+        feature's cascade (each attempt is its own call), and the last model's
+        response is returned regardless. response_format requests e.g. JSON mode.
+        first_step skips models already tried, e.g. by a stream.
+        """
+        models = model_router.policy(feature).models if validate else model_router.policy(feature).models[:1]
+        for step in range(min(first_step, len(models) - 1), len(models)):
+            model = models[step]
+            result, valid = self._complete_on(model, step, feature, user_email, messages, max_tokens, temperature,
+                                              usage, tokens_saved, validate, response_format)
+            if valid:
+                return result
+            escalated_to = models[step + 1] if step + 1 < len(models) else None
+            model_router.record_invalid(feature, model, escalated_to)
+        return result
+    
+    def _complete_on(self, model: str, step: int, feature: str, user_email: Optional[str], messages: List[Dict],
+                     max_tokens: int, temperature: float, usage: Optional[Dict], tokens_saved: Optional[int],
+                     validate: Callable[[str], bool] = None, response_format: Optional[Dict] = None) -> Tuple[str, bool]:
+        """One reserved, scheduled and retried chat completion on a given model; returns its text and validity"""
+        reservation, reason = self.usage_limiter.reserve_api_call(user_email, feature)
+        if reservation is None:
+            raise UsageLimitError(reason)
+        
+        try:
+            # Wait for a fair share of the process-wide request slots, then retry
+            # transient errors with backoff; an open circuit fails fast
+            with ai_scheduler.slot(user_email, feature):
+                started = time.perf_counter()
+                response = openai_resilience.call(lambda: self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    response_format=response_format or NOT_GIVEN
+                ))
+                latency_ms = (time.perf_counter() - started) * 1000
+        except Exception:
+            self.usage_limiter.release_api_call(reservation)
+            raise
         
+        model_router.record(feature, model, latency_ms, step)
+        result = response.choices[0].message.content.strip()
+        valid = validate is None or validate(result)
+        self._commit_usage(reservation, model, response.usage, latency_ms, usage, tokens_saved,
+                           error_message=None if valid else INVALID_OUTPUT_ERROR)
+        return result, valid
+    
+    async def _achat_completion(self, feature: str, user_email: Optional[str], messages: List[Dict],
+                                max_tokens: int, temperature: float, usage: Optional[Dict] = None,
+                                tokens_saved: Optional[int] = None) -> str:
+        """Async variant of _chat_completion on the shared async client; run it via services.run_async"""
+        reservation, reason = self.usage_limiter.reserve_api_call(user_email, feature)
+        if reservation is None:
+            raise UsageLimitError(reason)
+        
+        model = model_router.policy(feature).model
+        try:
+            async with ai_scheduler.aslot(user_email, feature):
+                started = time.perf_counter()
+                response = await openai_resilience.acall(lambda: get_async_openai_client().chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature
+                ))
+                latency_ms = (time.perf_counter() - started) * 1000
+        except BaseException:
+            # Includes cancellation when the call times out
+            self.usage_limiter.release_api_call(reservation)
+            raise
+        
+        model_router.record(feature, model, latency_ms)
+        return self._record_completion(reservation, model, response, latency_ms, usage, tokens_saved)
+    
+    def _record_completion(self, reservation, model: str, response, latency_ms: float, usage: Optional[Dict],
+                           tokens_saved: Optional[int] = None) -> str:
+        """Commit a reservation with the response's token counts and return its text"""
+        self._commit_usage(reservation, model, response.usage, latency_ms, usage, tokens_saved)
+        return response.choices[0].message.content.strip()
+    
+    def _commit_usage(self, reservation, model: str, response_usage, latency_ms: Optional[float],
+                      usage: Optional[Dict], tokens_saved: Optional[int] = None, error_message: Optional[str] = None):
+        """Record the API call with its model, latency, and cost from the model's prompt and completion prices"""
+        tokens_used = getattr(response_usage, 'total_tokens', None)
+        cost_usd = model_router.cost(model, getattr(response_usage, 'prompt_tokens', None),
+                                     getattr(response_usage, 'completion_tokens', None), tokens_used)
+        self.usage_limiter.commit_api_call(reservation, tokens_used=tokens_used, cost_usd=cost_usd,
+                                           tokens_saved=tokens_saved, model=model,
+                                           latency_ms=round(latency_ms) if latency_ms is not None else None,
+                                           error_message=error_message)
+        if usage is not None:
+            usage.update(tokens_used=tokens_used, cost_usd=cost_usd)
+    
+    def _chat_completion_stream(self, feature: str, user_email: Optional[str], messages: List[Dict],
+                                max_tokens: int, temperature: float, usage: Optional[Dict] = None,
+                                tokens_saved: Optional[int] = None, validate: Callable[[str], bool] = None,
+                                response_format: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Streaming variant of _chat_completion
+        The slot is reserved and the request sent before this returns, so limit and
+        connection errors surface right away. The returned iterator yields text as
+        it arrives and commits the reservation with the final token count once the
+        stream ends (also if it breaks off, since the call was made). The scheduler
+        slot is held until then too. Streams are served by the feature's first
+        model; with validate, a response that fails it is recorded as a failed
+        call and the caller re-asks the rest of the cascade.
+        """
+        reservation, reason = self.usage_limiter.reserve_api_call(user_email, feature)
+        if reservation is None:
+            raise UsageLimitError(reason)
+        
+        try:
+            ai_scheduler.acquire(user_email, feature)
+        except Exception:
+            self.usage_limiter.release_api_call(reservation)
+            raise
+        
+        model = model_router.policy(feature).model
+        started = time.perf_counter()
+        try:
+            # Only opening the stream is retried; text already shown can't be taken back
+            stream = openai_resilience.call(lambda: self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                response_format=response_format or NOT_GIVEN,
+                stream=True,
+                stream_options={"include_usage": True}
+            ))
+        except Exception:
+            ai_scheduler.release()
+            self.usage_limiter.release_api_call(reservation)
+            raise
+        
+        return self._iter_stream(reservation, feature, model, started, stream, usage, tokens_saved, validate)
+    
+    def _iter_stream(self, reservation, feature: str, model: str, started: float, stream, usage: Optional[Dict],
+                     tokens_saved: Optional[int] = None, validate: Callable[[str], bool] = None) -> Iterator[str]:
+        """Yield the text deltas of a completion stream, then free its slot and commit its usage"""
+        response_usage = None
+        parts = []
+        try:
+            for chunk in stream:
+                # With include_usage the final chunk carries the token counts and no choices
+                if chunk.usage:
+                    response_usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            ai_scheduler.release()
+            latency_ms = (time.perf_counter() - started) * 1000
+            model_router.record(feature, model, latency_ms)
+            valid = validate is None or validate("".join(parts).strip())
+            self._commit_usage(reservation, model, response_usage, latency_ms, usage, tokens_saved,
+                               error_message=None if valid else INVALID_OUTPUT_ERROR)
+    
+    def _stream_cached(self, feature: str, user_email: Optional[str], request: Dict, label: str,
+                       validate: Callable[[str], bool] = None,
+                       cacheable: Callable[[str], bool] = None) -> Optional[Iterator[str]]:
+        """
+        Stream a response, caching the complete text once the stream finishes
+        A cached response comes back whole as a single chunk, and so does one
+        that an identical stream already in flight (double clicks, other tabs)
+        is writing: only that first stream calls the API. With validate, a
+        streamed response that fails it is re-asked on the rest of the model
+        cascade; the final text goes to the cache (if cacheable) and to the
+        waiting requests, not to the stream. Returns None (after telling the
+        user why) if the request can't be made.
+        """
+        if user_email:
+            cached_response = ai_cache.get_cached_response(feature, user_email, request['input_data'])
+            if cached_response:
+                return iter([cached_response])
+        
+        key = ai_cache.cache_key(feature, user_email, request['input_data'])
+        call, leader = ai_single_flight.begin(key, feature)
+        usage = {}
+        outcome = {}
+        
+        def check(text: str) -> bool:
+            outcome['valid'] = validate(text)
+            return outcome['valid']
+        
+        def start():
+            try:
+                chunks = self._chat_completion_stream(feature, user_email, messages=request['messages'],
+                                                      max_tokens=request['max_tokens'],
+                                                      temperature=request['temperature'], usage=usage,
+                                                      tokens_saved=request.get('tokens_saved'),
+                                                      validate=check if validate else None,
+                                                      response_format=request.get('response_format'))
+                # Wait for the first token here, so the deadline covers time to first token
+                return chunks, next(chunks, None)
+            except Exception as e:
+                ai_single_flight.finish(key, call, error=e, feature=feature)
+                raise
+        
+        def stream(chunks: Iterator[str], first: Optional[str]):
+            parts = []
+            try:
+                if first is not None:
+                    parts.append(first)
+                    yield first
+                for chunk in chunks:
+                    parts.append(chunk)
+                    yield chunk
+                result = "".join(parts).strip()
+                if not outcome.get('valid', True):
+                    # Text already shown can't be escalated; ask the next models for the final answer
+                    models = model_router.policy(feature).models
+                    model_router.record_invalid(feature, models[0], models[min(1, len(models) - 1)])
+                    result = self._chat_completion(feature, user_email, messages=request['messages'],
+                                                   max_tokens=request['max_tokens'],
+                                                   temperature=request['temperature'], usage=usage,
+                                                   tokens_saved=request.get('tokens_saved'), validate=validate,
+                                                   response_format=request.get('response_format'), first_step=1)
+                if user_email and (cacheable is None or cacheable(result)):
+                    ai_cache.cache_response(feature, user_email, request['input_data'], result, **usage)
+                ai_single_flight.finish(key, call, result, feature=feature)
+            except Exception as e:
+                ai_single_flight.finish(key, call, error=e, feature=feature)
+                raise
+            finally:
+                # Closed part-way (e.g. the page was left); no-op if the call already finished
+                ai_single_flight.finish(key, call, error=RuntimeError(f"{label} stream was interrupted"),
+                                        feature=feature)
+        
+        def finish_late(started):
+            # The user already has the fallback; read the rest so the next view is cached
+            for _ in stream(*started):
+                pass
+        
+        try:
+            if not leader:
+                # Followers wait for the leader's complete text, within the same deadline
+                return iter([ai_deadlines.run(feature, call.result)])
+            return stream(*ai_deadlines.run(feature, start, on_late=finish_late))
+        except FALLBACK_ERRORS as e:
+            self._fallback_notice(label, e)
+            return None
+        except UsageLimitError as e:
+            st.warning(f"🤖 {label} limited: {e}")
+            return None
+        except Exception as e:
+            st.error(f"Error generating {label}: {str(e)}")
+            return None
+    
+    def _fallback_notice(self, label: str, error: Exception):
+        """Tell the user why a rule-based suggestion is shown instead of the AI response"""
+        if isinstance(error, CircuitOpenError):
+            st.info(f"🔌 AI is temporarily unavailable, showing a suggestion instead of the {label.lower()}")
+        elif isinstance(error, SchedulerBusy):
+            st.info(f"🚦 AI is busy right now, showing a suggestion instead of the {label.lower()}")
+        else:
+            # A missed deadline: the call keeps running and fills the cache
+            st.info(f"⏱️ {label} is taking longer than usual, showing a suggestion for now")
+    
+    def _cached_or_revalidate(self, feature: str, user_email: str, input_data: Dict, messages: List[Dict],
+                              max_tokens: int, temperature: float) -> Optional[str]:
+        """
+        Serve a cached response, even a stale one, without waiting on OpenAI
+        A stale response is returned immediately and regenerated in the background
+        so the next page view gets fresh content.
+        """
+        response, stale = ai_cache.get_cached_or_stale(feature, user_email, input_data)
+        if response and stale:
+            cache_refresher.submit(
+                ai_cache.cache_key(feature, user_email, input_data),
+                lambda: self._refresh_cached(feature, user_email, input_data, messages, max_tokens, temperature)
+            )
+        return response
+    
+    def _refresh_cached(self, feature: str, user_email: str, input_data: Dict, messages: List[Dict],
+                        max_tokens: int, temperature: float):
+        """Regenerate a cached response; runs on a worker thread, so no st.* calls"""
+        usage = {}
+        result = self._chat_completion(feature, user_email, messages=messages, max_tokens=max_tokens,
+                                       temperature=temperature, usage=usage)
+        ai_cache.cache_response(feature, user_email, input_data, result, **usage)
+    
+    def _greeting_request(self, user_profile: Dict, mood_data: List[Dict], checkin_data: List[Dict]) -> Dict:
+        """Build the greeting's cache input and chat request"""
         # Prepare context for the AI
         current_time = datetime.now()
         current_hour = current_time.hour
@@ -113,63 +425,25 @@ class AIService:
             'mood_summary': mood_summary,
             'checkin_summary': checkin_summary,
             'recent_moods': recent_moods,
-            'recent_checkins': recent_checkins
+            'recent_checkins': recent_checkins,
+            # The prompt embeds these, so a profile edit must change the cache key
+            'user_goal': user_profile.get('goal', 'Improve focus and productivity'),
+            'user_tone': user_profile.get('tone', 'Friendly')
         }
         
-        # Check cache first
-        if user_email:
-            cached_response = ai_cache.get_cached_response("greeting", user_email, recent_data)
-            if cached_response:
-                return cached_response
-
         # Use optimized prompt
         prompt = PromptOptimizer.optimize_greeting_prompt(user_profile, recent_data)
-        
-        try:
-            # Show enhanced loading feedback
-            with st.spinner("🤖 AI is crafting your personalized greeting..."):
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a supportive, encouraging assistant focused on helping users achieve their goals."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=100,
-                    temperature=0.7
-                )
-            
-            result = response.choices[0].message.content.strip()
-            
-            # Cache the response
-            if user_email:
-                ai_cache.cache_response("greeting", user_email, recent_data, result)
-            
-            # Record the API call with detailed information
-            tokens_used = response.usage.total_tokens if response.usage else None
-            cost_usd = (tokens_used * 0.000002) if tokens_used else None  # GPT-3.5-turbo pricing
-            
-            self.usage_limiter.record_api_call(
-                user_email=user_email,
-                feature="greeting",
-                tokens_used=tokens_used,
-                cost_usd=cost_usd
-            )
-            
-            return result
-            
-        except Exception as e:
-            st.error(f"Error generating AI greeting: {str(e)}")
-            return None
+        return {
+            'input_data': recent_data,
+            'messages': [
+                {"role": "system", "content": "You are a supportive, encouraging assistant focused on helping users achieve their goals."},
+                {"role": "user", "content": prompt}
+            ],
+            **model_router.sampling('greeting')
+        }
     
-    def generate_daily_encouragement(self, user_profile: Dict, mood_data: List[Dict], 
-                                   checkin_data: List[Dict], user_email: str = None) -> str:
-        """Generate personalized daily encouragement"""
-        # Check if we can use this feature
-        can_use, reason = self.can_use_feature("encouragement", user_email)
-        if not can_use:
-            st.warning(f"🤖 AI encouragement limited: {reason}")
-            return None
-        
+    def _encouragement_request(self, user_profile: Dict, mood_data: List[Dict], checkin_data: List[Dict]) -> Dict:
+        """Build the daily encouragement's cache input and chat request"""
         # Prepare recent data for analysis
         recent_data = {
             'mood_data': mood_data[-3:] if mood_data else [],
@@ -190,48 +464,17 @@ class AIService:
         
         # Add specific encouragement instructions
         prompt += "\n\nPlease provide an encouraging message (1-2 sentences) that acknowledges their progress and motivates them to continue. Keep it concise and personal."
-        
-        try:
-            # Show enhanced loading feedback
-            with st.spinner("🤖 AI is crafting your daily encouragement..."):
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are an encouraging, supportive assistant helping users stay motivated."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=80,
-                    temperature=0.7
-                )
-            
-            result = response.choices[0].message.content.strip()
-            
-            # Record the API call with detailed information
-            tokens_used = response.usage.total_tokens if response.usage else None
-            cost_usd = (tokens_used * 0.000002) if tokens_used else None  # GPT-3.5-turbo pricing
-            
-            self.usage_limiter.record_api_call(
-                user_email=user_email,
-                feature="encouragement",
-                tokens_used=tokens_used,
-                cost_usd=cost_usd
-            )
-            
-            return result
-            
-        except Exception as e:
-            st.error(f"Error generating AI encouragement: {str(e)}")
-            return None
+        return {
+            'input_data': recent_data,
+            'messages': [
+                {"role": "system", "content": "You are an encouraging, supportive assistant helping users stay motivated."},
+                {"role": "user", "content": prompt}
+            ],
+            **model_router.sampling('encouragement')
+        }
     
-    def generate_productivity_tip(self, user_profile: Dict, mood_data: List[Dict], 
-                                checkin_data: List[Dict], user_email: str = None) -> str:
-        """Generate a personalized productivity tip"""
-        # Check if we can use this feature
-        can_use, reason = self.can_use_feature("productivity_tip", user_email)
-        if not can_use:
-            st.warning(f"🤖 AI productivity tip limited: {reason}")
-            return None
-        
+    def _productivity_tip_request(self, user_profile: Dict, mood_data: List[Dict], checkin_data: List[Dict]) -> Dict:
+        """Build the productivity tip's cache input and chat request"""
         # Prepare all data for comprehensive analysis
         all_data = {
             'user_profile': user_profile,
@@ -247,39 +490,227 @@ class AIService:
         
         # Add specific tip instructions
         prompt += "\n\nPlease provide ONE specific, actionable productivity tip that considers their current situation and energy drainers. Keep it practical, implementable, and concise (2-3 sentences max)."
+        return {
+            'input_data': all_data,
+            'messages': [
+                {"role": "system", "content": "You are a productivity expert providing practical, personalized advice. Keep responses concise and actionable."},
+                {"role": "user", "content": prompt}
+            ],
+            **model_router.sampling('productivity_tip')
+        }
+    
+    def _generate_home_item(self, feature: str, user_profile: Dict, mood_data: List[Dict],
+                            checkin_data: List[Dict], user_email: str = None) -> Optional[str]:
+        """Generate one piece of home page content, served from the cache (even stale) when possible"""
+        builder, label, spinner_text = self.HOME_CONTENT[feature]
         
-        try:
-            # Show enhanced loading feedback
-            with st.spinner("🤖 AI is crafting your personalized productivity tip..."):
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a productivity expert providing practical, personalized advice. Keep responses concise and actionable."},
-                        {"role": "user", "content": prompt}
-                ],
-                    max_tokens=150,
-                    temperature=0.7
-                )
-            
-            result = response.choices[0].message.content.strip()
-            
-            # Record the API call with detailed information
-            tokens_used = response.usage.total_tokens if response.usage else None
-            cost_usd = (tokens_used * 0.000002) if tokens_used else None  # GPT-3.5-turbo pricing
-            
-            self.usage_limiter.record_api_call(
-                user_email=user_email,
-                feature="productivity_tip",
-                tokens_used=tokens_used,
-                cost_usd=cost_usd
+        # Check if we can use this feature
+        can_use, reason = self.can_use_feature(feature, user_email)
+        if not can_use:
+            st.warning(f"🤖 {label} limited: {reason}")
+            return None
+        
+        request = getattr(self, builder)(user_profile, mood_data, checkin_data)
+        
+        # Check cache first; a stale response is shown right away and refreshed in the background
+        if user_email:
+            cached_response = self._cached_or_revalidate(feature, user_email, **request)
+            if cached_response:
+                return cached_response
+        
+        def generate():
+            usage = {}
+            result = self._chat_completion(
+                feature, user_email,
+                messages=request['messages'],
+                max_tokens=request['max_tokens'],
+                temperature=request['temperature'],
+                usage=usage
             )
             
+            # Cache the response
+            if user_email:
+                ai_cache.cache_response(feature, user_email, request['input_data'], result, **usage)
             return result
+        
+        try:
+            # Show enhanced loading feedback; past the deadline the caller falls back
+            # while the call finishes in the background and caches its result
+            with st.spinner(spinner_text):
+                return ai_deadlines.run(feature, generate)
             
+        except FALLBACK_ERRORS as e:
+            self._fallback_notice(label, e)
+            return None
+        except UsageLimitError as e:
+            st.warning(f"🤖 {label} limited: {e}")
+            return None
         except Exception as e:
-            st.error(f"Error generating AI productivity tip: {str(e)}")
+            st.error(f"Error generating {label}: {str(e)}")
             return None
     
+    def generate_personalized_greeting(self, user_profile: Dict, mood_data: List[Dict], 
+                                     checkin_data: List[Dict], user_email: str = None) -> str:
+        """Generate a personalized AI greeting"""
+        return self._generate_home_item("greeting", user_profile, mood_data, checkin_data, user_email)
+    
+    def generate_daily_encouragement(self, user_profile: Dict, mood_data: List[Dict], 
+                                   checkin_data: List[Dict], user_email: str = None) -> str:
+        """Generate personalized daily encouragement"""
+        return self._generate_home_item("encouragement", user_profile, mood_data, checkin_data, user_email)
+    
+    def generate_productivity_tip(self, user_profile: Dict, mood_data: List[Dict], 
+                                checkin_data: List[Dict], user_email: str = None) -> str:
+        """Generate a personalized productivity tip"""
+        return self._generate_home_item("productivity_tip", user_profile, mood_data, checkin_data, user_email)
+    
+    def generate_home_content(self, user_profile: Dict, mood_data: List[Dict], checkin_data: List[Dict],
+                              user_email: str = None, features: List[str] = None,
+                              timeout: float = None) -> Dict[str, Optional[str]]:
+        """
+        Generate the home page's greeting, encouragement and productivity tip together
+        Cached (or stale) responses are served directly; the rest are requested
+        concurrently on the async client, each bounded by its feature's deadline
+        (capped at timeout if given), so the page waits for the slowest call instead
+        of the sum of all of them. Features that fail or miss their deadline map to
+        None; late calls keep running and cache their result for the next view.
+        """
+        features = features or list(self.HOME_CONTENT)
+        results = {}
+        pending = {}
+        
+        for feature in features:
+            builder, label, _ = self.HOME_CONTENT[feature]
+            can_use, reason = self.can_use_feature(feature, user_email)
+            if not can_use:
+                st.warning(f"🤖 {label} limited: {reason}")
+                results[feature] = None
+                continue
+            
+            request = getattr(self, builder)(user_profile, mood_data, checkin_data)
+            cached_response = self._cached_or_revalidate(feature, user_email, **request) if user_email else None
+            if cached_response:
+                results[feature] = cached_response
+            else:
+                pending[feature] = request
+        
+        if pending:
+            wait = max(self._home_deadline(feature, timeout) for feature in pending)
+            with st.spinner("🤖 AI is preparing your personalized dashboard..."):
+                outcomes = run_async(self._agenerate_many(pending, user_email, timeout), timeout=wait + 5)
+            
+            # Report and cache on the script thread; the event loop never touches st.*
+            for feature, outcome in outcomes.items():
+                label = self.HOME_CONTENT[feature][1]
+                results[feature] = None
+                if isinstance(outcome, UsageLimitError):
+                    st.warning(f"🤖 {label} limited: {outcome}")
+                elif isinstance(outcome, FALLBACK_ERRORS):
+                    self._fallback_notice(label, outcome)
+                elif isinstance(outcome, BaseException):
+                    st.error(f"Error generating {label}: {str(outcome)}")
+                else:
+                    result, usage = outcome
+                    if user_email:
+                        ai_cache.cache_response(feature, user_email, pending[feature]['input_data'], result, **usage)
+                    results[feature] = result
+        
+        return results
+    
+    @staticmethod
+    def _home_deadline(feature: str, timeout: Optional[float]) -> float:
+        """A home feature's deadline in seconds, capped at timeout"""
+        deadline = ai_deadlines.deadline(feature) or timeout or 10.0
+        return min(deadline, timeout) if timeout else deadline
+    
+    async def _agenerate_many(self, requests: Dict[str, Dict], user_email: Optional[str],
+                              timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Run independent chat requests concurrently; each maps to (result, usage) or its exception"""
+        async def generate(feature: str, request: Dict):
+            usage = {}
+            call = asyncio.ensure_future(
+                self._achat_completion(feature, user_email, messages=request['messages'],
+                                       max_tokens=request['max_tokens'], temperature=request['temperature'],
+                                       usage=usage)
+            )
+            deadline = self._home_deadline(feature, timeout)
+            try:
+                # Shielded, so a missed deadline stops the wait but not the call
+                result = await asyncio.wait_for(asyncio.shield(call), deadline)
+            except asyncio.TimeoutError:
+                ai_deadlines.record(feature, missed=True)
+                if user_email:
+                    call.add_done_callback(lambda done: self._cache_late(feature, user_email, request, done, usage))
+                raise DeadlineExceeded(f"{feature} took longer than {deadline}s")
+            except Exception:
+                ai_deadlines.record(feature, missed=False)
+                raise
+            ai_deadlines.record(feature, missed=False)
+            return result, usage
+        
+        outcomes = await asyncio.gather(*(generate(feature, request) for feature, request in requests.items()),
+                                        return_exceptions=True)
+        return dict(zip(requests, outcomes))
+    
+    def _cache_late(self, feature: str, user_email: str, request: Dict, call: asyncio.Future, usage: Dict):
+        """Cache a home page call that finished after its deadline; runs on the event loop, so no st.* calls"""
+        if call.cancelled() or call.exception() is not None:
+            return
+        try:
+            ai_cache.cache_response(feature, user_email, request['input_data'], call.result(), **usage)
+        except Exception:
+            pass
+    
+    def pregenerate_weekly_summaries(self, jobs: List[Dict], concurrency: int = 4,
+                                     force: bool = False) -> Dict[str, Tuple[str, str]]:
+        """
+        Generate weekly summaries ahead of time and store them in the AI cache
+        For weekly_summary_batch_cli.py: each job has user_email, user_profile and
+        week_analysis, and at most concurrency requests run at once. Summaries
+        already cached are skipped unless force. Makes no st.* calls. Returns each
+        user's (status, detail), status being generated, cached, skipped or failed.
+        """
+        outcomes = {}
+        pending = {}
+        for job in jobs:
+            user_email = job['user_email']
+            can_use, reason = self.can_use_feature("weekly_summary", user_email)
+            if not can_use:
+                outcomes[user_email] = ("skipped", reason)
+                continue
+            
+            request = self._weekly_summary_request(job['user_profile'], job['week_analysis'])
+            if not force and ai_cache.get_cached_response("weekly_summary", user_email, request['input_data']):
+                outcomes[user_email] = ("cached", "")
+            else:
+                pending[user_email] = request
+        
+        if pending:
+            for user_email, outcome in run_async(self._agenerate_weekly_summaries(pending, concurrency)).items():
+                if isinstance(outcome, Exception):
+                    outcomes[user_email] = ("failed", str(outcome) or type(outcome).__name__)
+                else:
+                    outcomes[user_email] = ("generated", f"{outcome['tokens_used'] or 0} tokens")
+        return outcomes
+    
+    async def _agenerate_weekly_summaries(self, requests: Dict[str, Dict], concurrency: int) -> Dict[str, Any]:
+        """Generate and cache weekly summaries, at most concurrency at a time; each user maps to its usage or exception"""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def generate(user_email: str, request: Dict):
+            async with semaphore:
+                usage = {}
+                result = await self._achat_completion("weekly_summary", user_email, messages=request['messages'],
+                                                      max_tokens=request['max_tokens'],
+                                                      temperature=request['temperature'], usage=usage,
+                                                      tokens_saved=request['tokens_saved'])
+                ai_cache.cache_response("weekly_summary", user_email, request['input_data'], result, **usage)
+                return usage
+        
+        outcomes = await asyncio.gather(*(generate(user_email, request) for user_email, request in requests.items()),
+                                        return_exceptions=True)
+        return dict(zip(requests, outcomes))
+    
     def _analyze_energy_trend(self, checkin_data: List[Dict]) -> str:
         """Analyze energy trend from check-in data"""
         if not checkin_data:
@@ -319,18 +750,18 @@ class AIService:
         prompt = PromptTemplates.mood_analysis_prompt(mood_data, user_goal)
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            return self._chat_completion(
+                "mood_analysis", None,
                 messages=[
                     {"role": "system", "content": "You are a supportive wellness assistant analyzing mood patterns to help users achieve their goals."},
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=200,
-                temperature=0.7
+                **model_router.sampling("mood_analysis")
             )
             
-            return response.choices[0].message.content.strip()
-            
+        except UsageLimitError as e:
+            st.warning(f"🤖 AI mood analysis limited: {e}")
+            return None
         except Exception as e:
             st.error(f"Error generating mood analysis: {str(e)}")
             return None
@@ -343,18 +774,18 @@ class AIService:
         prompt = PromptTemplates.focus_optimization_prompt(checkin_data, mood_data)
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            return self._chat_completion(
+                "focus_optimization", None,
                 messages=[
                     {"role": "system", "content": "You are a productivity expert providing focus optimization advice based on user patterns."},
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=150,
-                temperature=0.7
+                **model_router.sampling("focus_optimization")
             )
             
-            return response.choices[0].message.content.strip()
-            
+        except UsageLimitError as e:
+            st.warning(f"🤖 AI focus optimization limited: {e}")
+            return None
         except Exception as e:
             st.error(f"Error generating focus optimization: {str(e)}")
             return None
@@ -367,18 +798,18 @@ class AIService:
         prompt = PromptTemplates.stress_management_prompt(mood_data, checkin_data)
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            return self._chat_completion(
+                "stress_management", None,
                 messages=[
                     {"role": "system", "content": "You are a wellness expert providing stress management advice based on user patterns."},
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=150,
-                temperature=0.7
+                **model_router.sampling("stress_management")
             )
             
-            return response.choices[0].message.content.strip()
-            
+        except UsageLimitError as e:
+            st.warning(f"🤖 AI stress management advice limited: {e}")
+            return None
         except Exception as e:
             st.error(f"Error generating stress management advice: {str(e)}")
             return None
@@ -431,58 +862,103 @@ class AIService:
             all_intensities.extend(day_data['intensities'])
         avg_mood_intensity = sum(all_intensities) / len(all_intensities) if all_intensities else 5
         
+        request = self._weekly_summary_request(user_profile, week_analysis)
+
         # Check cache first
         if user_email:
-            cached_response = ai_cache.get_cached_response("weekly_summary", user_email, week_analysis)
+            cached_response = ai_cache.get_cached_response("weekly_summary", user_email, request['input_data'])
             if cached_response:
                 return cached_response
 
-        # Use optimized prompt
-        prompt = PromptOptimizer.optimize_weekly_summary_prompt(user_profile, week_analysis)
-
-        try:
-            # Show enhanced loading feedback
-            with st.spinner("🤖 AI is analyzing your weekly patterns and crafting personalized insights..."):
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a supportive wellness coach who celebrates progress and provides encouraging insights."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=400,
-                    temperature=0.8
-                )
-            result = response.choices[0].message.content.strip()
+        def generate():
+            usage = {}
+            result = self._chat_completion(
+                "weekly_summary", user_email,
+                messages=request['messages'],
+                max_tokens=request['max_tokens'],
+                temperature=request['temperature'],
+                usage=usage,
+                tokens_saved=request['tokens_saved']
+            )
             
             # Cache the response
             if user_email:
-                ai_cache.cache_response("weekly_summary", user_email, week_analysis, result)
-            
-            # Record the API call with detailed information
-            tokens_used = response.usage.total_tokens if response.usage else None
-            cost_usd = (tokens_used * 0.000002) if tokens_used else None  # GPT-3.5-turbo pricing
-            
-            self.usage_limiter.record_api_call(
-                user_email=user_email,
-                feature="weekly_summary",
-                tokens_used=tokens_used,
-                cost_usd=cost_usd
-            )
-            
+                ai_cache.cache_response("weekly_summary", user_email, request['input_data'], result, **usage)
             return result
+
+        try:
+            # Show enhanced loading feedback
+            with st.spinner("🤖 AI is analyzing your weekly patterns and crafting personalized insights..."):
+                # Identical requests already in flight (double clicks, other tabs) share one API call
+                summary_key = ai_cache.cache_key("weekly_summary", user_email, request['input_data'])
+                return ai_deadlines.run("weekly_summary",
+                                        lambda: ai_single_flight.do(summary_key, generate, feature="weekly_summary"))
             
+        except FALLBACK_ERRORS as e:
+            self._fallback_notice("Weekly summary", e)
+            return None
+        except UsageLimitError as e:
+            st.warning(f"🤖 Weekly summary limited: {e}")
+            return None
         except Exception as e:
             st.error(f"Error generating weekly summary: {str(e)}")
             return None
 
-    def generate_ai_task_plan(self, user_profile: Dict, checkin_data: Dict, mood_data: List[Dict], user_email: str = None) -> Dict:
-        """Generate AI-powered personalized task plan"""
-        # Check if we can use this feature
+    def stream_weekly_summary(self, user_profile: Dict, week_analysis: Dict, user_email: str = None) -> Optional[Iterator[str]]:
+        """Stream the weekly summary as it is written (e.g. into st.write_stream); None if unavailable"""
+        can_use, reason = self.can_use_feature("weekly_summary", user_email)
+        if not can_use:
+            st.warning(f"🤖 Weekly summary limited: {reason}")
+            return None
+        
+        return self._stream_cached("weekly_summary", user_email,
+                                   self._weekly_summary_request(user_profile, week_analysis), "Weekly summary")
+    
+    def stream_ai_task_plan(self, user_profile: Dict, checkin_data: Dict, mood_data: List[Dict],
+                            user_email: str = None) -> Optional[Iterator[str]]:
+        """
+        Stream the task plan's JSON text as it is drafted; None if unavailable
+        A draft that doesn't validate is re-asked once the stream ends, so parse
+        the joined text and, if it is unusable, take the plan from cached_task_plan().
+        """
         can_use, reason = self.can_use_feature("task_planning", user_email)
         if not can_use:
             st.warning(f"🤖 AI task planning limited: {reason}")
             return None
-
+        
+        return self._stream_cached("task_planning", user_email,
+                                   self._task_plan_request(user_profile, checkin_data, mood_data), "AI task plan",
+                                   validate=task_plan_parser.check, cacheable=self._is_task_plan)
+    
+    def cached_task_plan(self, user_profile: Dict, checkin_data: Dict, mood_data: List[Dict],
+                         user_email: str = None) -> Optional[Dict]:
+        """The cached task plan for this check-in, e.g. the re-asked answer to a streamed draft; None if not cached"""
+        if not user_email:
+            return None
+        context = self._task_plan_request(user_profile, checkin_data, mood_data)['input_data']
+        cached_response = ai_cache.get_cached_response("task_planning", user_email, context)
+        return self.parse_task_plan(cached_response, user_profile, checkin_data, mood_data) if cached_response else None
+    
+    def _weekly_summary_request(self, user_profile: Dict, week_analysis: Dict) -> Dict:
+        """Build the weekly summary's cache input and chat request"""
+        # Use optimized prompt, fitted to the feature's token budget
+        system = "You are a supportive wellness coach who celebrates progress and provides encouraging insights."
+        prompt = prompt_budget.fit("weekly_summary", PromptOptimizer.weekly_summary_sections(user_profile, week_analysis),
+                                   system=system)
+        return {
+            # The prompt embeds the goal and tone, so a profile edit must change the cache key
+            'input_data': {**week_analysis, 'user_goal': user_profile.get('goal', 'Improve focus and productivity'),
+                           'user_tone': user_profile.get('tone', 'Friendly')},
+            'messages': [
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt.text}
+            ],
+            **model_router.sampling('weekly_summary'),
+            'tokens_saved': prompt.tokens_saved
+        }
+    
+    def _task_plan_request(self, user_profile: Dict, checkin_data: Dict, mood_data: List[Dict]) -> Dict:
+        """Build the task plan's cache input and chat request"""
         # Prepare comprehensive context for the AI
         current_time = datetime.now()
         current_hour = current_time.hour
@@ -527,41 +1003,45 @@ class AIService:
             'day_progress': checkin_data.get('day_progress', 'Not specified')
         }
 
-        # Check cache first
-        if user_email:
-            cached_response = ai_cache.get_cached_response("task_planning", user_email, context)
-            if cached_response:
-                try:
-                    import json
-                    return json.loads(cached_response)
-                except:
-                    pass
-
-        # Generate AI prompt for task planning
-        prompt = f"""
-You are an expert productivity coach and life strategist who creates deeply personalized, thoughtful daily plans. Your goal is to help users feel empowered, not overwhelmed, while making meaningful progress toward their goals.
-
+        # Build the prompt from prioritized sections: free text is capped, history is
+        # summarized, and the generic guidance goes first if the prompt runs long
+        def state_section(cap: Callable[[str, int], str]) -> str:
+            return f"""
 USER CONTEXT:
-- Primary Goal: {context['user_goal']}
+- Primary Goal: {cap(context['user_goal'], 40)}
 - Communication Style: {context['user_tone']}
 - Available Time: {context['availability']}
 - Current Time: {context['time_period']} ({current_hour}:00)
-- Life Situation: {context['situation']}
+- Life Situation: {cap(context['situation'], 40)}
 
 CURRENT STATE ANALYSIS:
-- Sleep Quality: {checkin_data.get('sleep_quality', 'Not specified')}
-- Energy Level: {checkin_data.get('energy_level', 'Not specified')}
-- Emotional State: {checkin_data.get('current_feeling', 'Not specified')}
-- Day Progress: {checkin_data.get('day_progress', 'Not specified')}
-- Main Focus: {checkin_data.get('focus_today', 'Not specified')}
-
+- Sleep Quality: {context['sleep_quality']}
+- Energy Level: {context['energy_level']}
+- Emotional State: {cap(context['current_feeling'], 30)}
+- Day Progress: {context['day_progress']}
+- Main Focus: {cap(context['focus_today'], 80)}
+"""
+        
+        sections = [
+            PromptSection("You are an expert productivity coach and life strategist who creates deeply personalized, thoughtful daily plans. Your goal is to help users feel empowered, not overwhelmed, while making meaningful progress toward their goals."),
+            PromptSection(state_section(lambda text, limit: truncate_to_tokens(str(text), limit)),
+                          raw=state_section(lambda text, limit: str(text))),
+            PromptSection(f"""
+PERSONAL PREFERENCES & PATTERNS:
+- Energy Drainers (Avoid): {join_free_text(context['energy_drainers'], 40)}
+- Joy Sources (Incorporate): {join_free_text(context['joy_sources'], 40)}
+- Small Habit: {truncate_to_tokens(str(context['small_habit']), 25)}
+- Recent Moods: {summarize_moods(recent_moods)}
+- Recent Energy: {summarize_energy(recent_checkins)}
+""", priority=1, raw=f"""
 PERSONAL PREFERENCES & PATTERNS:
 - Energy Drainers (Avoid): {context['energy_drainers']}
 - Joy Sources (Incorporate): {context['joy_sources']}
 - Small Habit: {context['small_habit']}
-- Recent Mood Pattern: {[', '.join(m.get('moods', [m.get('mood', 'Unknown')])) for m in recent_moods]}
-- Recent Energy Pattern: {[c.get('energy_level', 'Unknown') for c in recent_checkins]}
-
+- Recent Mood Pattern: {recent_moods}
+- Recent Energy Pattern: {recent_checkins}
+"""),
+            PromptSection("""
 DEEP PLANNING APPROACH:
 1. **Energy-Aware Task Design**: Match task complexity to their current energy level
 2. **Emotional Intelligence**: Consider their emotional state and provide appropriate support
@@ -570,7 +1050,8 @@ DEEP PLANNING APPROACH:
 5. **Overwhelm Prevention**: Structure tasks to feel achievable, not daunting
 6. **Progress Momentum**: Design tasks that build on each other and create a sense of accomplishment
 7. **Flexibility**: Account for their availability and life situation
-
+""", priority=3),
+            PromptSection("""
 TASK BREAKDOWN STRATEGY:
 - **High Energy + Good Sleep**: Focus on complex, creative, or challenging tasks
 - **Moderate Energy**: Mix of focused work and lighter activities
@@ -578,7 +1059,8 @@ TASK BREAKDOWN STRATEGY:
 - **Poor Sleep**: Extra gentle approach with lots of self-care
 - **Stressed/Overwhelmed**: Focus on calming, grounding activities first
 - **Motivated/Accomplished**: Build on momentum with next-level tasks
-
+""", priority=2),
+            PromptSection(f"""
 CREATE A PERSONALIZED {context['time_period'].upper()} PLAN THAT:
 1. **Deeply reflects their specific focus** - Break down their main goal into 3-5 thoughtful, actionable steps
 2. **Matches their energy perfectly** - Tasks should feel right for their current state
@@ -608,49 +1090,101 @@ FORMAT: Return a JSON object with:
 }}
 
 IMPORTANT: Make each task specific to their stated focus. If they want to "work on project X," don't give generic tasks - break down what "working on project X" actually means for them right now. Consider their energy level, emotional state, and make the plan feel like it was crafted specifically for them in this moment.
-"""
+""")
+        ]
+        system = "You are an expert productivity coach and life strategist with deep empathy and understanding of human psychology. You specialize in creating thoughtful, personalized daily plans that help people feel empowered and make meaningful progress without feeling overwhelmed. You understand that productivity is deeply personal and varies greatly based on energy, emotions, life circumstances, and individual preferences. Your goal is to craft plans that feel like they were made specifically for this person in this moment."
+        prompt = prompt_budget.fit("task_planning", sections, system=system)
+        
+        return {
+            'input_data': context,
+            'messages': [
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt.text}
+            ],
+            **model_router.sampling('task_planning'),
+            # JSON mode: the response is always a JSON object (the prompt must mention JSON)
+            'response_format': {"type": "json_object"},
+            'tokens_saved': prompt.tokens_saved
+        }
+    
+    @staticmethod
+    def _is_task_plan(result: str) -> bool:
+        """Whether a response is a task plan, possibly after local repair (only those are cached)"""
+        return task_plan_parser.parse(result) is not None
+    
+    @staticmethod
+    def parse_task_plan(result: str, user_profile: Dict, checkin_data: Dict,
+                        mood_data: List[Dict] = None) -> Optional[Dict]:
+        """
+        A task plan response as a dict, repaired locally where needed
+        Missing optional fields are filled from the rule-based plan for the same
+        check-in. Returns None if the response has no usable tasks.
+        """
+        def defaults():
+            from .fallback import FallbackAssistant
+            fallback = FallbackAssistant(user_profile, mood_data or [], [checkin_data])
+            return fallback.generate_smart_task_plan(checkin_data, checkin_data.get('focus_today'))
+        
+        return task_plan_parser.parse(result, defaults=defaults)
+    
+    def generate_ai_task_plan(self, user_profile: Dict, checkin_data: Dict, mood_data: List[Dict], user_email: str = None) -> Dict:
+        """Generate AI-powered personalized task plan"""
+        # Check if we can use this feature
+        can_use, reason = self.can_use_feature("task_planning", user_email)
+        if not can_use:
+            st.warning(f"🤖 AI task planning limited: {reason}")
+            return None
+
+        request = self._task_plan_request(user_profile, checkin_data, mood_data)
+        context = request['input_data']
+
+        # Check cache first
+        if user_email:
+            cached_response = ai_cache.get_cached_response("task_planning", user_email, context)
+            if cached_response:
+                plan = self.parse_task_plan(cached_response, user_profile, checkin_data, mood_data)
+                if plan:
+                    return plan
+
+        def generate():
+            usage = {}
+            result = self._chat_completion(
+                "task_planning", user_email,
+                messages=request['messages'],
+                max_tokens=request['max_tokens'],
+                temperature=request['temperature'],
+                usage=usage,
+                tokens_saved=request['tokens_saved'],
+                response_format=request['response_format'],
+                # A plan that can't be repaired locally is re-asked on the next model of the cascade
+                validate=task_plan_parser.check
+            )
+            
+            # Only cache responses that are (or can be repaired into) a task plan
+            if user_email and self._is_task_plan(result):
+                ai_cache.cache_response("task_planning", user_email, context, result, **usage)
+            return result
 
         try:
             # Show enhanced loading feedback
             with st.spinner(f"🤖 AI is crafting your personalized {context['time_period']} plan..."):
-                response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are an expert productivity coach and life strategist with deep empathy and understanding of human psychology. You specialize in creating thoughtful, personalized daily plans that help people feel empowered and make meaningful progress without feeling overwhelmed. You understand that productivity is deeply personal and varies greatly based on energy, emotions, life circumstances, and individual preferences. Your goal is to craft plans that feel like they were made specifically for this person in this moment."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=600,
-                    temperature=0.7
-                )
-                
-                result = response.choices[0].message.content.strip()
+                # Identical requests already in flight (double clicks, other tabs) share one API call
+                plan_key = ai_cache.cache_key("task_planning", user_email, context)
+                result = ai_deadlines.run("task_planning",
+                                          lambda: ai_single_flight.do(plan_key, generate, feature="task_planning"))
                 
-                # Parse JSON response
-                try:
-                    import json
-                    task_plan = json.loads(result)
-                    
-                    # Cache the response
-                    if user_email:
-                        ai_cache.cache_response("task_planning", user_email, context, result)
-                    
-                    # Record the API call
-                    tokens_used = response.usage.total_tokens if response.usage else None
-                    cost_usd = (tokens_used * 0.000002) if tokens_used else None
-                    
-                    self.usage_limiter.record_api_call(
-                        user_email=user_email,
-                        feature="task_planning",
-                        tokens_used=tokens_used,
-                        cost_usd=cost_usd
-                    )
-                    
-                    return task_plan
-                    
-                except json.JSONDecodeError:
+                # Parse the JSON response, repairing it locally if needed
+                plan = self.parse_task_plan(result, user_profile, checkin_data, mood_data)
+                if plan is None:
                     st.error("Error parsing AI task plan response")
-                    return None
+                return plan
                 
+        except FALLBACK_ERRORS as e:
+            self._fallback_notice("AI task plan", e)
+            return None
+        except UsageLimitError as e:
+            st.warning(f"🤖 AI task planning limited: {e}")
+            return None
         except Exception as e:
             st.error(f"Error generating AI task plan: {str(e)}")
             return None 
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Cache key normalizers for Focus Companion's AI cache
+Project each feature's input onto the fields that actually shape its prompt,
+bucketing continuous values so near-identical requests share a cache entry
+"""
+
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+def time_of_day(hour: int) -> str:
+    """Bucket an hour into the same periods the prompts use"""
+    if 5 <= hour < 12:
+        return "morning"
+    elif 12 <= hour < 18:
+        return "afternoon"
+    return "evening"
+
+def intensity_bucket(intensities: List[float]) -> Optional[str]:
+    """Bucket an average mood intensity (1-10) like the greeting mood summary does"""
+    if not intensities:
+        return None
+    average = sum(intensities) / len(intensities)
+    if average >= 7:
+        return "positive"
+    elif average >= 5:
+        return "stable"
+    return "challenging"
+
+def _mood_names(entry: Dict[str, Any]) -> List[str]:
+    """Mood names of an entry in either the single-mood or multi-mood format"""
+    return entry.get('moods') or [entry.get('mood', 'Unknown')]
+
+def _with_unknown_fields(data: Dict[str, Any], known: Tuple[str, ...], normalized: Dict[str, Any]) -> Dict[str, Any]:
+    """The normalized input plus any fields the normalizer doesn't know, so different inputs can't collide"""
+    unknown = {field: value for field, value in data.items() if field not in known}
+    return {**normalized, 'unknown_fields': unknown} if unknown else normalized
+
+# Input fields each normalizer reads or deliberately leaves out of the key
+_GREETING_FIELDS = ('time_context', 'current_hour', 'mood_summary', 'checkin_summary',
+                   'recent_moods', 'recent_checkins', 'user_goal', 'user_tone')
+_WEEKLY_SUMMARY_FIELDS = ('total_checkins', 'total_mood_entries', 'checkin_days', 'mood_days', 'energy_patterns',
+                         'mood_patterns', 'time_periods', 'accomplishments', 'challenges', 'user_goal', 'user_tone')
+_TASK_PLANNING_FIELDS = ('time_period', 'current_hour', 'user_goal', 'user_tone', 'availability', 'situation',
+                        'energy_drainers', 'joy_sources', 'small_habit', 'current_checkin', 'recent_moods',
+                        'recent_checkins', 'all_checkins', 'focus_today', 'energy_level', 'current_feeling',
+                        'sleep_quality', 'day_progress')
+
+def normalize_greeting(recent_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Greeting prompts use the profile's goal and tone, the time of day and the recent mood summary"""
+    time_context = recent_data.get('time_context')
+    if time_context is None and 'current_hour' in recent_data:
+        time_context = time_of_day(recent_data['current_hour'])
+
+    mood = recent_data.get('mood_summary')
+    if not mood:
+        mood = intensity_bucket([m.get('intensity', 5) for m in recent_data.get('recent_moods', [])])
+
+    return _with_unknown_fields(recent_data, _GREETING_FIELDS, {
+        'goal': recent_data.get('user_goal'),
+        'tone': recent_data.get('user_tone'),
+        'time_of_day': time_context,
+        'mood': mood
+    })
+
+def normalize_weekly_summary(week_analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Weekly summary prompts use the profile's goal and tone, counts, active days, the first energy days and the top mood"""
+    mood_counts = {}
+    for day_data in week_analysis.get('mood_patterns', {}).values():
+        for mood in day_data.get('moods', []):
+            mood_counts[mood] = mood_counts.get(mood, 0) + 1
+    top_count = max(mood_counts.values()) if mood_counts else 0
+
+    return _with_unknown_fields(week_analysis, _WEEKLY_SUMMARY_FIELDS, {
+        'goal': week_analysis.get('user_goal'),
+        'tone': week_analysis.get('user_tone'),
+        'checkins': week_analysis.get('total_checkins', 0),
+        'moods': week_analysis.get('total_mood_entries', 0),
+        'active_days': len(set(week_analysis.get('checkin_days', []))),
+        'energy_days': list(week_analysis.get('energy_patterns', {}).keys())[:3],
+        'top_moods': sorted(mood for mood, count in mood_counts.items() if count == top_count)
+    })
+
+def normalize_task_planning(context: Dict[str, Any]) -> Dict[str, Any]:
+    """Task plan prompts use the profile, today's check-in and the last few moods and energy levels"""
+    time_period = context.get('time_period')
+    if time_period is None and 'current_hour' in context:
+        time_period = time_of_day(context['current_hour'])
+
+    return _with_unknown_fields(context, _TASK_PLANNING_FIELDS, {
+        'time_period': time_period,
+        'goal': context.get('user_goal'),
+        'tone': context.get('user_tone'),
+        'availability': context.get('availability'),
+        'situation': context.get('situation'),
+        'energy_drainers': context.get('energy_drainers'),
+        'joy_sources': context.get('joy_sources'),
+        'small_habit': context.get('small_habit'),
+        'focus_today': context.get('focus_today'),
+        'energy_level': context.get('energy_level'),
+        'current_feeling': context.get('current_feeling'),
+        'sleep_quality': context.get('sleep_quality'),
+        'day_progress': context.get('day_progress'),
+        'recent_moods': [_mood_names(m) for m in context.get('recent_moods', [])],
+        'recent_energy': [c.get('energy_level', 'Unknown') for c in context.get('recent_checkins', [])]
+    })
+
+# Features without a normalizer are hashed on their full input
+DEFAULT_KEY_NORMALIZERS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    'greeting': normalize_greeting,
+    'weekly_summary': normalize_weekly_summary,
+    'task_planning': normalize_task_planning
+}
@@ -0,0 +1,95 @@
+"""
+Deadline-bounded AI calls for Focus Companion
+A slow OpenAI response should never stall a page: past a feature's deadline the
+caller falls back to rule-based content while the call finishes in the background
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Any, Callable, Dict, Optional
+from .model_router import FEATURE_POLICIES
+
+# Latency SLO per feature in seconds, from the model routing policies
+DEFAULT_DEADLINES_SECONDS = {
+    feature: policy.latency_slo for feature, policy in FEATURE_POLICIES.items() if policy.latency_slo
+}
+
+class DeadlineExceeded(Exception):
+    """Raised when an AI call misses its feature's deadline; the call itself keeps running"""
+
+class DeadlineRunner:
+    """
+    Runs calls on worker threads and stops waiting for them at a per-feature deadline
+    Calls that miss are left to finish on their worker (so they can still fill the
+    cache for the next page view) and counted per feature as deadline misses.
+    Features without a deadline run inline on the caller's thread.
+    """
+
+    def __init__(self, deadlines: Dict[str, float] = None, max_workers: int = 8):
+        self.deadlines = {**DEFAULT_DEADLINES_SECONDS, **(deadlines or {})}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-deadline")
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def deadline(self, feature: str) -> Optional[float]:
+        """Deadline in seconds for a feature, or None if it has none"""
+        return self.deadlines.get(feature)
+
+    def record(self, feature: str, missed: bool):
+        """Count a call and whether it missed its deadline"""
+        with self._lock:
+            counters = self._stats.setdefault(feature, {'calls': 0, 'misses': 0})
+            counters['calls'] += 1
+            counters['misses'] += int(missed)
+
+    def run(self, feature: str, fn: Callable[[], Any], on_late: Callable[[Any], None] = None) -> Any:
+        """
+        Run fn, raising DeadlineExceeded if it isn't done by the feature's deadline
+        If given, on_late is called (on the worker thread) with fn's result when a
+        call that missed its deadline eventually succeeds.
+        """
+        deadline = self.deadline(feature)
+        if deadline is None:
+            self.record(feature, missed=False)
+            return fn()
+
+        future = self._executor.submit(fn)
+        try:
+            result = future.result(timeout=deadline)
+        except FuturesTimeoutError:
+            self.record(feature, missed=True)
+            if on_late is not None:
+                future.add_done_callback(lambda done: self._finish_late(done, on_late))
+            raise DeadlineExceeded(f"{feature} took longer than {deadline}s")
+        except Exception:
+            # Failed within the deadline: not a miss, the caller handles the error
+            self.record(feature, missed=False)
+            raise
+        self.record(feature, missed=False)
+        return result
+
+    @staticmethod
+    def _finish_late(future: Future, on_late: Callable[[Any], None]):
+        """Hand a late result to on_late; nobody is waiting any more, so errors are dropped"""
+        if future.exception() is not None:
+            return
+        try:
+            on_late(future.result())
+        except Exception:
+            pass
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Calls, misses and miss rate (%) per feature"""
+        with self._lock:
+            return {
+                feature: {
+                    'deadline_seconds': self.deadline(feature),
+                    'calls': counters['calls'],
+                    'misses': counters['misses'],
+                    'miss_rate': round(counters['misses'] / counters['calls'] * 100, 1) if counters['calls'] else 0
+                }
+                for feature, counters in self._stats.items()
+            }
+
+# Shared by every AIService in the process
+ai_deadlines = DeadlineRunner()
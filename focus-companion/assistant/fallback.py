@@ -48,7 +48,10 @@ class FallbackAssistant:
         if ai_encouragement:
             return ai_encouragement
         
-        # Fallback to rule-based encouragement
+        return self._rule_based_encouragement()
+    
+    def _rule_based_encouragement(self) -> str:
+        """Encouragement for the time of day when AI is not available"""
         current_hour = datetime.now().hour
         
         if 5 <= current_hour < 12:
@@ -131,7 +134,10 @@ class FallbackAssistant:
             # If AI fails, fall back to rule-based tips
             pass
         
-        # Fallback to rule-based tips
+        return self._rule_based_tip()
+    
+    def _rule_based_tip(self) -> str:
+        """A random productivity tip when AI is not available"""
         tips = [
             "💡 Try the Pomodoro Technique: 25 minutes of focused work, then a 5-minute break",
             "💡 Eliminate distractions by putting your phone in another room",
@@ -209,7 +215,10 @@ class FallbackAssistant:
         if ai_greeting:
             return ai_greeting
         
-        # Fallback to rule-based greeting
+        return self._rule_based_greeting()
+    
+    def _rule_based_greeting(self) -> str:
+        """Greeting from the time of day and tone preference when AI is not available"""
         current_hour = datetime.now().hour
         
         if 5 <= current_hour < 12:
@@ -229,6 +238,34 @@ class FallbackAssistant:
         
         return f"{time_greeting}! {tone_phrase} on your goal: {self.user_goal}"
     
+    def get_home_content(self, include_insights: bool = True) -> Dict[str, str]:
+        """
+        Get the home page greeting and, optionally, the encouragement and tip in one go
+        The AI generations run concurrently; anything AI can't provide falls back to rules.
+        """
+        # Get user email from session state if available
+        user_email = None
+        try:
+            import streamlit as st
+            user_email = st.session_state.get('user_email')
+        except:
+            pass
+        
+        features = ['greeting', 'encouragement', 'productivity_tip'] if include_insights else ['greeting']
+        try:
+            ai_content = self.ai_service.generate_home_content(
+                self.user_profile, self.mood_data, self.checkin_data, user_email, features=features
+            )
+        except Exception:
+            ai_content = {}
+        
+        content = {'greeting': ai_content.get('greeting') or self._rule_based_greeting()}
+        if include_insights:
+            content['encouragement'] = ai_content.get('encouragement') or self._rule_based_encouragement()
+            tip = ai_content.get('productivity_tip')
+            content['productivity_tip'] = tip if tip and len(tip.strip()) > 10 else self._rule_based_tip()
+        return content
+    
     def get_personalized_joy_suggestions(self) -> List[str]:
         """Get personalized suggestions based on user's joy sources"""
         suggestions = []
@@ -0,0 +1,148 @@
+"""
+Model routing for Focus Companion
+One table decides which model serves each feature, with what sampling settings
+and latency SLO, and prices every call by its prompt and completion tokens.
+Features can cascade: a cheap, fast model answers first and the request is
+escalated to the next model only when its output fails validation.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from data.journal import JsonlJournal
+
+# USD per 1M tokens: (prompt, completion)
+MODEL_PRICING = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'gpt-4o': (2.50, 10.00)
+}
+# Unknown models are priced like the old flat estimate ($2 per 1M tokens)
+DEFAULT_PRICING = (2.00, 2.00)
+
+class ModelPolicy:
+    """
+    How a feature is served
+    models is the cascade, cheapest first; latency_slo (seconds) is the deadline
+    after which callers fall back to rule-based content.
+    """
+
+    def __init__(self, models: List[str], max_tokens: int, temperature: float, latency_slo: Optional[float] = None):
+        self.models = list(models)
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.latency_slo = latency_slo
+
+    @property
+    def model(self) -> str:
+        """The first model of the cascade"""
+        return self.models[0]
+
+# The short home page texts have tight SLOs; the long summaries and plans are
+# worth waiting a little longer for
+FEATURE_POLICIES = {
+    'greeting': ModelPolicy(['gpt-4o-mini'], max_tokens=100, temperature=0.7, latency_slo=4),
+    'encouragement': ModelPolicy(['gpt-4o-mini'], max_tokens=80, temperature=0.7, latency_slo=4),
+    'productivity_tip': ModelPolicy(['gpt-4o-mini'], max_tokens=150, temperature=0.7, latency_slo=5),
+    'weekly_summary': ModelPolicy(['gpt-4o-mini'], max_tokens=400, temperature=0.8, latency_slo=15),
+    # Plans must parse as JSON; the rare malformed one is retried on the stronger model
+    'task_planning': ModelPolicy(['gpt-4o-mini', 'gpt-4o'], max_tokens=600, temperature=0.7, latency_slo=20),
+    'mood_analysis': ModelPolicy(['gpt-4o-mini'], max_tokens=200, temperature=0.7),
+    'focus_optimization': ModelPolicy(['gpt-4o-mini'], max_tokens=150, temperature=0.7),
+    'stress_management': ModelPolicy(['gpt-4o-mini'], max_tokens=150, temperature=0.7)
+}
+DEFAULT_POLICY = ModelPolicy(['gpt-4o-mini'], max_tokens=200, temperature=0.7)
+
+class ModelRouter:
+    """
+    Per-feature model policies, pricing, and a record of routing decisions
+    Observed latencies and escalations are kept per feature and model for the
+    dashboard; set FOCUS_AI_ROUTING_LOG (or routing_log) to also append every
+    decision to a JSONL file for offline tuning.
+    """
+
+    def __init__(self, policies: Dict[str, ModelPolicy] = None, pricing: Dict[str, Tuple[float, float]] = None,
+                 routing_log: Optional[str] = None):
+        self.policies = {**FEATURE_POLICIES, **(policies or {})}
+        self.pricing = {**MODEL_PRICING, **(pricing or {})}
+        routing_log = routing_log or os.environ.get("FOCUS_AI_ROUTING_LOG")
+        self._log = JsonlJournal(routing_log) if routing_log else None
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def policy(self, feature: str) -> ModelPolicy:
+        """The policy serving a feature"""
+        return self.policies.get(feature, DEFAULT_POLICY)
+
+    def sampling(self, feature: str) -> Dict[str, Any]:
+        """max_tokens and temperature for a feature's requests"""
+        policy = self.policy(feature)
+        return {'max_tokens': policy.max_tokens, 'temperature': policy.temperature}
+
+    def cost(self, model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int],
+             total_tokens: Optional[int] = None) -> Optional[float]:
+        """
+        USD cost of a call
+        Without a prompt/completion split the total is priced at the completion
+        rate, so the estimate errs high.
+        """
+        prompt_price, completion_price = self.pricing.get(model, DEFAULT_PRICING)
+        if prompt_tokens is None and completion_tokens is None:
+            return total_tokens * completion_price / 1_000_000 if total_tokens else None
+        return ((prompt_tokens or 0) * prompt_price + (completion_tokens or 0) * completion_price) / 1_000_000
+
+    def _model_stats(self, feature: str, model: str) -> Dict[str, Any]:
+        """Counters for a feature's calls to a model; call with the lock held"""
+        feature_stats = self._stats.setdefault(feature, {'calls': 0, 'escalations': 0, 'by_model': {}})
+        return feature_stats['by_model'].setdefault(model, {'calls': 0, 'invalid': 0, 'latencies': deque(maxlen=500)})
+
+    def _log_decision(self, entry: Dict[str, Any]):
+        """Append a routing decision to the routing log, if enabled"""
+        if self._log:
+            try:
+                self._log.append({'ts': time.time(), **entry})
+            except (OSError, TypeError, ValueError):
+                pass  # Logging must never break a request
+
+    def record(self, feature: str, model: str, latency_ms: float, step: int = 0):
+        """Record a routed call: its model, latency and cascade step (0 unless escalated)"""
+        with self._lock:
+            model_stats = self._model_stats(feature, model)
+            model_stats['calls'] += 1
+            model_stats['latencies'].append(latency_ms)
+            self._stats[feature]['calls'] += 1
+            self._stats[feature]['escalations'] += int(step > 0)
+        self._log_decision({'feature': feature, 'model': model, 'step': step, 'latency_ms': round(latency_ms, 1)})
+
+    def record_invalid(self, feature: str, model: str, escalated_to: Optional[str] = None):
+        """Record a response that failed validation, and the model it was escalated to"""
+        with self._lock:
+            self._model_stats(feature, model)['invalid'] += 1
+        self._log_decision({'feature': feature, 'model': model, 'invalid': True, 'escalated_to': escalated_to})
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Calls, escalations and latency (avg/p95 ms) per feature and model"""
+        with self._lock:
+            stats = {}
+            for feature, feature_stats in self._stats.items():
+                by_model = {}
+                for model, model_stats in feature_stats['by_model'].items():
+                    latencies: Deque[float] = model_stats['latencies']
+                    ordered = sorted(latencies)
+                    by_model[model] = {
+                        'calls': model_stats['calls'],
+                        'invalid': model_stats['invalid'],
+                        'avg_latency_ms': round(sum(ordered) / len(ordered), 1) if ordered else 0,
+                        'p95_latency_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1) if ordered else 0
+                    }
+                stats[feature] = {
+                    'calls': feature_stats['calls'],
+                    'escalations': feature_stats['escalations'],
+                    'by_model': by_model
+                }
+            return stats
+
+# Shared by every AIService in the process
+model_router = ModelRouter()
@@ -0,0 +1,169 @@
+"""
+Prompt token budgets for Focus Companion
+Prompts are assembled from prioritized sections and fitted under a per-feature
+input token ceiling: history is summarized into a few statistics, free text is
+capped, and optional guidance is shortened or left out (least important first)
+when a prompt runs long. The tokens this saves are recorded with each API call.
+"""
+
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+# Input token ceilings (system + user message) per feature
+DEFAULT_INPUT_TOKEN_BUDGETS = {
+    'task_planning': 900,
+    'weekly_summary': 300
+}
+
+# Section priorities: required sections are always sent; higher numbers are dropped first
+REQUIRED = 0
+
+# Chat format overhead per message (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_ENERGY_SCORES = {'Very low': 1, 'Low': 2, 'Moderate': 3, 'Good': 4, 'High': 5}
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the tokens in a text without a tokenizer
+    Each word or punctuation mark is at least one token, and long words split
+    into several; close enough to the GPT tokenizers for budgeting.
+    """
+    if not text:
+        return 0
+    return sum(1 + len(piece) // 8 for piece in _TOKEN_PATTERN.findall(text))
+
+def estimate_message_tokens(messages: List[Dict]) -> int:
+    """Estimate the input tokens of a chat request"""
+    return sum(estimate_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text at a word boundary so it fits max_tokens, marking the cut with an ellipsis"""
+    text = (text or "").strip()
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    kept = []
+    used = 1  # the ellipsis
+    for word in words:
+        cost = estimate_tokens(word)
+        if used + cost > max_tokens:
+            break
+        kept.append(word)
+        used += cost
+    return " ".join(kept).rstrip(",;:") + "…"
+
+def shorten_to_tokens(text: str, max_tokens: int) -> str:
+    """Fit text to max_tokens, dropping whole trailing lines from multi-line text (lists stay intact)"""
+    if "\n" not in text or estimate_tokens(text) <= max_tokens:
+        return truncate_to_tokens(text, max_tokens)
+    kept = []
+    used = 0
+    for line in text.splitlines():
+        cost = estimate_tokens(line)
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept).strip()
+
+def join_free_text(values, max_tokens: int) -> str:
+    """A list of user-entered items as one capped line ('None' if empty)"""
+    if isinstance(values, (list, tuple)):
+        values = ", ".join(str(value) for value in values if value)
+    return truncate_to_tokens(str(values), max_tokens) if values else "None"
+
+def summarize_moods(moods: List[Dict]) -> str:
+    """Mood history as counts and average intensity, e.g. 'Calm x2, Tired x1 (avg intensity 6.3/10)'"""
+    names = []
+    intensities = []
+    for entry in moods:
+        names.extend(entry.get('moods') or [entry.get('mood', 'Unknown')])
+        if isinstance(entry.get('intensity'), (int, float)):
+            intensities.append(entry['intensity'])
+    if not names:
+        return "No recent moods"
+    summary = ", ".join(f"{name} x{count}" for name, count in Counter(names).most_common(3))
+    if intensities:
+        summary += f" (avg intensity {sum(intensities) / len(intensities):.1f}/10)"
+    return summary
+
+def summarize_energy(checkins: List[Dict]) -> str:
+    """Energy history as a trend, e.g. 'High -> Moderate -> Low (falling)'"""
+    levels = [checkin.get('energy_level') for checkin in checkins if checkin.get('energy_level')]
+    if not levels:
+        return "No recent check-ins"
+    summary = " -> ".join(levels)
+    scores = [_ENERGY_SCORES[level] for level in levels if level in _ENERGY_SCORES]
+    if len(scores) >= 2 and scores[-1] != scores[0]:
+        summary += " (rising)" if scores[-1] > scores[0] else " (falling)"
+    return summary
+
+class PromptSection:
+    """
+    A piece of a prompt with its priority
+    raw is what the section would have cost without compaction (e.g. the full
+    history it summarizes) and is used to report the tokens saved.
+    """
+
+    def __init__(self, text: str, priority: int = REQUIRED, raw: Optional[str] = None, min_tokens: int = 12):
+        self.text = text.strip()
+        self.priority = priority
+        self.raw = raw
+        self.min_tokens = min_tokens
+
+class BudgetedPrompt:
+    """A prompt fitted to its budget, with its estimated and saved tokens"""
+
+    def __init__(self, text: str, tokens: int, raw_tokens: int, dropped: int):
+        self.text = text
+        self.tokens = tokens
+        self.raw_tokens = raw_tokens
+        self.tokens_saved = max(raw_tokens - tokens, 0)
+        self.dropped = dropped
+
+class PromptBudget:
+    """Fits prompt sections under per-feature input token ceilings"""
+
+    def __init__(self, budgets: Dict[str, int] = None):
+        self.budgets = {**DEFAULT_INPUT_TOKEN_BUDGETS, **(budgets or {})}
+
+    def ceiling(self, feature: str) -> Optional[int]:
+        """Input token ceiling for a feature, or None if it has none"""
+        return self.budgets.get(feature)
+
+    def fit(self, feature: str, sections: List[PromptSection], system: str = "") -> BudgetedPrompt:
+        """
+        Join sections into a prompt that, with the system message, fits the feature's ceiling
+        Optional sections are shortened or dropped, lowest priority (and then
+        latest) first; required sections are always kept in full.
+        """
+        texts = [section.text for section in sections]
+        overhead = estimate_tokens(system) + 2 * MESSAGE_OVERHEAD_TOKENS
+        ceiling = self.ceiling(feature)
+        dropped = 0
+
+        if ceiling is not None:
+            limit = ceiling - overhead
+            used = sum(estimate_tokens(text) for text in texts)
+            optional = [i for i, section in enumerate(sections) if section.priority != REQUIRED]
+            for i in sorted(optional, key=lambda i: (sections[i].priority, i), reverse=True):
+                if used <= limit:
+                    break
+                tokens = estimate_tokens(texts[i])
+                keep = tokens - (used - limit)
+                texts[i] = shorten_to_tokens(texts[i], keep) if keep >= sections[i].min_tokens else ""
+                if estimate_tokens(texts[i]) < sections[i].min_tokens:
+                    texts[i] = ""
+                    dropped += 1
+                used += estimate_tokens(texts[i]) - tokens
+
+        text = "\n\n".join(text for text in texts if text)
+        raw_tokens = sum(estimate_tokens(section.raw if section.raw is not None else section.text)
+                         for section in sections)
+        return BudgetedPrompt(text, estimate_tokens(text) + overhead, raw_tokens + overhead, dropped)
+
+# Shared by every AIService in the process
+prompt_budget = PromptBudget()
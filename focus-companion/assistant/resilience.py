@@ -0,0 +1,221 @@
+"""
+Retry and circuit breaker policy for OpenAI calls in Focus Companion
+Transient failures (rate limits, 5xx, dropped connections) are retried with
+jittered exponential backoff; during an outage the breaker opens so page views
+go straight to rule-based content instead of waiting on a failing upstream
+"""
+
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+import openai
+
+# HTTP statuses worth retrying; other 4xx responses fail the same way every time
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling OpenAI while the circuit breaker is open"""
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an OpenAI error is transient (connection trouble, rate limit or server error)"""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        # An exhausted quota is a 429 too, but retrying won't refill it
+        if getattr(error, 'code', None) == 'insufficient_quota':
+            return False
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    return False
+
+class RetryPolicy:
+    """
+    Bounded exponential backoff with full jitter
+    Attempt n waits a random time up to base_delay * 2**n (capped at max_delay),
+    so clients that failed together don't retry together. A Retry-After header
+    from the server takes precedence, within the same cap.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, error: Exception = None) -> float:
+        """Seconds to wait after the given (0-based) failed attempt"""
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(error: Optional[Exception]) -> Optional[float]:
+        """The Retry-After header of an error response, in seconds"""
+        response = getattr(error, 'response', None)
+        try:
+            return float(response.headers.get('retry-after'))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+    Closed: calls pass. After failure_threshold consecutive failures it opens and
+    rejects calls for reset_timeout seconds, then goes half-open and lets a single
+    probe through: success closes it, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {'opened': 0, 'rejected': 0, 'probes': 0}
+
+    def allow_request(self) -> bool:
+        """Whether a call may go ahead; in half-open state only one probe at a time"""
+        with self._lock:
+            if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._stats['probes'] += 1
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def is_open(self) -> bool:
+        """Whether calls are being rejected right now (no probe is due yet)"""
+        with self._lock:
+            return self.state == self.OPEN and self._clock() - self._opened_at < self.reset_timeout
+
+    def record_success(self):
+        """The upstream answered: close the circuit"""
+        with self._lock:
+            self.state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """The upstream failed: open the circuit at the threshold or after a failed probe"""
+        with self._lock:
+            self._consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self._stats['opened'] += 1
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """A call was abandoned before it told us anything; let another probe through"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Current state, consecutive failures and transition counters"""
+        with self._lock:
+            retry_in = self.reset_timeout - (self._clock() - self._opened_at) if self.state == self.OPEN else 0
+            return {
+                'state': self.state,
+                'consecutive_failures': self._consecutive_failures,
+                'seconds_until_probe': round(max(retry_in, 0), 1),
+                **self._stats
+            }
+
+class ResilientCaller:
+    """
+    Runs OpenAI calls under a retry policy and a circuit breaker
+    Only transient errors are retried and counted as breaker failures; any other
+    response from the API shows the upstream is up and counts as a success.
+    """
+
+    def __init__(self, retry_policy: RetryPolicy = None, breaker: CircuitBreaker = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'retries': 0, 'failed': 0, 'short_circuited': 0}
+
+    def _count(self, counter: str):
+        """Increment one of the counters"""
+        with self._lock:
+            self._stats[counter] += 1
+
+    def _admit(self):
+        """Raise CircuitOpenError unless the breaker lets this attempt through"""
+        if not self.breaker.allow_request():
+            self._count('short_circuited')
+            raise CircuitOpenError("AI service is temporarily unavailable")
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        """Record a failed attempt with the breaker and decide whether to try again"""
+        if not is_retryable(error):
+            self.breaker.record_success()
+            return False
+        self.breaker.record_failure()
+        if attempt + 1 >= self.retry_policy.max_attempts or self.breaker.is_open():
+            self._count('failed')
+            return False
+        self._count('retries')
+        return True
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Call fn, retrying transient errors; raises CircuitOpenError while the circuit is open"""
+        self._count('calls')
+        for attempt in range(self.retry_policy.max_attempts):
+            self._admit()
+            try:
+                result = fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                self._sleep(self.retry_policy.delay(attempt, e))
+                continue
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, make_call: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of call(); make_call creates a fresh awaitable per attempt"""
+        self._count('calls')
+        for attempt in range(self.retry_policy.max_attempts):
+            self._admit()
+            try:
+                result = await make_call()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self.retry_policy.delay(attempt, e))
+                continue
+            except BaseException:
+                # Cancelled: the attempt says nothing about the upstream
+                self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Call, retry and short-circuit counters plus the breaker's state"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['breaker'] = self.breaker.get_stats()
+        return stats
+
+# Shared by every AIService in the process
+openai_resilience = ResilientCaller()
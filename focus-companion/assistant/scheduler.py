@@ -0,0 +1,210 @@
+"""
+Fair scheduling of OpenAI requests for Focus Companion
+A fixed number of requests may be in flight at once across the whole process.
+Waiting requests are served by priority (interactive home page content first,
+long weekly summaries last) and round-robin between users within a priority, so
+one user regenerating plans can't starve everyone else. When the queues are full
+requests are turned away and the caller shows rule-based content instead.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Deque, Dict, Optional
+
+# Lower runs first; features not listed get DEFAULT_PRIORITY
+FEATURE_PRIORITIES = {
+    'greeting': 0,
+    'encouragement': 0,
+    'productivity_tip': 0,
+    'task_planning': 1,
+    'weekly_summary': 2
+}
+DEFAULT_PRIORITY = 1
+
+class SchedulerBusy(Exception):
+    """Raised when a request can't be queued (or waited too long) for an OpenAI slot"""
+
+class _Waiter:
+    """A queued request and how to wake it"""
+    __slots__ = ('user', 'feature', 'enqueued_at', 'wake')
+
+    def __init__(self, user: str, feature: str, wake: Callable[[], None]):
+        self.user = user
+        self.feature = feature
+        self.enqueued_at = time.perf_counter()
+        self.wake = wake
+
+class RequestScheduler:
+    """
+    Bounded, priority-aware and per-user fair admission of OpenAI requests
+    Callers hold a slot for the duration of their request (see slot() and
+    aslot()). Queues are bounded overall and per user; beyond that, or after
+    max_wait seconds in the queue, SchedulerBusy is raised.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_queued: int = 32, max_queued_per_user: int = 4,
+                 max_wait: float = 30.0, priorities: Dict[str, int] = None):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.max_wait = max_wait
+        self.priorities = {**FEATURE_PRIORITIES, **(priorities or {})}
+        self._lock = threading.Lock()
+        self._active = 0
+        # priority -> user -> that user's waiters; user order is the round-robin order
+        self._queues: Dict[int, OrderedDict] = {}
+        self._queued = 0
+        self._queued_by_user: Dict[str, int] = {}
+        self._stats = {'granted': 0, 'queued': 0, 'rejected': 0, 'timed_out': 0}
+        self._waits: Dict[str, Deque[float]] = {}
+
+    def _priority(self, feature: str) -> int:
+        """Priority of a feature's requests"""
+        return self.priorities.get(feature, DEFAULT_PRIORITY)
+
+    def _record_wait(self, feature: str, seconds: float):
+        """Remember a queue wait; call with the lock held"""
+        self._stats['granted'] += 1
+        self._waits.setdefault(feature, deque(maxlen=1000)).append(seconds)
+
+    def _enqueue(self, user_email: Optional[str], feature: str, wake: Callable[[], None]) -> Optional[_Waiter]:
+        """Take a free slot (returns None) or queue a waiter; raises SchedulerBusy if the queues are full"""
+        user = user_email or "anonymous"
+        with self._lock:
+            if self._active < self.max_concurrent and not self._queued:
+                self._active += 1
+                self._record_wait(feature, 0.0)
+                return None
+
+            if self._queued >= self.max_queued or self._queued_by_user.get(user, 0) >= self.max_queued_per_user:
+                self._stats['rejected'] += 1
+                raise SchedulerBusy("AI is busy right now")
+
+            waiter = _Waiter(user, feature, wake)
+            users = self._queues.setdefault(self._priority(feature), OrderedDict())
+            users.setdefault(user, deque()).append(waiter)
+            self._count_queued(user, 1)
+            self._stats['queued'] += 1
+            return waiter
+
+    def _count_queued(self, user: str, change: int):
+        """Adjust the overall and per-user queue depth; call with the lock held"""
+        self._queued += change
+        remaining = self._queued_by_user.get(user, 0) + change
+        if remaining:
+            self._queued_by_user[user] = remaining
+        else:
+            self._queued_by_user.pop(user, None)
+
+    def _cancel(self, waiter: _Waiter) -> bool:
+        """Remove a waiter that gave up; False if it was granted a slot meanwhile"""
+        with self._lock:
+            users = self._queues.get(self._priority(waiter.feature), {})
+            queue = users.get(waiter.user)
+            if not queue or waiter not in queue:
+                return False
+            queue.remove(waiter)
+            if not queue:
+                del users[waiter.user]
+            self._count_queued(waiter.user, -1)
+            self._stats['timed_out'] += 1
+            return True
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """Pop the next waiter: highest priority, then the user served longest ago; call with the lock held"""
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            if users:
+                user, queue = next(iter(users.items()))
+                waiter = queue.popleft()
+                # Rotate the user to the back of the round-robin order
+                del users[user]
+                if queue:
+                    users[user] = queue
+                self._count_queued(user, -1)
+                return waiter
+        return None
+
+    def release(self):
+        """Free a slot, handing it straight to the next waiter if there is one"""
+        with self._lock:
+            waiter = self._next_waiter()
+            if waiter is None:
+                self._active -= 1
+                return
+            self._record_wait(waiter.feature, time.perf_counter() - waiter.enqueued_at)
+        waiter.wake()
+
+    def acquire(self, user_email: Optional[str], feature: str):
+        """Block until this request may call OpenAI; pair with release()"""
+        granted = threading.Event()
+        waiter = self._enqueue(user_email, feature, granted.set)
+        if waiter is not None and not granted.wait(self.max_wait):
+            if self._cancel(waiter):
+                raise SchedulerBusy("AI is busy right now")
+            # Granted just as we gave up: use the slot
+
+    @contextmanager
+    def slot(self, user_email: Optional[str], feature: str):
+        """Hold a slot for the duration of the block"""
+        self.acquire(user_email, feature)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, user_email: Optional[str], feature: str):
+        """Async slot(): waits on the event loop instead of blocking it"""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enqueue(user_email, feature, wake)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(granted), self.max_wait)
+            except asyncio.TimeoutError:
+                if self._cancel(waiter):
+                    raise SchedulerBusy("AI is busy right now")
+                await granted
+            except asyncio.CancelledError:
+                if not self._cancel(waiter):
+                    # The slot was handed over already; give it back
+                    self.release()
+                raise
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Slots in use, queue depths, admission counters and queue waits per feature (ms)"""
+        with self._lock:
+            waits = {}
+            for feature, samples in self._waits.items():
+                ordered = sorted(samples)
+                waits[feature] = {
+                    'requests': len(ordered),
+                    'avg_ms': round(sum(ordered) / len(ordered) * 1000, 1),
+                    'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+                    'max_ms': round(ordered[-1] * 1000, 1)
+                }
+            return {
+                'active': self._active,
+                'max_concurrent': self.max_concurrent,
+                'queued': self._queued,
+                'granted': self._stats['granted'],
+                'queued_total': self._stats['queued'],
+                'rejected': self._stats['rejected'],
+                'timed_out': self._stats['timed_out'],
+                'wait_by_feature': waits
+            }
+
+# Shared by every AIService in the process
+ai_scheduler = RequestScheduler()
@@ -0,0 +1,117 @@
+"""
+Process-wide service registry for Focus Companion
+One OpenAI client, usage limiter and database handle shared by every session,
+so pages can create AIService objects on each rerun without new TLS
+connections or schema DDL
+"""
+
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Optional
+import httpx
+import openai
+from dotenv import load_dotenv
+from .usage_limiter import UsageLimiter
+
+# Load environment variables
+load_dotenv()
+
+# Connection pool of the shared OpenAI client: a few concurrent sessions, kept
+# alive between page views so requests skip the TCP/TLS handshake
+HTTP_MAX_CONNECTIONS = 20
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 120
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+# The SDK's own retries are off: resilience.py retries with jitter and feeds the
+# circuit breaker, and stacking both would multiply the attempts per call
+
+_lock = threading.Lock()
+_openai_client = None
+_async_openai_client = None
+_event_loop = None
+_usage_limiter = None
+
+def _http_limits() -> httpx.Limits:
+    """Connection pool limits shared by the sync and async clients"""
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS
+    )
+
+def get_openai_client() -> Optional[openai.OpenAI]:
+    """The shared OpenAI client, or None when no API key is configured"""
+    global _openai_client
+    if _openai_client is None:
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            return None
+        with _lock:
+            if _openai_client is None:
+                _openai_client = openai.OpenAI(
+                    api_key=api_key,
+                    max_retries=0,
+                    http_client=openai.DefaultHttpxClient(limits=_http_limits(), timeout=HTTP_TIMEOUT)
+                )
+    return _openai_client
+
+def get_async_openai_client() -> Optional[openai.AsyncOpenAI]:
+    """
+    The shared async OpenAI client, or None when no API key is configured
+    Its connections belong to the registry's event loop, so only await it in
+    coroutines passed to run_async().
+    """
+    global _async_openai_client
+    if _async_openai_client is None:
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            return None
+        with _lock:
+            if _async_openai_client is None:
+                _async_openai_client = openai.AsyncOpenAI(
+                    api_key=api_key,
+                    max_retries=0,
+                    http_client=openai.DefaultAsyncHttpxClient(limits=_http_limits(), timeout=HTTP_TIMEOUT)
+                )
+    return _async_openai_client
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """The registry's event loop, running on a daemon thread"""
+    global _event_loop
+    with _lock:
+        if _event_loop is None or _event_loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="ai-event-loop", daemon=True).start()
+            _event_loop = loop
+        return _event_loop
+
+def run_async(coroutine: Awaitable, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the shared event loop and wait for its result from a sync caller"""
+    future = asyncio.run_coroutine_threadsafe(coroutine, _get_event_loop())
+    return future.result(timeout)
+
+def get_database():
+    """The shared database manager (the one behind data.storage)"""
+    from data.storage import db
+    return db
+
+def get_usage_limiter() -> UsageLimiter:
+    """The shared usage limiter, backed by the shared database"""
+    global _usage_limiter
+    if _usage_limiter is None:
+        with _lock:
+            if _usage_limiter is None:
+                _usage_limiter = UsageLimiter(db=get_database())
+    return _usage_limiter
+
+def reset_services():
+    """Drop the shared clients and limiter, e.g. after the API key changes"""
+    global _openai_client, _async_openai_client, _usage_limiter
+    with _lock:
+        client, _openai_client, _usage_limiter = _openai_client, None, None
+        async_client, _async_openai_client = _async_openai_client, None
+    if client is not None:
+        client.close()
+    if async_client is not None:
+        run_async(async_client.close(), timeout=5)
@@ -0,0 +1,89 @@
+"""
+Single-flight request coalescing for Focus Companion
+Concurrent identical AI requests share one OpenAI call instead of each being billed
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, Optional, Tuple
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait on the same future and get its result (or its exception).
+    Keys are released as soon as the call finishes, so later callers start a
+    new call; results that should outlive the call belong in AICache.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, feature: str, name: str):
+        """Add to a feature's counters"""
+        counters = self._stats.setdefault(feature, {'calls': 0, 'executed': 0, 'coalesced': 0, 'failed': 0})
+        counters[name] += 1
+
+    def begin(self, key: str, feature: str = 'unknown') -> Tuple[Future, bool]:
+        """
+        Join the call in flight for the key, or start one
+        Returns the call's future and whether this caller leads it. The leader
+        must end the call with finish(), e.g. once a streamed response is
+        complete; the others wait on the future.
+        """
+        with self._lock:
+            self._count(feature, 'calls')
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+                self._count(feature, 'executed')
+            else:
+                self._count(feature, 'coalesced')
+        return future, leader
+
+    def finish(self, key: str, future: Future, result: Any = None, error: Optional[BaseException] = None,
+               feature: str = 'unknown'):
+        """End a call started with begin(), handing its result (or error) to the waiting callers"""
+        with self._lock:
+            if future.done():
+                return
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+            if error is not None:
+                self._count(feature, 'failed')
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, fn: Callable[[], Any], feature: str = 'unknown', timeout: Optional[float] = None) -> Any:
+        """Run fn for the key, or wait for the call already in flight and share its result"""
+        future, leader = self.begin(key, feature)
+        if not leader:
+            return future.result(timeout)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, future, error=e, feature=feature)
+            raise
+        self.finish(key, future, result, feature=feature)
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Calls, executions and coalesced waits per feature, plus totals"""
+        with self._lock:
+            by_feature = {feature: dict(counters) for feature, counters in self._stats.items()}
+            in_flight = len(self._in_flight)
+        totals = {'calls': 0, 'executed': 0, 'coalesced': 0, 'failed': 0}
+        for counters in by_feature.values():
+            for name in totals:
+                totals[name] += counters[name]
+        return {**totals, 'in_flight': in_flight, 'by_feature': by_feature}
+
+# Shared by every AIService in the process
+ai_single_flight = SingleFlight()
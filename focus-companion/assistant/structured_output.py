@@ -0,0 +1,190 @@
+"""
+Structured output for Focus Companion
+Task plans are requested in JSON mode and checked against a small schema. A
+response that doesn't parse or fit is repaired locally first: code fences and
+surrounding prose are stripped, trailing commas removed, list fields given as
+text split into items, and missing optional fields filled from the rule-based
+plan. Only a response that is still unusable is worth asking the model again.
+"""
+
+import json
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Field -> (type, required); optional fields missing from a response are filled from defaults
+TASK_PLAN_SCHEMA = {
+    'tasks': (list, True),
+    'recommendations': (list, False),
+    'estimated_duration': (str, False),
+    'priority_order': (str, False),
+    'personalized_note': (str, False)
+}
+
+# Keys models use for the text of a task given as an object
+_TEXT_KEYS = ('task', 'title', 'description', 'name', 'text')
+
+_FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+_BULLET_PATTERN = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+def _loads_object(text: str) -> Optional[Dict]:
+    """Parse text as a JSON object, or None"""
+    try:
+        value = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
+
+def _strip_fences(text: str) -> str:
+    """The contents of a ```json code block, if there is one"""
+    match = _FENCE_PATTERN.search(text)
+    return match.group(1) if match else text
+
+def _extract_object(text: str) -> str:
+    """The outermost {...} of text, dropping prose around it"""
+    start, end = text.find("{"), text.rfind("}")
+    return text[start:end + 1] if start != -1 and end > start else text
+
+def _remove_trailing_commas(text: str) -> str:
+    """Drop commas right before a closing brace or bracket"""
+    return _TRAILING_COMMA_PATTERN.sub(r"\1", text)
+
+# Tried in order until the text parses
+_JSON_REPAIRS = (
+    ('code_fence', _strip_fences),
+    ('surrounding_text', _extract_object),
+    ('trailing_comma', _remove_trailing_commas)
+)
+
+def repair_json(text: str) -> Tuple[Optional[Dict], List[str]]:
+    """
+    Parse a JSON object from model output, repairing the usual slips
+    Returns the object (None if it is beyond repair) and the repairs it needed.
+    """
+    text = (text or "").strip()
+    repairs = []
+    value = _loads_object(text)
+    for name, repair in _JSON_REPAIRS:
+        if value is not None:
+            break
+        repaired = repair(text)
+        if repaired != text:
+            text = repaired
+            repairs.append(name)
+            value = _loads_object(text)
+    return value, repairs
+
+def _as_text(item: Any) -> str:
+    """A list item as plain text; objects give their task/title/... field"""
+    if isinstance(item, dict):
+        item = next((item[key] for key in _TEXT_KEYS if isinstance(item.get(key), str)), "")
+    return item.strip() if isinstance(item, str) else (str(item) if isinstance(item, (int, float)) else "")
+
+def partial_list(text: str, field: str) -> List[str]:
+    """
+    The complete items of a list field in JSON that is still being written
+    Lets a streamed response be shown item by item before it can be parsed.
+    """
+    text = text or ""
+    match = re.search(r'"%s"\s*:\s*\[' % re.escape(field), text)
+    if not match:
+        return []
+    decoder = json.JSONDecoder()
+    items, pos = [], match.end()
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text) or text[pos] == "]":
+            return items
+        try:
+            value, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            return items  # The item is still being written
+        item = _as_text(value)
+        if item:
+            items.append(item)
+
+def fit_schema(value: Dict, schema: Dict[str, Tuple[type, bool]],
+               defaults: Callable[[], Dict] = None) -> Tuple[Optional[Dict], List[str]]:
+    """
+    Coerce a parsed object to a schema
+    Returns the conforming object (None if a required field is missing or empty)
+    and the repairs it needed. defaults is only called when a field needs it.
+    """
+    result = dict(value)
+    repairs = []
+    default_values = None
+    for field, (kind, required) in schema.items():
+        item = value.get(field)
+        if kind is list:
+            if isinstance(item, str):
+                item = [_BULLET_PATTERN.sub("", line) for line in item.splitlines()]
+                repairs.append(f'{field}_as_list')
+            if isinstance(item, list):
+                item = [text for text in map(_as_text, item) if text]
+        elif kind is str and isinstance(item, (int, float)):
+            item = str(item)
+
+        if isinstance(item, kind) and item:
+            result[field] = item
+        elif required:
+            return None, repairs
+        else:
+            if default_values is None:
+                default_values = defaults() if defaults else {}
+            if field in default_values:
+                result[field] = default_values[field]
+                repairs.append(f'default_{field}')
+            else:
+                result.pop(field, None)
+    return result, repairs
+
+class StructuredOutputParser:
+    """
+    Parses model responses against a schema, repairing locally where it can
+    check() is meant for fresh model responses and counts how many were valid
+    as sent, repaired, or unusable (and which repairs were needed) for the
+    dashboard; parse() turns a response, e.g. a cached one, into its object.
+    """
+
+    def __init__(self, schema: Dict[str, Tuple[type, bool]]):
+        self.schema = schema
+        self._lock = threading.Lock()
+        self._stats = {'responses': 0, 'valid': 0, 'repaired': 0, 'invalid': 0}
+        self._repairs: Dict[str, int] = {}
+
+    def _parse(self, text: str, defaults: Callable[[], Dict] = None) -> Tuple[Optional[Dict], List[str]]:
+        """The repaired object (or None) and the repairs it needed"""
+        value, repairs = repair_json(text)
+        if value is None:
+            return None, repairs
+        value, schema_repairs = fit_schema(value, self.schema, defaults)
+        return value, repairs + schema_repairs
+
+    def parse(self, text: str, defaults: Callable[[], Dict] = None) -> Optional[Dict]:
+        """The response as an object that fits the schema, or None if it can't be repaired"""
+        return self._parse(text, defaults)[0]
+
+    def check(self, text: str) -> bool:
+        """Whether a model response is usable, possibly after repair; the outcome is counted"""
+        value, repairs = self._parse(text)
+        with self._lock:
+            self._stats['responses'] += 1
+            if value is None:
+                self._stats['invalid'] += 1
+            elif repairs:
+                self._stats['repaired'] += 1
+            else:
+                self._stats['valid'] += 1
+            for repair in repairs:
+                self._repairs[repair] = self._repairs.get(repair, 0) + 1
+        return value is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Responses checked, how many were valid, repaired or invalid, and repair counts"""
+        with self._lock:
+            return {**self._stats, 'repairs': dict(self._repairs)}
+
+# Shared by every AIService in the process
+task_plan_parser = StructuredOutputParser(TASK_PLAN_SCHEMA)
@@ -5,18 +5,243 @@ Controls OpenAI API usage to manage costs and prevent abuse
 
 import json
 import os
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
 import streamlit as st
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from data.database import DatabaseManager
 
+class UsageLimitError(Exception):
+    """Raised when an API call is refused because a usage limit is reached"""
+
+class UsageReservation:
+    """A quota slot held for an in-flight API call"""
+    
+    def __init__(self, user_email: Optional[str], feature: str):
+        self.id = uuid.uuid4().hex
+        self.user_email = user_email
+        self.feature = feature
+        self.created_at = time.monotonic()
+
+class UsageCounter:
+    """
+    In-memory rolling day/month API call counters, global and per user
+    Seeded from the api_usage table and reconciled against it periodically,
+    so limit checks are dictionary lookups instead of SQL aggregations
+    """
+    
+    def __init__(self, db: DatabaseManager, reconcile_interval: float = 300):
+        self.db = db
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.RLock()
+        self._day = None
+        self._month = None
+        self._global_day = 0
+        self._global_month = 0
+        self._user_day: Dict[str, int] = {}
+        self._user_month: Dict[str, int] = {}
+        self._last_reconciled = None
+        self._reservations: Dict[str, UsageReservation] = {}
+        self._committing = set()           # Reservation ids whose write is in progress
+        self._committed_meanwhile = None   # Users of calls recorded while a reconcile query runs
+        self._reconcile_lock = threading.Lock()  # One reconcile at a time, without blocking counter reads
+    
+    @staticmethod
+    def _current_periods() -> tuple:
+        """Current UTC day and month keys, matching the api_usage timestamps"""
+        now = datetime.now(timezone.utc)
+        return now.strftime("%Y-%m-%d"), now.strftime("%Y-%m")
+    
+    def reconcile(self):
+        """Rebuild the counters from the api_usage table"""
+        with self._reconcile_lock:
+            self._reconcile()
+    
+    def _reconcile(self):
+        """Rebuild the counters (caller holds the reconcile lock, not the counter lock)"""
+        # Calls committed while the query runs may be missing from it; they are replayed on top
+        with self._lock:
+            self._committed_meanwhile = []
+        try:
+            day, month = self._current_periods()
+            rows = self.db.get_api_call_counts(since=f"{month}-01")
+        except Exception:
+            with self._lock:
+                self._committed_meanwhile = None
+            raise
+        
+        user_day, user_month = {}, {}
+        for user_email, date, count in rows:
+            user_month[user_email] = user_month.get(user_email, 0) + count
+            if date == day:
+                user_day[user_email] = user_day.get(user_email, 0) + count
+        
+        with self._lock:
+            self._day, self._month = day, month
+            self._user_day, self._user_month = user_day, user_month
+            self._global_day = sum(user_day.values())
+            self._global_month = sum(user_month.values())
+            self._last_reconciled = time.monotonic()
+            
+            # A replayed call the query did see is counted twice until the next reconcile, erring on the safe side
+            committed, self._committed_meanwhile = self._committed_meanwhile, None
+            for user_email in committed:
+                self._add(user_email, 1)
+            
+            # In-flight reservations aren't in the table yet but still hold their slots
+            for reservation in self._reservations.values():
+                self._add(reservation.user_email, 1)
+    
+    def _add(self, user_email: Optional[str], delta: int):
+        """Adjust global and per-user counts (caller holds the lock)"""
+        self._global_day = max(0, self._global_day + delta)
+        self._global_month = max(0, self._global_month + delta)
+        if user_email:
+            self._user_day[user_email] = max(0, self._user_day.get(user_email, 0) + delta)
+            self._user_month[user_email] = max(0, self._user_month.get(user_email, 0) + delta)
+    
+    def _counted(self, user_email: Optional[str]):
+        """Count one recorded call (caller holds the lock)"""
+        self._add(user_email, 1)
+        if self._committed_meanwhile is not None:
+            self._committed_meanwhile.append(user_email)
+    
+    def _reconcile_if_due(self) -> bool:
+        """
+        Reconcile when due (caller must not hold the counter lock)
+        Returns True if the counters were rebuilt from the database. One thread
+        reconciles while the others keep using the current counts, except before
+        the first load, which everyone waits for.
+        """
+        if not self._reconcile_due():
+            return False
+        if not self._reconcile_lock.acquire(blocking=self._last_reconciled is None):
+            return False
+        try:
+            if not self._reconcile_due():
+                return False
+            self._reconcile()
+            return True
+        finally:
+            self._reconcile_lock.release()
+    
+    def _reconcile_due(self) -> bool:
+        """Whether the counters have never been loaded or are older than the reconcile interval"""
+        return self._last_reconciled is None or time.monotonic() - self._last_reconciled >= self.reconcile_interval
+    
+    def _roll_over(self):
+        """Start new day/month buckets when the period changes (caller holds the lock)"""
+        day, month = self._current_periods()
+        if month != self._month:
+            self._month = month
+            self._global_month = 0
+            self._user_month = {}
+        if day != self._day:
+            self._day = day
+            self._global_day = 0
+            self._user_day = {}
+    
+    def _counts(self, user_email: Optional[str]) -> Dict[str, int]:
+        """Snapshot of the counts (caller holds the lock)"""
+        counts = {
+            "global_daily": self._global_day,
+            "global_monthly": self._global_month
+        }
+        if user_email:
+            counts["user_daily"] = self._user_day.get(user_email, 0)
+            counts["user_monthly"] = self._user_month.get(user_email, 0)
+        return counts
+    
+    def get_counts(self, user_email: str = None) -> Dict[str, int]:
+        """Current call counts for today and this month, including in-flight reservations"""
+        self._reconcile_if_due()
+        with self._lock:
+            self._roll_over()
+            return self._counts(user_email)
+    
+    def increment(self, user_email: str):
+        """Count one API call that has already been written to the database"""
+        if self._reconcile_if_due():
+            return  # The rebuilt counters already include this call
+        with self._lock:
+            self._roll_over()
+            self._counted(user_email)
+    
+    def reserve(self, user_email: Optional[str], feature: str,
+                check: Callable[[Dict[str, int]], Tuple[bool, str]]) -> Tuple[Optional[UsageReservation], str]:
+        """
+        Atomically check limits and take a slot
+        Returns (reservation, reason); reservation is None when the check fails
+        """
+        self._reconcile_if_due()
+        with self._lock:
+            self._roll_over()
+            allowed, reason = check(self._counts(user_email))
+            if not allowed:
+                return None, reason
+            
+            reservation = UsageReservation(user_email, feature)
+            self._reservations[reservation.id] = reservation
+            self._add(user_email, 1)
+            return reservation, reason
+    
+    def commit(self, reservation: UsageReservation, write: Callable[[], bool]):
+        """
+        Turn a reservation into a recorded call
+        write() persists the call and returns False if nothing was recorded. It
+        runs outside the lock; the reservation keeps holding its slot until then.
+        """
+        with self._lock:
+            if reservation.id not in self._reservations or reservation.id in self._committing:
+                return  # Already committed, being committed, or released
+            self._committing.add(reservation.id)
+        
+        recorded = False
+        try:
+            recorded = write()
+        finally:
+            with self._lock:
+                self._committing.discard(reservation.id)
+                self._reservations.pop(reservation.id, None)
+                # The reservation already counted the call; swap it for the recorded one or give it back
+                self._add(reservation.user_email, -1)
+                if recorded:
+                    self._counted(reservation.user_email)
+    
+    def release(self, reservation: UsageReservation):
+        """Give a reserved slot back without recording a call"""
+        with self._lock:
+            if reservation.id in self._committing:
+                return  # Its commit settles the slot
+            if self._reservations.pop(reservation.id, None) is not None:
+                self._add(reservation.user_email, -1)
+    
+    def pending_reservations(self) -> int:
+        """Number of reservations currently held"""
+        with self._lock:
+            return len(self._reservations)
+
+# One counter per database file, shared by every UsageLimiter in the process
+_counters: Dict[str, UsageCounter] = {}
+_counters_lock = threading.Lock()
+
+def get_usage_counter(db: DatabaseManager) -> UsageCounter:
+    """Get the process-wide counter for a database"""
+    key = os.path.abspath(db.db_path)
+    with _counters_lock:
+        if key not in _counters:
+            _counters[key] = UsageCounter(db)
+        return _counters[key]
+
 class UsageLimiter:
     """Manages API usage limits and tracking"""
     
-    def __init__(self, usage_file: str = "data/usage_tracking.json"):
+    def __init__(self, usage_file: str = "data/usage_tracking.json", db: DatabaseManager = None):
         self.usage_file = usage_file
         self.daily_limit = 100  # API calls per day (5 users × 20 calls)
         self.monthly_limit = 2000  # API calls per month (5 users × 400 calls)
@@ -24,7 +249,8 @@ class UsageLimiter:
         self.user_monthly_limit = 400  # API calls per user per month
         
         # Initialize database manager
-        self.db = DatabaseManager()
+        self.db = db or DatabaseManager()
+        self.counter = get_usage_counter(self.db)
         
     def _load_usage_data(self) -> Dict:
         """Load usage tracking data from file"""
@@ -82,35 +308,74 @@ class UsageLimiter:
         if user_email == ADMIN_EMAIL:
             return True, "Admin user - unlimited access"
         
-        # Get usage from database
-        global_usage = self.db.get_global_api_usage(days=1)  # Today
-        global_monthly = self.db.get_global_api_usage(days=30)  # This month
-        
+        return self._check_limits(self.counter.get_counts(user_email), user_email)
+    
+    def _check_limits(self, counts: Dict[str, int], user_email: str = None) -> tuple[bool, str]:
+        """Compare current counts against the global and per-user limits"""
         # Check global daily limit
-        today_usage = sum(global_usage["daily_usage"].values())
-        if today_usage >= self.daily_limit:
+        if counts["global_daily"] >= self.daily_limit:
             return False, f"Daily API limit reached ({self.daily_limit} calls)"
         
         # Check global monthly limit
-        monthly_usage = sum(global_monthly["monthly_usage"].values())
-        if monthly_usage >= self.monthly_limit:
+        if counts["global_monthly"] >= self.monthly_limit:
             return False, f"Monthly API limit reached ({self.monthly_limit} calls)"
         
         # Check user-specific limits
         if user_email:
-            user_usage = self.db.get_user_api_usage(user_email, days=1)
-            user_monthly = self.db.get_user_api_usage(user_email, days=30)
-            
-            user_daily = sum(user_usage["daily_usage"].values())
-            if user_daily >= self.user_daily_limit:
+            if counts["user_daily"] >= self.user_daily_limit:
                 return False, f"Your daily limit reached ({self.user_daily_limit} calls)"
             
-            user_monthly_total = sum(user_monthly["monthly_usage"].values())
-            if user_monthly_total >= self.user_monthly_limit:
+            if counts["user_monthly"] >= self.user_monthly_limit:
                 return False, f"Your monthly limit reached ({self.user_monthly_limit} calls)"
         
         return True, "API call allowed"
     
+    def reserve_api_call(self, user_email: str = None, feature: str = "unknown") -> tuple[Optional[UsageReservation], str]:
+        """
+        Atomically check the limits and reserve a slot for one API call
+        Returns (reservation, reason); reservation is None if a limit is reached.
+        Every reservation must be finished with commit_api_call or release_api_call.
+        """
+        # Admin user bypass - unlimited access for testing
+        ADMIN_EMAIL = "joanapnpinto@gmail.com"
+        if user_email == ADMIN_EMAIL:
+            check = lambda counts: (True, "Admin user - unlimited access")
+        else:
+            check = lambda counts: self._check_limits(counts, user_email)
+        
+        return self.counter.reserve(user_email, feature, check)
+    
+    def commit_api_call(self, reservation: UsageReservation, tokens_used: int = None, cost_usd: float = None,
+                        tokens_saved: int = None, model: str = None, latency_ms: int = None,
+                        error_message: str = None):
+        """
+        Record a reserved API call that completed, with its actual tokens, cost,
+        tokens saved by prompt compaction, model and latency
+        A call whose response was unusable is still paid for; pass error_message
+        to record it as failed.
+        """
+        def write():
+            if not reservation.user_email:
+                return False
+            self.db.record_api_usage(
+                user_email=reservation.user_email,
+                feature=reservation.feature,
+                tokens_used=tokens_used,
+                cost_usd=cost_usd,
+                success=error_message is None,
+                error_message=error_message,
+                tokens_saved=tokens_saved,
+                model=model,
+                latency_ms=latency_ms
+            )
+            return True
+        
+        self.counter.commit(reservation, write)
+    
+    def release_api_call(self, reservation: UsageReservation):
+        """Release a reserved slot after the API call failed"""
+        self.counter.release(reservation)
+    
     def record_api_call(self, user_email: str = None, feature: str = "unknown", 
                        tokens_used: int = None, cost_usd: float = None):
         """Record that an API call was made"""
@@ -122,31 +387,31 @@ class UsageLimiter:
                 cost_usd=cost_usd,
                 success=True
             )
+            self.counter.increment(user_email)
     
     def get_usage_stats(self, user_email: str = None) -> Dict:
         """Get current usage statistics"""
-        # Get global stats
-        global_usage = self.db.get_global_api_usage(days=1)
+        # Call counts come from the in-memory counters; costs still need the database
+        counts = self.counter.get_counts(user_email)
         global_monthly = self.db.get_global_api_usage(days=30)
         
         stats = {
             "global": {
-                "daily_used": sum(global_usage["daily_usage"].values()),
+                "daily_used": counts["global_daily"],
                 "daily_limit": self.daily_limit,
-                "monthly_used": sum(global_monthly["monthly_usage"].values()),
+                "monthly_used": counts["global_monthly"],
                 "monthly_limit": self.monthly_limit,
                 "total_cost": global_monthly["total_cost"]
             }
         }
         
         if user_email:
-            user_usage = self.db.get_user_api_usage(user_email, days=1)
             user_monthly = self.db.get_user_api_usage(user_email, days=30)
             
             stats["user"] = {
-                "daily_used": sum(user_usage["daily_usage"].values()),
+                "daily_used": counts["user_daily"],
                 "daily_limit": self.user_daily_limit,
-                "monthly_used": sum(user_monthly["monthly_usage"].values()),
+                "monthly_used": counts["user_monthly"],
                 "monthly_limit": self.user_monthly_limit,
                 "total_cost": user_monthly["total_cost"],
                 "feature_usage": user_monthly["feature_usage"]
@@ -0,0 +1,99 @@
+"""
+Weekly analysis for Focus Companion
+Builds the week's activity summary that weekly summaries are generated from.
+The weekly summary page, the inline summary on the home page and the batch
+pre-generation job all use it, so they ask for (and cache) the same summary.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+def get_week_date_range(today: datetime = None):
+    """Get the date range for the current week, or the week of today (Monday to Sunday)"""
+    today = today or datetime.now()
+    # Find Monday of current week
+    monday = today - timedelta(days=today.weekday())
+    # Find Sunday of current week
+    sunday = monday + timedelta(days=6)
+    return monday.date(), sunday.date()
+
+def get_week_data(checkin_data, mood_data, start_date, end_date):
+    """Filter data for the current week"""
+    week_checkins = []
+    week_moods = []
+    
+    for checkin in checkin_data:
+        checkin_date = datetime.fromisoformat(checkin['timestamp']).date()
+        if start_date <= checkin_date <= end_date:
+            week_checkins.append(checkin)
+    
+    for mood in mood_data:
+        mood_date = datetime.fromisoformat(mood['timestamp']).date()
+        if start_date <= mood_date <= end_date:
+            week_moods.append(mood)
+    
+    return week_checkins, week_moods
+
+def analyze_weekly_patterns(checkins, moods):
+    """Analyze patterns in weekly data"""
+    if not checkins and not moods:
+        return None
+    
+    analysis = {
+        'total_checkins': len(checkins),
+        'total_mood_entries': len(moods),
+        'checkin_days': [],
+        'mood_days': [],
+        'energy_patterns': {},
+        'mood_patterns': {},
+        'time_periods': {},
+        'accomplishments': [],
+        'challenges': []
+    }
+    
+    # Analyze check-ins
+    for checkin in checkins:
+        date = datetime.fromisoformat(checkin['timestamp']).date()
+        day_name = date.strftime('%A')
+        analysis['checkin_days'].append(day_name)
+        
+        # Energy patterns
+        if 'energy_level' in checkin:
+            energy = checkin['energy_level']
+            if day_name not in analysis['energy_patterns']:
+                analysis['energy_patterns'][day_name] = []
+            analysis['energy_patterns'][day_name].append(energy)
+        
+        # Time periods
+        time_period = checkin.get('time_period', 'unknown')
+        if time_period not in analysis['time_periods']:
+            analysis['time_periods'][time_period] = 0
+        analysis['time_periods'][time_period] += 1
+        
+        # Accomplishments and challenges
+        if 'accomplishments' in checkin and checkin['accomplishments']:
+            analysis['accomplishments'].append(checkin['accomplishments'])
+        if 'challenges' in checkin and checkin['challenges']:
+            analysis['challenges'].append(checkin['challenges'])
+    
+    # Analyze mood data
+    for mood in moods:
+        date = datetime.fromisoformat(mood['timestamp']).date()
+        day_name = date.strftime('%A')
+        analysis['mood_days'].append(day_name)
+        
+        mood_type = mood.get('mood', 'unknown')
+        intensity = mood.get('intensity', 5)
+        
+        if day_name not in analysis['mood_patterns']:
+            analysis['mood_patterns'][day_name] = {'moods': [], 'intensities': []}
+        analysis['mood_patterns'][day_name]['moods'].append(mood_type)
+        analysis['mood_patterns'][day_name]['intensities'].append(intensity)
+    
+    return analysis
+
+def build_week_analysis(checkin_data: List[Dict], mood_data: List[Dict], today: datetime = None) -> Optional[Dict]:
+    """The analysis of the current week (or the week of today), or None if it has no activity"""
+    start_date, end_date = get_week_date_range(today)
+    week_checkins, week_moods = get_week_data(checkin_data, mood_data, start_date, end_date)
+    return analyze_weekly_patterns(week_checkins, week_moods)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Command-line replay of recorded AI cache traffic
+Compares the hit rate of raw input keys with normalized keys
+"""
+
+import sys
+import os
+import argparse
+from typing import Dict, Any, List
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from data.journal import JsonlJournal
+from assistant.ai_cache import AICache
+
+def replay_traffic(records: List[Dict[str, Any]], cache: AICache, normalize: bool) -> Dict[str, Dict[str, int]]:
+    """Replay lookups against a simulated cache honouring per-feature TTLs; returns hits/misses per feature"""
+    expires = {}
+    results = {}
+    for record in sorted(records, key=lambda r: r['ts']):
+        feature = record['feature']
+        key = cache.cache_key(feature, record.get('user_email'), record['input'], normalize=normalize)
+        counters = results.setdefault(feature, {'hits': 0, 'misses': 0})
+        if expires.get(key, 0) > record['ts']:
+            counters['hits'] += 1
+        else:
+            # A miss generates a response that is cached from then on
+            counters['misses'] += 1
+            expires[key] = record['ts'] + cache._ttl_seconds(feature)
+    return results
+
+def hit_rate(counters: Dict[str, int]) -> float:
+    """Hit rate in percent"""
+    lookups = counters['hits'] + counters['misses']
+    return round(counters['hits'] / lookups * 100, 1) if lookups else 0
+
+def compare_keys(records: List[Dict[str, Any]], cache: AICache) -> Dict[str, Dict[str, Any]]:
+    """Hit rate per feature with raw and normalized keys"""
+    raw = replay_traffic(records, cache, normalize=False)
+    normalized = replay_traffic(records, cache, normalize=True)
+    report = {}
+    for feature in sorted(raw):
+        report[feature] = {
+            'lookups': raw[feature]['hits'] + raw[feature]['misses'],
+            'raw_hit_rate': hit_rate(raw[feature]),
+            'normalized_hit_rate': hit_rate(normalized[feature]),
+            'calls_saved': normalized[feature]['hits'] - raw[feature]['hits']
+        }
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Focus Companion AI Cache Replay')
+    parser.add_argument('traffic_log', help='Traffic log recorded with FOCUS_AI_CACHE_TRAFFIC_LOG')
+    parser.add_argument('--feature', '-f', help='Only replay one feature')
+
+    args = parser.parse_args()
+
+    records = JsonlJournal(args.traffic_log).read_entries()
+    if args.feature:
+        records = [r for r in records if r['feature'] == args.feature]
+    if not records:
+        print("❌ No recorded lookups to replay")
+        return
+
+    # Keys and TTLs only; nothing is read from or written to the cache store
+    report = compare_keys(records, AICache())
+
+    print("🔁 AI Cache Key Replay")
+    print("=" * 60)
+    print(f"{'Feature':<20}{'Lookups':>10}{'Raw':>10}{'Normalized':>12}{'Saved':>8}")
+    for feature, row in report.items():
+        print(f"{feature:<20}{row['lookups']:>10}{row['raw_hit_rate']:>9}%"
+              f"{row['normalized_hit_rate']:>11}%{row['calls_saved']:>8}")
+
+    lookups = sum(row['lookups'] for row in report.values())
+    saved = sum(row['calls_saved'] for row in report.values())
+    print("=" * 60)
+    print(f"✅ {saved} more of {lookups} lookups served from cache with normalized keys")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Database concurrency benchmark for Focus Companion
+Simulates concurrent Streamlit sessions loading a page and compares the
+legacy connect-per-call / rollback-journal setup with the pooled WAL manager
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.database import DatabaseManager
+
+class LegacyDatabaseManager(DatabaseManager):
+    """DatabaseManager behaving like the pre-pooling implementation"""
+
+    @contextmanager
+    def connection(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("PRAGMA journal_mode = DELETE")
+            yield conn
+        conn.close()
+
+def seed_database(db: DatabaseManager, users: int, entries_per_user: int):
+    """Populate the database with mood logs, check-ins and API usage"""
+    with db.connection() as conn:
+        for u in range(users):
+            email = f"user{u}@example.com"
+            conn.execute("INSERT OR REPLACE INTO user_profiles (user_email, goal, tone) VALUES (?, ?, ?)",
+                         (email, "Improve focus and productivity", "Friendly"))
+            conn.executemany(
+                "INSERT INTO mood_logs (user_email, mood, intensity, notes, created_at) "
+                "VALUES (?, ?, ?, ?, datetime('now', ?))",
+                [(email, "😊 Happy", random.randint(1, 10), "benchmark", f"-{i % 300} days")
+                 for i in range(entries_per_user)]
+            )
+            conn.executemany(
+                "INSERT INTO checkins (user_email, time_period, energy_level, created_at) "
+                "VALUES (?, ?, ?, datetime('now', ?))",
+                [(email, "morning", "Good", f"-{i % 300} days") for i in range(entries_per_user)]
+            )
+            conn.executemany(
+                "INSERT INTO api_usage (user_email, feature, tokens_used, cost_usd, created_at) "
+                "VALUES (?, ?, ?, ?, datetime('now', ?))",
+                [(email, "greeting", 100, 0.0002, f"-{i % 30} days") for i in range(entries_per_user)]
+            )
+
+def page_load(db: DatabaseManager, email: str, write: bool):
+    """The queries a typical page issues on a rerun"""
+    db.get_user_profile(email)
+    db.get_mood_logs(email, days=365)
+    db.get_checkins(email, days=365)
+    db.get_user_api_usage(email, days=1)
+    if write:
+        db.record_api_usage(email, "greeting", tokens_used=100, cost_usd=0.0002)
+
+def run_sessions(db: DatabaseManager, sessions: int, loads_per_session: int, users: int, write_ratio: float):
+    """Run concurrent sessions and collect per-page-load latencies in milliseconds"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(sessions)
+
+    def session(index: int):
+        rng = random.Random(index)
+        local = []
+        start_barrier.wait()
+        for _ in range(loads_per_session):
+            email = f"user{rng.randrange(users)}@example.com"
+            started = time.perf_counter()
+            try:
+                page_load(db, email, rng.random() < write_ratio)
+            except sqlite3.Error as e:
+                errors.append(str(e))
+                continue
+            local.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    wall_start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall_start
+    return latencies, errors, wall
+
+def summarize(label: str, latencies, errors, wall):
+    """Print latency percentiles for one run"""
+    ordered = sorted(latencies)
+    p = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+    print(f"{label:<28} loads={len(ordered):<5} errors={len(errors):<3} "
+          f"mean={statistics.mean(ordered) if ordered else 0:7.2f}ms "
+          f"p50={p(0.50):7.2f}ms p95={p(0.95):7.2f}ms p99={p(0.99):7.2f}ms "
+          f"throughput={len(ordered) / wall:7.1f}/s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Focus Companion database concurrency benchmark')
+    parser.add_argument('--sessions', type=int, default=50, help='Concurrent sessions (default: 50)')
+    parser.add_argument('--loads', type=int, default=20, help='Page loads per session (default: 20)')
+    parser.add_argument('--users', type=int, default=20, help='Distinct users (default: 20)')
+    parser.add_argument('--entries', type=int, default=300, help='Rows per user per table (default: 300)')
+    parser.add_argument('--write-ratio', type=float, default=0.3, help='Share of page loads that also write (default: 0.3)')
+    args = parser.parse_args()
+
+    print(f"🏁 {args.sessions} concurrent sessions × {args.loads} page loads "
+          f"({args.users} users, {args.entries} rows/table/user, write ratio {args.write_ratio})")
+
+    for label, manager_class in [("before (connect per call)", LegacyDatabaseManager),
+                                 ("after (pooled WAL)", DatabaseManager)]:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db = manager_class(os.path.join(temp_dir, "benchmark.db"))
+            seed_database(db, args.users, args.entries)
+            latencies, errors, wall = run_sessions(db, args.sessions, args.loads, args.users, args.write_ratio)
+            summarize(label, latencies, errors, wall)
+            db.close()
+
+if __name__ == "__main__":
+    main()
@@ -5,24 +5,323 @@ Handles all data storage and retrieval operations
 
 import sqlite3
 import json
+import atexit
 import os
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Any, Tuple
 from pathlib import Path
 
+def _utc_now() -> Tuple[str, int]:
+    """
+    Current UTC time as (timestamp, epoch seconds)
+    The timestamp matches SQLite's CURRENT_TIMESTAMP format
+    """
+    now = datetime.now(timezone.utc)
+    return now.strftime("%Y-%m-%d %H:%M:%S"), int(now.timestamp())
+
+def days_ago_epoch(days: int) -> int:
+    """Epoch seconds at UTC midnight N days ago, the same cutoff as date('now', '-N days')"""
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int((today - timedelta(days=days)).timestamp())
+
+class WriteBehindQueue:
+    """Queues writes and flushes them in one transaction per batch"""
+    
+    def __init__(self, db, batch_size: int = 100, flush_interval: float = 0.5):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        
+        self._pending: List[Tuple[str, tuple]] = []
+        self._lock = threading.Lock()        # Guards the pending list and metrics
+        self._flush_lock = threading.Lock()  # Serializes flushes so batches commit in order
+        self._wakeup = threading.Event()
+        self._stopped = False
+        
+        # Metrics
+        self._max_queue_depth = 0
+        self._flush_count = 0
+        self._rows_flushed = 0
+        self._failed_flushes = 0
+        self._dead_letter_count = 0
+        self._dead_letters = deque(maxlen=100)  # Writes that failed even on their own, for inspection
+        self._total_flush_ms = 0.0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def enqueue(self, sql: str, params: tuple) -> bool:
+        """
+        Queue a write for the next batch
+        Returns False if the queue is closed and the caller should write directly
+        """
+        with self._lock:
+            if self._stopped:
+                return False
+            self._pending.append((sql, params))
+            depth = len(self._pending)
+            self._max_queue_depth = max(self._max_queue_depth, depth)
+        
+        if depth >= self.batch_size:
+            self._wakeup.set()
+        return True
+    
+    def pending_count(self) -> int:
+        """Number of writes waiting to be flushed"""
+        with self._lock:
+            return len(self._pending)
+    
+    def flush(self) -> int:
+        """
+        Synchronously commit everything queued so far
+        Returns the number of rows written. Waits for a flush already in
+        progress, so once this returns every earlier write is committed (or
+        dead-lettered).
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            
+            started = time.perf_counter()
+            try:
+                self._commit(batch)
+                written = len(batch)
+            except Exception:
+                # One bad row fails the whole transaction; retry row by row and set aside only the rows that still fail
+                written = self._commit_rows(batch)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            
+            with self._lock:
+                self._flush_count += 1
+                self._rows_flushed += written
+                self._total_flush_ms += elapsed_ms
+                self._last_flush_ms = elapsed_ms
+                self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+            return written
+    
+    def _commit(self, batch: List[Tuple[str, tuple]]):
+        """Write a batch in one transaction"""
+        # Group by statement so each table gets a single executemany, preserving row order
+        grouped: Dict[str, List[tuple]] = {}
+        for sql, params in batch:
+            grouped.setdefault(sql, []).append(params)
+        
+        with self.db.connection() as conn:
+            for sql, rows in grouped.items():
+                conn.executemany(sql, rows)
+    
+    def _commit_rows(self, batch: List[Tuple[str, tuple]]) -> int:
+        """Write a failed batch one row per transaction; rows that fail again are dead-lettered"""
+        written = 0
+        failed = []
+        for sql, params in batch:
+            try:
+                with self.db.connection() as conn:
+                    conn.execute(sql, params)
+                written += 1
+            except Exception as e:
+                failed.append({"sql": sql, "params": params, "error": str(e)})
+        
+        with self._lock:
+            self._failed_flushes += 1
+            self._dead_letter_count += len(failed)
+            self._dead_letters.extend(failed)
+        return written
+    
+    def get_dead_letters(self) -> List[Dict[str, Any]]:
+        """The most recent writes that could not be committed, with their errors"""
+        with self._lock:
+            return list(self._dead_letters)
+    
+    def _run(self):
+        """Background flusher: wakes on batch size or after flush_interval"""
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped:
+                break
+            try:
+                self.flush()
+            except Exception:
+                pass  # Keep the flusher alive; what is still queued goes with the next tick
+    
+    def close(self):
+        """Stop the flusher and commit any remaining writes"""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        atexit.unregister(self.close)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and flush latency metrics"""
+        with self._lock:
+            return {
+                "queue_depth": len(self._pending),
+                "max_queue_depth": self._max_queue_depth,
+                "flush_count": self._flush_count,
+                "rows_flushed": self._rows_flushed,
+                "failed_flushes": self._failed_flushes,
+                "dead_letters": self._dead_letter_count,
+                "last_flush_ms": self._last_flush_ms,
+                "avg_flush_ms": self._total_flush_ms / self._flush_count if self._flush_count else 0.0,
+                "max_flush_ms": self._max_flush_ms,
+                "avg_batch_size": self._rows_flushed / self._flush_count if self._flush_count else 0.0
+            }
+
 class DatabaseManager:
     """Manages SQLite database operations for Focus Companion"""
     
-    def __init__(self, db_path: str = "data/focus_companion.db"):
+    # Connection tuning applied to every pooled connection
+    BUSY_TIMEOUT_MS = 5000
+    CACHE_SIZE_KB = 8192  # 8 MB page cache per connection
+    MMAP_SIZE_BYTES = 64 * 1024 * 1024
+    
+    def __init__(self, db_path: str = "data/focus_companion.db", pool_size: int = 8,
+                 write_behind: bool = None, batch_size: int = 100, flush_interval: float = 0.5):
         self.db_path = db_path
+        self.pool_size = pool_size
+        self._pool_lock = threading.Lock()
+        self._idle_connections = []
+        self._pool_waiters = deque()  # FIFO of (event, slot) for threads waiting on a connection
+        self._connections_created = 0
+        self._write_queue = None
         self.init_database()
+        
+        # Optional write-behind mode for mood logs, check-ins and API usage rows
+        if write_behind is None:
+            write_behind = os.getenv("FOCUS_DB_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+        if write_behind:
+            self._write_queue = WriteBehindQueue(self, batch_size, flush_interval)
+    
+    def _create_connection(self) -> sqlite3.Connection:
+        """Open a new connection configured for concurrent access"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False  # Connections move between threads via the pool
+        )
+        conn.execute(f"PRAGMA busy_timeout = {self.BUSY_TIMEOUT_MS}")
+        # WAL lets readers proceed while a writer is active
+        conn.execute("PRAGMA journal_mode = WAL")
+        # NORMAL is durable across application crashes in WAL mode and avoids an fsync per commit
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{self.CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {self.MMAP_SIZE_BYTES}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+    
+    def _acquire_connection(self) -> sqlite3.Connection:
+        """Take an idle connection from the pool, opening a new one while under capacity"""
+        with self._pool_lock:
+            if self._idle_connections:
+                return self._idle_connections.pop()
+            
+            can_create = self._connections_created < self.pool_size
+            if can_create:
+                self._connections_created += 1
+            else:
+                waiter = (threading.Event(), [])
+                self._pool_waiters.append(waiter)
+        
+        if can_create:
+            try:
+                return self._create_connection()
+            except Exception:
+                with self._pool_lock:
+                    self._connections_created -= 1
+                raise
+        
+        # Connections are handed to waiters in arrival order so busy threads can't starve others
+        event, slot = waiter
+        if not event.wait(self.BUSY_TIMEOUT_MS / 1000):
+            with self._pool_lock:
+                if not slot:
+                    self._pool_waiters.remove(waiter)
+                    raise sqlite3.OperationalError("Timed out waiting for a pooled database connection")
+        return slot[0]
+    
+    def _release_connection(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, handing it straight to the oldest waiter if any"""
+        with self._pool_lock:
+            if self._pool_waiters:
+                event, slot = self._pool_waiters.popleft()
+                slot.append(conn)
+                event.set()
+            else:
+                self._idle_connections.append(conn)
+    
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a pooled connection for the duration of a block
+        Commits on success and rolls back if the block raises
+        """
+        conn = self._acquire_connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._release_connection(conn)
+    
+    def _write(self, sql: str, params: tuple):
+        """Execute an INSERT now, or queue it when write-behind is enabled"""
+        if self._write_queue and self._write_queue.enqueue(sql, params):
+            return
+        with self.connection() as conn:
+            conn.execute(sql, params)
+    
+    def flush(self) -> int:
+        """
+        Commit any queued writes immediately (read-your-writes)
+        Returns the number of rows written
+        """
+        if self._write_queue:
+            return self._write_queue.flush()
+        return 0
+    
+    def _flush_pending_writes(self):
+        """Flush queued writes before a read so callers always see their own data"""
+        # Always go through flush(): the queue can look empty while the flusher is still committing a batch
+        if self._write_queue:
+            self._write_queue.flush()
+    
+    def get_write_behind_stats(self) -> Optional[Dict[str, Any]]:
+        """Queue depth and flush latency metrics, or None when write-behind is off"""
+        return self._write_queue.get_stats() if self._write_queue else None
+    
+    def close(self):
+        """Flush queued writes and close all idle pooled connections"""
+        if self._write_queue:
+            self._write_queue.close()
+        
+        with self._pool_lock:
+            idle, self._idle_connections = self._idle_connections, []
+            self._connections_created -= len(idle)
+        for conn in idle:
+            conn.close()
     
     def init_database(self):
         """Initialize the database with all required tables"""
         # Ensure data directory exists
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connection() as conn:
             cursor = conn.cursor()
             
             # API Usage Tracking
@@ -35,7 +334,11 @@ class DatabaseManager:
                     cost_usd REAL,
                     success BOOLEAN DEFAULT 1,
                     error_message TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    created_at_epoch INTEGER,
+                    tokens_saved INTEGER,
+                    model TEXT,
+                    latency_ms INTEGER
                 )
             """)
             
@@ -47,7 +350,8 @@ class DatabaseManager:
                     mood TEXT NOT NULL,
                     intensity INTEGER NOT NULL,
                     notes TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    created_at_epoch INTEGER
                 )
             """)
             
@@ -66,7 +370,8 @@ class DatabaseManager:
                     challenges TEXT,
                     task_plan TEXT,
                     task_completion TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    created_at_epoch INTEGER
                 )
             """)
             
@@ -93,56 +398,156 @@ class DatabaseManager:
                 )
             """)
             
+            # Integer epoch timestamps so time-range filters can use index range scans
+            for table in ("api_usage", "mood_logs", "checkins"):
+                cursor.execute(f"PRAGMA table_info({table})")
+                if "created_at_epoch" not in [column[1] for column in cursor.fetchall()]:
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN created_at_epoch INTEGER")
+                    cursor.execute(f"""
+                        UPDATE {table} SET created_at_epoch = CAST(strftime('%s', created_at) AS INTEGER)
+                        WHERE created_at_epoch IS NULL
+                    """)
+                # Rows inserted without an epoch (migrations, manual inserts) get one derived from created_at
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_epoch
+                    AFTER INSERT ON {table}
+                    WHEN NEW.created_at_epoch IS NULL
+                    BEGIN
+                        UPDATE {table} SET created_at_epoch = CAST(strftime('%s', NEW.created_at) AS INTEGER)
+                        WHERE id = NEW.id;
+                    END
+                """)
+                # The date(created_at) expression indexes can't serve range predicates
+                cursor.execute(f"DROP INDEX IF EXISTS idx_{table}_user_date")
+            
+            # Columns added after the first release: prompt tokens saved by
+            # compaction, and the routed model and its latency, per API call
+            cursor.execute("PRAGMA table_info(api_usage)")
+            api_usage_columns = [column[1] for column in cursor.fetchall()]
+            for column, column_type in (("tokens_saved", "INTEGER"), ("model", "TEXT"), ("latency_ms", "INTEGER")):
+                if column not in api_usage_columns:
+                    cursor.execute(f"ALTER TABLE api_usage ADD COLUMN {column} {column_type}")
+            
             # Create indexes for better performance
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_usage_user_date ON api_usage(user_email, date(created_at))")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_usage_user_epoch ON api_usage(user_email, created_at_epoch)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_usage_feature ON api_usage(feature)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_mood_logs_user_date ON mood_logs(user_email, date(created_at))")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_checkins_user_date ON checkins(user_email, date(created_at))")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_mood_logs_user_epoch ON mood_logs(user_email, created_at_epoch)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_checkins_user_epoch ON checkins(user_email, created_at_epoch)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_mood_logs_user_id ON mood_logs(user_email, id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_checkins_user_id ON checkins(user_email, id)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_checkins_period ON checkins(time_period)")
             
+            # Daily API usage rollup, one row per (user, day, feature)
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'api_usage_daily'")
+            rollup_exists = cursor.fetchone() is not None
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS api_usage_daily (
+                    user_email TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    feature TEXT NOT NULL,
+                    call_count INTEGER NOT NULL DEFAULT 0,
+                    tokens_used INTEGER NOT NULL DEFAULT 0,
+                    cost_usd REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_email, day, feature)
+                ) WITHOUT ROWID
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_usage_daily_day ON api_usage_daily(day)")
+            
+            # Keep the rollup current on every api_usage write
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_api_usage_rollup_insert
+                AFTER INSERT ON api_usage
+                BEGIN
+                    INSERT INTO api_usage_daily (user_email, day, feature, call_count, tokens_used, cost_usd)
+                    VALUES (NEW.user_email, date(NEW.created_at), NEW.feature, 1,
+                            COALESCE(NEW.tokens_used, 0), COALESCE(NEW.cost_usd, 0))
+                    ON CONFLICT (user_email, day, feature) DO UPDATE SET
+                        call_count = call_count + 1,
+                        tokens_used = tokens_used + excluded.tokens_used,
+                        cost_usd = cost_usd + excluded.cost_usd;
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_api_usage_rollup_delete
+                AFTER DELETE ON api_usage
+                BEGIN
+                    UPDATE api_usage_daily SET
+                        call_count = call_count - 1,
+                        tokens_used = tokens_used - COALESCE(OLD.tokens_used, 0),
+                        cost_usd = cost_usd - COALESCE(OLD.cost_usd, 0)
+                    WHERE user_email = OLD.user_email AND day = date(OLD.created_at) AND feature = OLD.feature;
+                    DELETE FROM api_usage_daily
+                    WHERE user_email = OLD.user_email AND day = date(OLD.created_at) AND feature = OLD.feature
+                      AND call_count <= 0;
+                END
+            """)
+            
             conn.commit()
+        
+        # Databases created before the rollup existed need their history folded in once
+        if not rollup_exists:
+            self.backfill_usage_rollup()
     
-    def record_api_usage(self, user_email: str, feature: str, tokens_used: int = None, 
-                        cost_usd: float = None, success: bool = True, error_message: str = None):
-        """Record an API usage event"""
-        with sqlite3.connect(self.db_path) as conn:
+    def backfill_usage_rollup(self) -> int:
+        """
+        Rebuild the api_usage_daily rollup from the raw api_usage table
+        Returns the number of rollup rows written
+        """
+        self._flush_pending_writes()
+        with self.connection() as conn:
             cursor = conn.cursor()
+            cursor.execute("DELETE FROM api_usage_daily")
             cursor.execute("""
-                INSERT INTO api_usage (user_email, feature, tokens_used, cost_usd, success, error_message)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (user_email, feature, tokens_used, cost_usd, success, error_message))
-            conn.commit()
+                INSERT INTO api_usage_daily (user_email, day, feature, call_count, tokens_used, cost_usd)
+                SELECT user_email, date(created_at), feature, COUNT(*),
+                       COALESCE(SUM(tokens_used), 0), COALESCE(SUM(cost_usd), 0)
+                FROM api_usage
+                GROUP BY user_email, date(created_at), feature
+            """)
+            return cursor.rowcount
+    
+    def record_api_usage(self, user_email: str, feature: str, tokens_used: int = None, 
+                        cost_usd: float = None, success: bool = True, error_message: str = None,
+                        tokens_saved: int = None, model: str = None, latency_ms: int = None):
+        """Record an API usage event"""
+        self._write("""
+            INSERT INTO api_usage (user_email, feature, tokens_used, cost_usd, success, error_message,
+                                   tokens_saved, model, latency_ms, created_at, created_at_epoch)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (user_email, feature, tokens_used, cost_usd, success, error_message, tokens_saved, model,
+              latency_ms, *_utc_now()))
     
     def get_user_api_usage(self, user_email: str, days: int = 30) -> Dict[str, Any]:
         """Get API usage statistics for a user"""
-        with sqlite3.connect(self.db_path) as conn:
+        self._flush_pending_writes()
+        with self.connection() as conn:
             cursor = conn.cursor()
             
             # Daily usage
             cursor.execute("""
-                SELECT date(created_at) as date, COUNT(*) as count
-                FROM api_usage 
-                WHERE user_email = ? AND created_at >= date('now', '-{} days')
-                GROUP BY date(created_at)
+                SELECT day as date, SUM(call_count) as count
+                FROM api_usage_daily 
+                WHERE user_email = ? AND day >= date('now', '-{} days')
+                GROUP BY day
                 ORDER BY date DESC
             """.format(days), (user_email,))
             daily_usage = dict(cursor.fetchall())
             
             # Monthly usage
             cursor.execute("""
-                SELECT strftime('%Y-%m', created_at) as month, COUNT(*) as count
-                FROM api_usage 
-                WHERE user_email = ? AND created_at >= date('now', '-{} days')
-                GROUP BY strftime('%Y-%m', created_at)
+                SELECT substr(day, 1, 7) as month, SUM(call_count) as count
+                FROM api_usage_daily 
+                WHERE user_email = ? AND day >= date('now', '-{} days')
+                GROUP BY substr(day, 1, 7)
                 ORDER BY month DESC
             """.format(days), (user_email,))
             monthly_usage = dict(cursor.fetchall())
             
             # Feature breakdown
             cursor.execute("""
-                SELECT feature, COUNT(*) as count
-                FROM api_usage 
-                WHERE user_email = ? AND created_at >= date('now', '-{} days')
+                SELECT feature, SUM(call_count) as count
+                FROM api_usage_daily 
+                WHERE user_email = ? AND day >= date('now', '-{} days')
                 GROUP BY feature
                 ORDER BY count DESC
             """.format(days), (user_email,))
@@ -151,8 +556,8 @@ class DatabaseManager:
             # Total cost
             cursor.execute("""
                 SELECT COALESCE(SUM(cost_usd), 0) as total_cost
-                FROM api_usage 
-                WHERE user_email = ? AND created_at >= date('now', '-{} days')
+                FROM api_usage_daily 
+                WHERE user_email = ? AND day >= date('now', '-{} days')
             """.format(days), (user_email,))
             total_cost = cursor.fetchone()[0]
             
@@ -165,25 +570,26 @@ class DatabaseManager:
     
     def get_global_api_usage(self, days: int = 30) -> Dict[str, Any]:
         """Get global API usage statistics"""
-        with sqlite3.connect(self.db_path) as conn:
+        self._flush_pending_writes()
+        with self.connection() as conn:
             cursor = conn.cursor()
             
             # Daily totals
             cursor.execute("""
-                SELECT date(created_at) as date, COUNT(*) as count
-                FROM api_usage 
-                WHERE created_at >= date('now', '-{} days')
-                GROUP BY date(created_at)
+                SELECT day as date, SUM(call_count) as count
+                FROM api_usage_daily 
+                WHERE day >= date('now', '-{} days')
+                GROUP BY day
                 ORDER BY date DESC
             """.format(days))
             daily_usage = dict(cursor.fetchall())
             
             # Monthly totals
             cursor.execute("""
-                SELECT strftime('%Y-%m', created_at) as month, COUNT(*) as count
-                FROM api_usage 
-                WHERE created_at >= date('now', '-{} days')
-                GROUP BY strftime('%Y-%m', created_at)
+                SELECT substr(day, 1, 7) as month, SUM(call_count) as count
+                FROM api_usage_daily 
+                WHERE day >= date('now', '-{} days')
+                GROUP BY substr(day, 1, 7)
                 ORDER BY month DESC
             """.format(days))
             monthly_usage = dict(cursor.fetchall())
@@ -191,8 +597,8 @@ class DatabaseManager:
             # Total cost
             cursor.execute("""
                 SELECT COALESCE(SUM(cost_usd), 0) as total_cost
-                FROM api_usage 
-                WHERE created_at >= date('now', '-{} days')
+                FROM api_usage_daily 
+                WHERE day >= date('now', '-{} days')
             """.format(days))
             total_cost = cursor.fetchone()[0]
             
@@ -202,26 +608,104 @@ class DatabaseManager:
                 "total_cost": total_cost
             }
     
-    def save_mood_log(self, user_email: str, mood: str, intensity: int, notes: str = None):
-        """Save a mood log entry"""
-        with sqlite3.connect(self.db_path) as conn:
+    def get_prompt_savings(self, days: int = 30) -> Dict[str, Dict[str, Any]]:
+        """Prompt tokens saved by compaction per feature, for calls that report it"""
+        self._flush_pending_writes()
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO mood_logs (user_email, mood, intensity, notes)
-                VALUES (?, ?, ?, ?)
-            """, (user_email, mood, intensity, notes))
-            conn.commit()
+                SELECT feature, COUNT(*), SUM(tokens_saved), COALESCE(SUM(tokens_used), 0)
+                FROM api_usage
+                WHERE created_at_epoch >= ? AND tokens_saved IS NOT NULL
+                GROUP BY feature
+            """, (days_ago_epoch(days),))
+            return {
+                feature: {
+                    "calls": calls,
+                    "tokens_saved": saved,
+                    "avg_tokens_saved": round(saved / calls, 1),
+                    "tokens_used": used
+                }
+                for feature, calls, saved, used in cursor.fetchall()
+            }
+    
+    def get_model_usage(self, days: int = 30) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Calls, cost and average latency per feature and model, for calls that report their model"""
+        self._flush_pending_writes()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT feature, model, COUNT(*), COALESCE(SUM(cost_usd), 0), AVG(latency_ms)
+                FROM api_usage
+                WHERE created_at_epoch >= ? AND model IS NOT NULL
+                GROUP BY feature, model
+            """, (days_ago_epoch(days),))
+            usage = {}
+            for feature, model, calls, cost, latency in cursor.fetchall():
+                usage.setdefault(feature, {})[model] = {
+                    "calls": calls,
+                    "cost_usd": cost,
+                    "avg_latency_ms": round(latency, 1) if latency is not None else None
+                }
+            return usage
+    
+    def get_output_failures(self, days: int = 30) -> Dict[str, Dict[str, Any]]:
+        """Calls per feature whose response was unusable, with their share of all calls and their cost"""
+        self._flush_pending_writes()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT feature, COUNT(*), SUM(CASE WHEN success THEN 0 ELSE 1 END),
+                       COALESCE(SUM(CASE WHEN success THEN 0 ELSE cost_usd END), 0)
+                FROM api_usage
+                WHERE created_at_epoch >= ?
+                GROUP BY feature
+                HAVING SUM(CASE WHEN success THEN 0 ELSE 1 END) > 0
+            """, (days_ago_epoch(days),))
+            return {
+                feature: {
+                    "calls": calls,
+                    "failed": failed,
+                    "failure_rate": round(failed / calls * 100, 1),
+                    "wasted_cost_usd": wasted
+                }
+                for feature, calls, failed, wasted in cursor.fetchall()
+            }
+    
+    def get_api_call_counts(self, since: str) -> List[tuple]:
+        """
+        Get API call counts per user per day since a UTC date (YYYY-MM-DD)
+        Returns a list of (user_email, date, count) rows
+        """
+        self._flush_pending_writes()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT user_email, day as date, SUM(call_count) as count
+                FROM api_usage_daily
+                WHERE day >= ?
+                GROUP BY user_email, day
+            """, (since,))
+            return cursor.fetchall()
+    
+    def save_mood_log(self, user_email: str, mood: str, intensity: int, notes: str = None):
+        """Save a mood log entry"""
+        self._write("""
+            INSERT INTO mood_logs (user_email, mood, intensity, notes, created_at, created_at_epoch)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (user_email, mood, intensity, notes, *_utc_now()))
     
     def get_mood_logs(self, user_email: str, days: int = 30) -> List[Dict[str, Any]]:
         """Get mood logs for a user"""
-        with sqlite3.connect(self.db_path) as conn:
+        self._flush_pending_writes()
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT mood, intensity, notes, created_at
                 FROM mood_logs 
-                WHERE user_email = ? AND created_at >= date('now', '-{} days')
-                ORDER BY created_at DESC
-            """.format(days), (user_email,))
+                WHERE user_email = ? AND created_at_epoch >= ?
+                ORDER BY created_at_epoch DESC
+            """, (user_email, days_ago_epoch(days)))
             
             logs = []
             for row in cursor.fetchall():
@@ -233,65 +717,111 @@ class DatabaseManager:
                 })
             return logs
     
-    def save_checkin(self, user_email: str, checkin_data: Dict[str, Any]):
-        """Save a check-in entry"""
-        with sqlite3.connect(self.db_path) as conn:
+    def get_mood_logs_since(self, user_email: str, last_id: int = 0, days: int = 365) -> List[Dict[str, Any]]:
+        """Get mood logs added after last_id, oldest first, for incremental loading"""
+        self._flush_pending_writes()
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO checkins (
-                    user_email, time_period, sleep_quality, energy_level, 
-                    focus_today, current_feeling, day_progress, accomplishments, 
-                    challenges, task_plan, task_completion
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                user_email,
-                checkin_data.get('time_period'),
-                checkin_data.get('sleep_quality'),
-                checkin_data.get('energy_level'),
-                checkin_data.get('focus_today'),
-                checkin_data.get('current_feeling'),
-                checkin_data.get('day_progress'),
-                checkin_data.get('accomplishments'),
-                checkin_data.get('challenges'),
-                json.dumps(checkin_data.get('task_plan', {})) if checkin_data.get('task_plan') else None,
-                json.dumps(checkin_data.get('task_completion', {})) if checkin_data.get('task_completion') else None
-            ))
-            conn.commit()
+                SELECT id, mood, intensity, notes, created_at, created_at_epoch
+                FROM mood_logs
+                WHERE user_email = ? AND id > ? AND created_at_epoch >= ?
+                ORDER BY id
+            """, (user_email, last_id, days_ago_epoch(days)))
+            
+            logs = []
+            for row in cursor.fetchall():
+                logs.append({
+                    "id": row[0],
+                    "mood": row[1],
+                    "intensity": row[2],
+                    "notes": row[3],
+                    "created_at": row[4],
+                    "created_at_epoch": row[5]
+                })
+            return logs
+    
+    def save_checkin(self, user_email: str, checkin_data: Dict[str, Any]):
+        """Save a check-in entry"""
+        self._write("""
+            INSERT INTO checkins (
+                user_email, time_period, sleep_quality, energy_level, 
+                focus_today, current_feeling, day_progress, accomplishments, 
+                challenges, task_plan, task_completion, created_at, created_at_epoch
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            user_email,
+            checkin_data.get('time_period'),
+            checkin_data.get('sleep_quality'),
+            checkin_data.get('energy_level'),
+            checkin_data.get('focus_today'),
+            checkin_data.get('current_feeling'),
+            checkin_data.get('day_progress'),
+            checkin_data.get('accomplishments'),
+            checkin_data.get('challenges'),
+            json.dumps(checkin_data.get('task_plan', {})) if checkin_data.get('task_plan') else None,
+            json.dumps(checkin_data.get('task_completion', {})) if checkin_data.get('task_completion') else None,
+            *_utc_now()
+        ))
     
     def get_checkins(self, user_email: str, days: int = 30) -> List[Dict[str, Any]]:
         """Get check-ins for a user"""
-        with sqlite3.connect(self.db_path) as conn:
+        self._flush_pending_writes()
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT time_period, sleep_quality, energy_level, focus_today,
                        current_feeling, day_progress, accomplishments, challenges,
                        task_plan, task_completion, created_at
                 FROM checkins 
-                WHERE user_email = ? AND created_at >= date('now', '-{} days')
-                ORDER BY created_at DESC
-            """.format(days), (user_email,))
+                WHERE user_email = ? AND created_at_epoch >= ?
+                ORDER BY created_at_epoch DESC
+            """, (user_email, days_ago_epoch(days)))
+            
+            return [self._checkin_from_row(row) for row in cursor.fetchall()]
+    
+    def get_checkins_since(self, user_email: str, last_id: int = 0, days: int = 365) -> List[Dict[str, Any]]:
+        """Get check-ins added after last_id, oldest first, for incremental loading"""
+        self._flush_pending_writes()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT time_period, sleep_quality, energy_level, focus_today,
+                       current_feeling, day_progress, accomplishments, challenges,
+                       task_plan, task_completion, created_at, id, created_at_epoch
+                FROM checkins
+                WHERE user_email = ? AND id > ? AND created_at_epoch >= ?
+                ORDER BY id
+            """, (user_email, last_id, days_ago_epoch(days)))
             
             checkins = []
             for row in cursor.fetchall():
-                checkin = {
-                    "time_period": row[0],
-                    "sleep_quality": row[1],
-                    "energy_level": row[2],
-                    "focus_today": row[3],
-                    "current_feeling": row[4],
-                    "day_progress": row[5],
-                    "accomplishments": row[6],
-                    "challenges": row[7],
-                    "task_plan": json.loads(row[8]) if row[8] else {},
-                    "task_completion": json.loads(row[9]) if row[9] else {},
-                    "created_at": row[10]
-                }
+                checkin = self._checkin_from_row(row)
+                checkin["id"] = row[11]
+                checkin["created_at_epoch"] = row[12]
                 checkins.append(checkin)
             return checkins
     
+    @staticmethod
+    def _checkin_from_row(row: tuple) -> Dict[str, Any]:
+        """Convert a check-in row into a dict, decoding the JSON task columns"""
+        return {
+            "time_period": row[0],
+            "sleep_quality": row[1],
+            "energy_level": row[2],
+            "focus_today": row[3],
+            "current_feeling": row[4],
+            "day_progress": row[5],
+            "accomplishments": row[6],
+            "challenges": row[7],
+            "task_plan": json.loads(row[8]) if row[8] else {},
+            "task_completion": json.loads(row[9]) if row[9] else {},
+            "created_at": row[10]
+        }
+    
     def save_user_profile(self, user_email: str, profile_data: Dict[str, Any]):
         """Save or update a user profile"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connection() as conn:
             cursor = conn.cursor()
             
             # Convert lists to JSON strings
@@ -312,7 +842,8 @@ class DatabaseManager:
                 cursor.execute(f"UPDATE user_profiles SET {set_clause} WHERE user_email = ?", 
                              list(profile_data.values()) + [user_email])
             else:
-                # Insert new profile
+                # Insert new profile, keyed by the user's email
+                profile_data['user_email'] = user_email
                 columns = ", ".join(profile_data.keys())
                 placeholders = ", ".join(["?" for _ in profile_data])
                 cursor.execute(f"INSERT INTO user_profiles ({columns}) VALUES ({placeholders})", 
@@ -322,7 +853,7 @@ class DatabaseManager:
     
     def get_user_profile(self, user_email: str) -> Optional[Dict[str, Any]]:
         """Get a user profile"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM user_profiles WHERE user_email = ?", (user_email,))
             row = cursor.fetchone()
@@ -347,9 +878,18 @@ class DatabaseManager:
                 return profile
             return None
     
+    def get_user_emails(self) -> List[str]:
+        """Emails of every user with a profile"""
+        self._flush_pending_writes()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT user_email FROM user_profiles ORDER BY user_email")
+            return [row[0] for row in cursor.fetchall()]
+    
     def delete_user_data(self, user_email: str):
         """Delete all data for a user (for GDPR compliance)"""
-        with sqlite3.connect(self.db_path) as conn:
+        self._flush_pending_writes()
+        with self.connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM api_usage WHERE user_email = ?", (user_email,))
             cursor.execute("DELETE FROM mood_logs WHERE user_email = ?", (user_email,))
@@ -359,7 +899,8 @@ class DatabaseManager:
     
     def get_database_stats(self) -> Dict[str, Any]:
         """Get database statistics"""
-        with sqlite3.connect(self.db_path) as conn:
+        self._flush_pending_writes()
+        with self.connection() as conn:
             cursor = conn.cursor()
             
             stats = {}
@@ -374,7 +915,7 @@ class DatabaseManager:
             stats['unique_users'] = cursor.fetchone()[0]
             
             # Get total API cost
-            cursor.execute("SELECT COALESCE(SUM(cost_usd), 0) FROM api_usage")
+            cursor.execute("SELECT COALESCE(SUM(cost_usd), 0) FROM api_usage_daily")
             stats['total_api_cost'] = cursor.fetchone()[0]
             
             return stats 
\ No newline at end of file
@@ -10,67 +10,69 @@ from typing import Dict, List, Any
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from data.database import DatabaseManager
+from data.database import DatabaseManager, days_ago_epoch
 
 class DatabaseInsights:
     """Provides insights and analytics from the Focus Companion database"""
     
-    def __init__(self, db_path: str = "data/focus_companion.db"):
-        self.db_path = db_path
-        self.db = DatabaseManager(db_path)
+    def __init__(self, db_path: str = "data/focus_companion.db", db: DatabaseManager = None):
+        # Pass an existing manager to skip opening a new one (and re-running the schema DDL)
+        self.db = db or DatabaseManager(db_path)
+        self.db_path = self.db.db_path
     
     def get_user_activity_summary(self, user_email: str = None, days: int = 30) -> Dict[str, Any]:
         """Get comprehensive activity summary for a user or all users"""
-        with sqlite3.connect(self.db_path) as conn:
+        since = days_ago_epoch(days)
+        with self.db.connection() as conn:
             # Convert to pandas for easier analysis
             if user_email:
                 # User-specific queries
-                mood_query = f"""
+                mood_query = """
                     SELECT mood, intensity, created_at 
                     FROM mood_logs 
-                    WHERE user_email = ? AND created_at >= date('now', '-{days} days')
-                    ORDER BY created_at DESC
+                    WHERE user_email = ? AND created_at_epoch >= ?
+                    ORDER BY created_at_epoch DESC
                 """
-                checkin_query = f"""
+                checkin_query = """
                     SELECT time_period, energy_level, sleep_quality, created_at
                     FROM checkins 
-                    WHERE user_email = ? AND created_at >= date('now', '-{days} days')
-                    ORDER BY created_at DESC
+                    WHERE user_email = ? AND created_at_epoch >= ?
+                    ORDER BY created_at_epoch DESC
                 """
-                usage_query = f"""
+                usage_query = """
                     SELECT feature, tokens_used, cost_usd, created_at
                     FROM api_usage 
-                    WHERE user_email = ? AND created_at >= date('now', '-{days} days')
-                    ORDER BY created_at DESC
+                    WHERE user_email = ? AND created_at_epoch >= ?
+                    ORDER BY created_at_epoch DESC
                 """
                 
-                mood_df = pd.read_sql_query(mood_query, conn, params=(user_email,))
-                checkin_df = pd.read_sql_query(checkin_query, conn, params=(user_email,))
-                usage_df = pd.read_sql_query(usage_query, conn, params=(user_email,))
+                mood_df = pd.read_sql_query(mood_query, conn, params=(user_email, since))
+                checkin_df = pd.read_sql_query(checkin_query, conn, params=(user_email, since))
+                usage_df = pd.read_sql_query(usage_query, conn, params=(user_email, since))
             else:
                 # Global queries
-                mood_query = f"""
+                mood_query = """
                     SELECT user_email, mood, intensity, created_at 
                     FROM mood_logs 
-                    WHERE created_at >= date('now', '-{days} days')
-                    ORDER BY created_at DESC
+                    WHERE created_at_epoch >= ?
+                    ORDER BY created_at_epoch DESC
                 """
-                checkin_query = f"""
+                checkin_query = """
                     SELECT user_email, time_period, energy_level, sleep_quality, created_at
                     FROM checkins 
-                    WHERE created_at >= date('now', '-{days} days')
-                    ORDER BY created_at DESC
+                    WHERE created_at_epoch >= ?
+                    ORDER BY created_at_epoch DESC
                 """
-                usage_query = f"""
+                usage_query = """
                     SELECT user_email, feature, tokens_used, cost_usd, created_at
                     FROM api_usage 
-                    WHERE created_at >= date('now', '-{days} days')
-                    ORDER BY created_at DESC
+                    WHERE created_at_epoch >= ?
+                    ORDER BY created_at_epoch DESC
                 """
                 
-                mood_df = pd.read_sql_query(mood_query, conn)
-                checkin_df = pd.read_sql_query(checkin_query, conn)
-                usage_df = pd.read_sql_query(usage_query, conn)
+                mood_df = pd.read_sql_query(mood_query, conn, params=(since,))
+                checkin_df = pd.read_sql_query(checkin_query, conn, params=(since,))
+                usage_df = pd.read_sql_query(usage_query, conn, params=(since,))
             
             # Calculate insights
             insights = {
@@ -173,7 +175,7 @@ class DatabaseInsights:
     
     def get_feature_adoption_analysis(self, days: int = 30) -> Dict[str, Any]:
         """Analyze feature adoption across users"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.db.connection() as conn:
             # Get all users
             users_df = pd.read_sql_query("SELECT DISTINCT user_email FROM user_profiles", conn)
             
@@ -182,9 +184,9 @@ class DatabaseInsights:
             
             # Get feature usage per user
             usage_query = f"""
-                SELECT user_email, feature, COUNT(*) as usage_count
-                FROM api_usage 
-                WHERE created_at >= date('now', '-{days} days')
+                SELECT user_email, feature, SUM(call_count) as usage_count
+                FROM api_usage_daily 
+                WHERE day >= date('now', '-{days} days')
                 GROUP BY user_email, feature
             """
             usage_df = pd.read_sql_query(usage_query, conn)
@@ -211,16 +213,16 @@ class DatabaseInsights:
     
     def get_cost_analysis(self, days: int = 30) -> Dict[str, Any]:
         """Analyze costs and usage patterns"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.db.connection() as conn:
             usage_query = f"""
                 SELECT 
                     user_email,
                     feature,
                     SUM(tokens_used) as total_tokens,
                     SUM(cost_usd) as total_cost,
-                    COUNT(*) as call_count
-                FROM api_usage 
-                WHERE created_at >= date('now', '-{days} days')
+                    SUM(call_count) as call_count
+                FROM api_usage_daily 
+                WHERE day >= date('now', '-{days} days')
                 GROUP BY user_email, feature
                 ORDER BY total_cost DESC
             """
@@ -253,7 +255,7 @@ class DatabaseInsights:
     
     def export_user_data(self, user_email: str, format: str = "json") -> str:
         """Export all data for a specific user"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.db.connection() as conn:
             # Get all user data
             profile = self.db.get_user_profile(user_email)
             mood_logs = self.db.get_mood_logs(user_email, days=365)
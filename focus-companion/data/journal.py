@@ -0,0 +1,195 @@
+"""
+Append-only JSONL journal for Focus Companion's JSON backups
+Each save appends one line instead of rewriting the whole backup file
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Any, Optional
+
+class JsonlJournal:
+    """
+    Append-only journal of entries with tombstones for deletions
+
+    Every line is a record:
+        {"op": "add", "entry": {...}}        append an entry
+        {"op": "delete", "timestamp": "..."} drop entries with that timestamp
+
+    Appends are flushed to the OS immediately and fsynced at most once per
+    fsync_interval. Tombstones leave dead lines behind, so the journal is
+    rewritten with only the live entries once compact_threshold of them pile up.
+    """
+
+    def __init__(self, path: str, fsync_interval: float = 1.0, compact_threshold: int = 200,
+                 legacy_path: Optional[str] = None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.fsync_interval = fsync_interval
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._last_fsync = 0.0
+        self._fsync_timer = None
+        self._dead_records = 0
+        self._compactions = 0
+        atexit.register(self.sync)
+
+    def _write_records(self, records: List[Dict[str, Any]]):
+        """Append records and flush them, fsyncing now or scheduling a batched fsync"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._import_legacy()
+
+        lines = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        with open(self.path, "a+b") as f:
+            # Start on a fresh line if a crash left a partial record at the end
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    lines = b"\n" + lines
+            f.write(lines)
+            f.flush()
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                os.fsync(f.fileno())
+                self._last_fsync = time.monotonic()
+            elif self._fsync_timer is None:
+                self._fsync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self._fsync_timer.daemon = True
+                self._fsync_timer.start()
+
+    def _import_legacy(self):
+        """Seed a new journal from the legacy JSON backup so older history is kept"""
+        if os.path.exists(self.path) or not self.legacy_path:
+            return
+        try:
+            with open(self.legacy_path, "r") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if isinstance(entries, list):
+            self._rewrite(entries)
+
+    def append(self, entry: Dict[str, Any]):
+        """Append a single entry"""
+        with self._lock:
+            self._write_records([{"op": "add", "entry": entry}])
+
+    def delete(self, timestamp: str):
+        """Record a tombstone for entries with the given timestamp"""
+        with self._lock:
+            self._write_records([{"op": "delete", "timestamp": timestamp}])
+            self._dead_records += 1
+            if self._dead_records >= self.compact_threshold:
+                self.compact()
+
+    def replace(self, entries: List[Dict[str, Any]]):
+        """Replace the whole journal with the given entries"""
+        with self._lock:
+            self._rewrite(entries)
+
+    def read_entries(self) -> List[Dict[str, Any]]:
+        """Replay the journal into the list of live entries, oldest first"""
+        with self._lock:
+            self._import_legacy()
+            entries = []
+            try:
+                with open(self.path, "r") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            # A torn final line from a crash mid-append
+                            continue
+                        if record.get("op") == "add":
+                            entries.append(record["entry"])
+                        elif record.get("op") == "delete":
+                            entries = [e for e in entries if e.get("timestamp") != record["timestamp"]]
+            except FileNotFoundError:
+                pass
+            return entries
+
+    def _rewrite(self, entries: List[Dict[str, Any]]):
+        """Atomically replace the journal with one add record per entry"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for entry in entries:
+                f.write(json.dumps({"op": "add", "entry": entry}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._dead_records = 0
+
+    def compact(self) -> int:
+        """Rewrite the journal with only its live entries; returns the number kept"""
+        with self._lock:
+            entries = self.read_entries()
+            self._rewrite(entries)
+            self._compactions += 1
+            return len(entries)
+
+    def export_legacy_json(self, path: Optional[str] = None) -> str:
+        """Rebuild the legacy indented JSON array from the journal; returns the written path"""
+        path = path or self.legacy_path
+        entries = self.read_entries()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    def sync(self):
+        """Fsync any appends still waiting for a batched fsync"""
+        with self._lock:
+            self._fsync_timer = None
+            try:
+                fd = os.open(self.path, os.O_RDONLY)
+            except FileNotFoundError:
+                return
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._last_fsync = time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Journal size and compaction statistics"""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        return {
+            "path": self.path,
+            "size_bytes": size,
+            "dead_records": self._dead_records,
+            "compactions": self._compactions
+        }
+
+def main():
+    """Compact journals or rebuild their legacy JSON views from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Focus Companion JSONL journal maintenance')
+    parser.add_argument('action', choices=['compact', 'export'], help='Compact the journal or export the legacy JSON view')
+    parser.add_argument('journals', nargs='+', help='Journal files (e.g. data/mood_data.jsonl)')
+    args = parser.parse_args()
+
+    for path in args.journals:
+        journal = JsonlJournal(path, legacy_path=os.path.splitext(path)[0] + ".json")
+        if args.action == 'compact':
+            kept = journal.compact()
+            print(f"✅ Compacted {path} ({kept} live entries)")
+        else:
+            print(f"✅ Exported {journal.export_legacy_json()}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,13 @@
+import copy
+import itertools
 import json
 import os
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from .database import DatabaseManager
+from .timeline import UserTimeline
+from .journal import JsonlJournal
 
 # Initialize database manager
 db = DatabaseManager()
@@ -10,6 +16,127 @@ PROFILE_PATH = "data/user_profile.json"
 MOOD_DATA_PATH = "data/mood_data.json"
 CHECKIN_DATA_PATH = "data/checkin_data.json"
 
+# Append-only journals backing the JSON backups, keyed by journal path
+_journals = {}
+
+def _journal_for(json_path):
+    """Get the JSONL journal that replaces the given legacy JSON backup"""
+    path = os.path.splitext(json_path)[0] + ".jsonl"
+    journal = _journals.get(path)
+    if journal is None:
+        journal = JsonlJournal(path, legacy_path=json_path)
+        _journals[path] = journal
+    return journal
+
+def export_legacy_json():
+    """Rebuild mood_data.json and checkin_data.json from their journals; returns the written paths"""
+    return [
+        _journal_for(MOOD_DATA_PATH).export_legacy_json(),
+        _journal_for(CHECKIN_DATA_PATH).export_legacy_json()
+    ]
+
+class UserDataCache:
+    """
+    Process-wide LRU cache of per-user data snapshots shared by all pages
+    Entries are keyed by (kind, user, version); the save functions bump a user's
+    version so every page sees the same snapshot until something actually changes.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._version_counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def version(self, user_key) -> int:
+        """Current data version for a user key"""
+        with self._lock:
+            return self._versions.get(user_key, 0)
+
+    def bump(self, user_key):
+        """Move a user key to a new version and drop its stale snapshots"""
+        with self._lock:
+            self._versions[user_key] = next(self._version_counter)
+            for key in [key for key in self._entries if key[1] == user_key]:
+                del self._entries[key]
+
+    def get(self, kind, user_key, loader):
+        """Return the cached snapshot for the user's current version, loading it on a miss"""
+        with self._lock:
+            key = (kind, user_key, self._versions.get(user_key, 0))
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        snapshot = loader()
+
+        with self._lock:
+            self._entries[key] = snapshot
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return snapshot
+
+    def clear(self):
+        """Drop all snapshots and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def get_stats(self):
+        """Hit/miss counters and size of the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups * 100, 1) if lookups else 0
+            }
+
+user_data_cache = UserDataCache()
+
+def _bump_data_version(user_email=None):
+    """Invalidate cached snapshots after a save; JSON backups are shared, so the anonymous view changes too"""
+    user_data_cache.bump(user_email)
+    if user_email:
+        user_data_cache.bump(None)
+
+def get_cache_stats():
+    """Hit/miss statistics for the per-user data cache"""
+    return user_data_cache.get_stats()
+
+# Timelines used outside a Streamlit session (scripts, tests)
+_timelines = {}
+
+def _session_timelines():
+    """Timelines for the current Streamlit session, or the module-level ones outside Streamlit"""
+    try:
+        import streamlit as st
+        if st.runtime.exists():
+            return st.session_state.setdefault('user_timelines', {})
+    except Exception:
+        pass
+    return _timelines
+
+def get_user_timeline(user_email):
+    """Get the incrementally loaded mood/check-in timeline for a user"""
+    timelines = _session_timelines()
+    timeline = timelines.get(user_email)
+    if timeline is None or timeline.db is not db:
+        timeline = UserTimeline(db, user_email, days=365)  # Last year
+        timelines[user_email] = timeline
+    return timeline
+
 def save_user_profile(data, user_email=None):
     """Save user profile to database and JSON backup"""
     # Save to database
@@ -20,8 +147,15 @@ def save_user_profile(data, user_email=None):
     os.makedirs(os.path.dirname(PROFILE_PATH), exist_ok=True)
     with open(PROFILE_PATH, "w") as f:
         json.dump(data, f, indent=2)
+    _bump_data_version(user_email)
 
 def load_user_profile(user_email=None):
+    """Load user profile, served from the shared cache until it changes"""
+    # Profiles are small and often edited in place by pages, so hand out a copy
+    return copy.deepcopy(user_data_cache.get(("profile", PROFILE_PATH), user_email,
+                                             lambda: _read_user_profile(user_email)))
+
+def _read_user_profile(user_email=None):
     """Load user profile from database or JSON fallback"""
     if user_email:
         # Try database first
@@ -40,11 +174,13 @@ def reset_user_profile(user_email=None):
     """Reset user profile from both database and JSON"""
     if user_email:
         db.delete_user_data(user_email)
+        get_user_timeline(user_email).reset()
     
     try:
         os.remove(PROFILE_PATH)
     except FileNotFoundError:
         pass
+    _bump_data_version(user_email)
 
 # Mood data functions
 def save_mood_data(mood_entry, user_email=None):
@@ -59,35 +195,25 @@ def save_mood_data(mood_entry, user_email=None):
         )
     
     # Keep JSON backup for compatibility
-    os.makedirs(os.path.dirname(MOOD_DATA_PATH), exist_ok=True)
-    existing_data = load_mood_data(user_email)
-    existing_data.append(mood_entry)
-    with open(MOOD_DATA_PATH, "w") as f:
-        json.dump(existing_data, f, indent=2)
+    _journal_for(MOOD_DATA_PATH).append(mood_entry)
+    _bump_data_version(user_email)
 
 def load_mood_data(user_email=None):
+    """Load mood data, served from the shared cache until it changes"""
+    # The snapshot is shared by all pages; callers get their own deep copy, nested plans and lists included
+    return copy.deepcopy(list(user_data_cache.get(("mood", MOOD_DATA_PATH), user_email,
+                                                  lambda: tuple(_read_mood_data(user_email)))))
+
+def _read_mood_data(user_email=None):
     """Load mood data from database or JSON fallback"""
     if user_email:
-        # Try database first
-        mood_logs = db.get_mood_logs(user_email, days=365)  # Last year
+        # Try database first, only fetching rows added since the last load
+        mood_logs = get_user_timeline(user_email).mood_entries()
         if mood_logs:
-            # Convert database format to JSON format for compatibility
-            converted_logs = []
-            for log in mood_logs:
-                converted_logs.append({
-                    'mood': log['mood'],
-                    'intensity': log['intensity'],
-                    'notes': log['notes'],
-                    'timestamp': log['created_at']
-                })
-            return converted_logs
+            return mood_logs
     
-    # Fallback to JSON
-    try:
-        with open(MOOD_DATA_PATH, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    # Fallback to JSON backup
+    return _journal_for(MOOD_DATA_PATH).read_entries()
 
 def save_all_mood_data(mood_data, user_email=None):
     """Save entire mood data array to database and JSON"""
@@ -96,18 +222,16 @@ def save_all_mood_data(mood_data, user_email=None):
         # Note: This is a simplified approach - in production you might want more sophisticated merging
         pass
     
-    # Save to JSON
-    os.makedirs(os.path.dirname(MOOD_DATA_PATH), exist_ok=True)
-    with open(MOOD_DATA_PATH, "w") as f:
-        json.dump(mood_data, f, indent=2)
+    # Save to JSON backup
+    _journal_for(MOOD_DATA_PATH).replace(mood_data)
+    _bump_data_version(user_email)
 
 def delete_mood_entry(timestamp, user_email=None):
     """Delete a specific mood entry by timestamp"""
     # Note: Database deletion by timestamp would require additional implementation
-    # For now, just update JSON
-    mood_data = load_mood_data(user_email)
-    mood_data = [entry for entry in mood_data if entry.get('timestamp') != timestamp]
-    save_all_mood_data(mood_data, user_email)
+    # For now, just record a tombstone in the JSON backup
+    _journal_for(MOOD_DATA_PATH).delete(timestamp)
+    _bump_data_version(user_email)
 
 # Check-in data functions
 def save_checkin_data(checkin_entry, user_email=None):
@@ -117,43 +241,24 @@ def save_checkin_data(checkin_entry, user_email=None):
         db.save_checkin(user_email, checkin_entry)
     
     # Keep JSON backup for compatibility
-    os.makedirs(os.path.dirname(CHECKIN_DATA_PATH), exist_ok=True)
-    existing_data = load_checkin_data(user_email)
-    existing_data.append(checkin_entry)
-    with open(CHECKIN_DATA_PATH, "w") as f:
-        json.dump(existing_data, f, indent=2)
+    _journal_for(CHECKIN_DATA_PATH).append(checkin_entry)
+    _bump_data_version(user_email)
 
 def load_checkin_data(user_email=None):
+    """Load check-in data, served from the shared cache until it changes"""
+    return copy.deepcopy(list(user_data_cache.get(("checkin", CHECKIN_DATA_PATH), user_email,
+                                                  lambda: tuple(_read_checkin_data(user_email)))))
+
+def _read_checkin_data(user_email=None):
     """Load check-in data from database or JSON fallback"""
     if user_email:
-        # Try database first
-        checkins = db.get_checkins(user_email, days=365)  # Last year
+        # Try database first, only fetching rows added since the last load
+        checkins = get_user_timeline(user_email).checkin_entries()
         if checkins:
-            # Convert database format to JSON format for compatibility
-            converted_checkins = []
-            for checkin in checkins:
-                converted_checkin = {
-                    'time_period': checkin['time_period'],
-                    'sleep_quality': checkin['sleep_quality'],
-                    'energy_level': checkin['energy_level'],
-                    'focus_today': checkin['focus_today'],
-                    'current_feeling': checkin['current_feeling'],
-                    'day_progress': checkin['day_progress'],
-                    'accomplishments': checkin['accomplishments'],
-                    'challenges': checkin['challenges'],
-                    'task_plan': checkin['task_plan'],
-                    'task_completion': checkin['task_completion'],
-                    'timestamp': checkin['created_at']
-                }
-                converted_checkins.append(converted_checkin)
-            return converted_checkins
+            return checkins
     
-    # Fallback to JSON
-    try:
-        with open(CHECKIN_DATA_PATH, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    # Fallback to JSON backup
+    return _journal_for(CHECKIN_DATA_PATH).read_entries()
 
 def save_all_checkin_data(checkin_data, user_email=None):
     """Save entire check-in data array to database and JSON"""
@@ -162,7 +267,6 @@ def save_all_checkin_data(checkin_data, user_email=None):
         # For now, just save to JSON
         pass
     
-    # Save to JSON
-    os.makedirs(os.path.dirname(CHECKIN_DATA_PATH), exist_ok=True)
-    with open(CHECKIN_DATA_PATH, "w") as f:
-        json.dump(checkin_data, f, indent=2)
\ No newline at end of file
+    # Save to JSON backup
+    _journal_for(CHECKIN_DATA_PATH).replace(checkin_data)
+    _bump_data_version(user_email)
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+Per-user timelines for Focus Companion
+Keeps already-loaded mood logs and check-ins in memory and only fetches new rows
+"""
+
+import threading
+from typing import Dict, List, Any
+from .database import DatabaseManager, days_ago_epoch
+
+def mood_log_to_entry(log: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a database mood log into the legacy JSON entry format"""
+    return {
+        'mood': log['mood'],
+        'intensity': log['intensity'],
+        'notes': log['notes'],
+        'timestamp': log['created_at']
+    }
+
+def checkin_to_entry(checkin: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a database check-in into the legacy JSON entry format"""
+    return {
+        'time_period': checkin['time_period'],
+        'sleep_quality': checkin['sleep_quality'],
+        'energy_level': checkin['energy_level'],
+        'focus_today': checkin['focus_today'],
+        'current_feeling': checkin['current_feeling'],
+        'day_progress': checkin['day_progress'],
+        'accomplishments': checkin['accomplishments'],
+        'challenges': checkin['challenges'],
+        'task_plan': checkin['task_plan'],
+        'task_completion': checkin['task_completion'],
+        'timestamp': checkin['created_at']
+    }
+
+class UserTimeline:
+    """
+    Incrementally loaded mood and check-in history for one user
+    The first read loads the whole window; later reads only ask for rows with a larger id
+    """
+
+    def __init__(self, db: DatabaseManager, user_email: str, days: int = 365):
+        self.db = db
+        self.user_email = user_email
+        self.days = days
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget loaded rows so the next read starts from scratch (e.g. after deleting data)"""
+        self._moods = []
+        self._checkins = []
+        self._last_mood_id = 0
+        self._last_checkin_id = 0
+
+    def _refresh(self, rows: List[tuple], fetch, convert, last_id: int) -> int:
+        """
+        Prepend rows added since last_id and drop rows that left the window
+        Returns the new last seen id
+        """
+        # Rows come back oldest first; keep the newest first like the full-window reads
+        new_rows = fetch(self.user_email, last_id, self.days)
+        if new_rows:
+            rows[:0] = [(row['created_at_epoch'], convert(row)) for row in reversed(new_rows)]
+            last_id = new_rows[-1]['id']
+
+        cutoff = days_ago_epoch(self.days)
+        while rows and rows[-1][0] < cutoff:
+            rows.pop()
+        return last_id
+
+    def mood_entries(self) -> List[Dict[str, Any]]:
+        """Mood entries in the legacy format, newest first"""
+        with self._lock:
+            self._last_mood_id = self._refresh(
+                self._moods, self.db.get_mood_logs_since, mood_log_to_entry, self._last_mood_id
+            )
+            return [entry for _, entry in self._moods]
+
+    def checkin_entries(self) -> List[Dict[str, Any]]:
+        """Check-in entries in the legacy format, newest first"""
+        with self._lock:
+            self._last_checkin_id = self._refresh(
+                self._checkins, self.db.get_checkins_since, checkin_to_entry, self._last_checkin_id
+            )
+            return [entry for _, entry in self._checkins]
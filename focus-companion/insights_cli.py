@@ -21,6 +21,7 @@ def main():
     parser.add_argument('--global-insights', '-g', action='store_true', help='Show global insights only')
     parser.add_argument('--costs', '-c', action='store_true', help='Show cost analysis')
     parser.add_argument('--adoption', '-a', action='store_true', help='Show feature adoption analysis')
+    parser.add_argument('--backfill-usage-rollup', action='store_true', help='Rebuild the daily API usage rollup from raw api_usage rows')
     
     args = parser.parse_args()
     
@@ -38,6 +39,11 @@ def main():
     
     insights = DatabaseInsights()
     
+    if args.backfill_usage_rollup:
+        rows = insights.db.backfill_usage_rollup()
+        print(f"✅ Rebuilt daily API usage rollup ({rows} user/day/feature rows)")
+        return
+    
     print("🔍 Focus Companion Database Insights")
     print("=" * 60)
     
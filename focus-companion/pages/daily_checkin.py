@@ -1,6 +1,5 @@
 import streamlit as st
 import os
-import json
 import sys
 from pathlib import Path
 from datetime import datetime, timedelta
@@ -14,6 +13,7 @@ sys.path.insert(0, str(project_root))
 from data.storage import save_user_profile, load_user_profile, save_checkin_data, load_checkin_data, load_mood_data
 from assistant.fallback import FallbackAssistant
 from assistant.ai_service import AIService
+from assistant.structured_output import partial_list
 from auth import require_beta_access, get_user_email
 
 st.set_page_config(page_title="Humsy - Daily Check-in", page_icon="📝")
@@ -149,6 +149,36 @@ Be warm, understanding, and deeply insightful. Focus on productivity and goal al
 
 st.title("📝 Daily Check-in")
 
+def stream_task_plan(ai_service, user_profile, current_checkin_data, mood_data, user_email):
+    """Show the AI task plan's tasks as they are drafted, then return the validated plan (None if unavailable)"""
+    stream = ai_service.stream_ai_task_plan(user_profile, current_checkin_data, mood_data, user_email)
+    if not stream:
+        return None
+    
+    try:
+        with st.status("🤖 AI is drafting your personalized plan...", expanded=True) as status:
+            draft = st.empty()
+            plan_text = ""
+            for chunk in stream:
+                plan_text += chunk
+                # Show each task as soon as it is complete; the plan is only validated once the stream ends
+                tasks = partial_list(plan_text, 'tasks')
+                if tasks:
+                    draft.markdown("\n".join(f"{i}. {task}" for i, task in enumerate(tasks, 1)))
+            status.update(label="🤖 Plan drafted", state="complete", expanded=False)
+        
+        # Repair the JSON locally if needed, filling gaps from the rule-based plan
+        plan = ai_service.parse_task_plan(plan_text, user_profile, current_checkin_data, mood_data)
+        if plan is None:
+            # An unusable draft was re-asked when its stream ended; a usable answer was cached
+            plan = ai_service.cached_task_plan(user_profile, current_checkin_data, mood_data, user_email)
+        if plan is None:
+            st.error("Error parsing AI task plan response")
+        return plan
+    except Exception as e:
+        st.error(f"Error generating AI task plan: {str(e)}")
+    return None
+
 # Load user profile
 user_profile = load_user_profile()
 
@@ -392,7 +422,7 @@ else:
                     
                     # Generate AI-powered task plan
                     if ai_service_available and ai_service:
-                        task_plan = ai_service.generate_ai_task_plan(user_profile, current_checkin_data, mood_data, user_email)
+                        task_plan = stream_task_plan(ai_service, user_profile, current_checkin_data, mood_data, user_email)
                         
                         # Fallback to rule-based plan if AI fails
                         if not task_plan:
@@ -581,7 +611,7 @@ else:
                     
                     # Generate AI-powered task plan
                     if ai_service_available and ai_service:
-                        task_plan = ai_service.generate_ai_task_plan(user_profile, current_checkin_data, mood_data, user_email)
+                        task_plan = stream_task_plan(ai_service, user_profile, current_checkin_data, mood_data, user_email)
                         
                         # Fallback to rule-based plan if AI fails
                         if not task_plan:
@@ -771,7 +801,7 @@ else:
                     
                     # Generate AI-powered task plan
                     if ai_service_available and ai_service:
-                        task_plan = ai_service.generate_ai_task_plan(user_profile, current_checkin_data, mood_data, user_email)
+                        task_plan = stream_task_plan(ai_service, user_profile, current_checkin_data, mood_data, user_email)
                         
                         # Fallback to rule-based plan if AI fails
                         if not task_plan:
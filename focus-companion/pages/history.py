@@ -270,7 +270,7 @@ else:
                     # Old format: single mood
                     # Set default intensity if not present
                     if 'intensity' not in entry:
-                        entry['intensity'] = 5  # Default intensity
+                        entry = dict(entry, intensity=5)  # Default intensity (entries are shared, don't edit in place)
                     processed_data.append(entry)
                 else:
                     # Fallback for malformed data
@@ -96,8 +96,9 @@ def main():
         st.write("If you need access to your personal data, please contact the development team.")
         return
     
-    # Initialize insights
-    insights = DatabaseInsights()
+    # Initialize insights on the shared database handle
+    from assistant.services import get_database
+    insights = DatabaseInsights(db=get_database())
     
     # Sidebar for options
     st.sidebar.header("📊 Analysis Options")
@@ -113,7 +114,7 @@ def main():
     # Analysis type
     analysis_type = st.sidebar.radio(
         "Analysis Type",
-        ["Your Data", "Global Overview", "Cost Analysis", "Feature Adoption"]
+        ["Your Data", "Global Overview", "Cost Analysis", "Feature Adoption", "AI Cache"]
     )
     
     # Main content
@@ -125,6 +126,8 @@ def main():
         show_cost_analysis(insights, days)
     elif analysis_type == "Feature Adoption":
         show_feature_adoption(insights, days)
+    elif analysis_type == "AI Cache":
+        show_cache_performance()
 
 def show_user_insights(insights, user_email, days):
     """Show insights for a specific user"""
@@ -293,6 +296,43 @@ def show_cost_analysis(insights, days):
     st.subheader("💡 Cost Insights")
     st.write(f"**Highest Cost User:** {costs['highest_cost_user']}")
     st.write(f"**Costliest Feature:** {costs['costliest_feature']}")
+    
+    from assistant.model_router import model_router
+    
+    st.subheader("🧭 Cost by Model")
+    model_usage = insights.db.get_model_usage(days)
+    if model_usage:
+        model_df = pd.DataFrame([
+            {'feature': feature, 'model': model, **row}
+            for feature, models in model_usage.items() for model, row in models.items()
+        ])
+        st.dataframe(model_df.rename(columns={'avg_latency_ms': 'avg latency (ms)'}), use_container_width=True)
+        st.caption("Each call is priced by its model's prompt and completion rates")
+    else:
+        st.info("No routed calls recorded yet")
+    
+    st.subheader("✂️ Prompt Compaction")
+    savings = insights.db.get_prompt_savings(days)
+    if savings:
+        savings_df = pd.DataFrame.from_dict(savings, orient='index')
+        # Saved input tokens, at the prompt rate of the model serving each feature
+        savings_df['cost_saved_usd'] = [
+            model_router.cost(model_router.policy(feature).model, saved, 0)
+            for feature, saved in savings_df['tokens_saved'].items()
+        ]
+        st.dataframe(savings_df, use_container_width=True)
+        st.caption("Input tokens kept out of prompts by summarizing history, capping free text and the per-feature budgets")
+    else:
+        st.info("No compacted prompts recorded yet")
+    
+    st.subheader("🧩 Unusable Responses")
+    failures = insights.db.get_output_failures(days)
+    if failures:
+        failures_df = pd.DataFrame.from_dict(failures, orient='index')
+        st.dataframe(failures_df.rename(columns={'failure_rate': 'failure_rate (%)'}), use_container_width=True)
+        st.caption("Paid calls whose response couldn't be parsed or repaired into the expected structure")
+    else:
+        st.info("No unusable AI responses recorded")
 
 def show_feature_adoption(insights, days):
     """Show feature adoption analysis"""
@@ -341,5 +381,144 @@ def show_feature_adoption(insights, days):
             st.write(f"• **{feature.title()}**: {data['adoption_rate']}% adoption "
                     f"({data['users']} users, {data['total_usage']} total uses)")
 
+def show_cache_performance():
+    """Show AI cache hit rates, savings and lookup latency since the app started"""
+    from assistant.ai_cache import ai_cache, cache_refresher
+    from assistant.single_flight import ai_single_flight
+    from assistant.deadlines import ai_deadlines
+    from assistant.resilience import openai_resilience
+    from assistant.scheduler import ai_scheduler
+    from assistant.model_router import model_router
+    from assistant.structured_output import task_plan_parser
+    
+    st.header("⚡ AI Cache Performance")
+    st.caption("Counters cover this app process since it started")
+    
+    stats = ai_cache.get_cache_stats()
+    
+    # Overall cache metrics
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Hit Rate", f"{stats['hit_rate']}%", f"{stats['hits']} hits / {stats['misses']} misses",
+                  delta_color="off")
+    with col2:
+        st.metric("Tokens Saved", f"{stats['tokens_saved']:,}")
+    with col3:
+        st.metric("Dollars Saved", f"${stats['cost_saved_usd']:.4f}")
+    with col4:
+        st.metric("Stored Entries", stats['total_entries'], f"{stats['cache_size_mb']:.2f} MB", delta_color="off")
+    
+    refresh_stats = cache_refresher.get_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Expirations", stats['expirations'])
+    with col2:
+        st.metric("Memory Evictions", stats['evictions'])
+    with col3:
+        st.metric("Memory Tier", stats['memory_entries'], f"{stats['memory_bytes'] / 1024:.1f} KB", delta_color="off")
+    with col4:
+        st.metric("Stale Served", stats['stale_hits'],
+                  f"{refresh_stats['completed']} refreshed / {refresh_stats['failed']} failed", delta_color="off")
+    
+    flight_stats = ai_single_flight.get_stats()
+    st.metric("Coalesced Requests", flight_stats['coalesced'],
+              f"{flight_stats['executed']} API calls for {flight_stats['calls']} requests", delta_color="off")
+    
+    # Per-feature and per-user breakdowns
+    columns = ['hits', 'misses', 'stale_hits', 'expirations', 'evictions', 'bytes_stored', 'tokens_saved', 'cost_saved_usd']
+    
+    st.subheader("🧩 By Feature")
+    if stats['by_feature']:
+        feature_df = pd.DataFrame.from_dict(stats['by_feature'], orient='index')[columns]
+        feature_df['hit_rate (%)'] = (feature_df['hits'] / (feature_df['hits'] + feature_df['misses']).clip(lower=1) * 100).round(1)
+        st.dataframe(feature_df, use_container_width=True)
+    else:
+        st.info("No cache lookups yet")
+    
+    st.subheader("👤 By User")
+    if stats['by_user']:
+        user_df = pd.DataFrame.from_dict(stats['by_user'], orient='index')[columns]
+        # Mask emails for privacy
+        user_df.index = [user.split('@')[0] + '@***' for user in user_df.index]
+        st.dataframe(user_df, use_container_width=True)
+    
+    st.subheader("🔌 OpenAI Resilience")
+    resilience_stats = openai_resilience.get_stats()
+    breaker = resilience_stats['breaker']
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        state_labels = {'closed': "🟢 Closed", 'half_open': "🟡 Half-open", 'open': "🔴 Open"}
+        st.metric("Circuit", state_labels[breaker['state']],
+                  f"probe in {breaker['seconds_until_probe']}s" if breaker['state'] == 'open' else None, delta_color="off")
+    with col2:
+        st.metric("Retries", resilience_stats['retries'], f"{resilience_stats['calls']} calls", delta_color="off")
+    with col3:
+        st.metric("Failed Calls", resilience_stats['failed'],
+                  f"{breaker['consecutive_failures']} consecutive failures", delta_color="off")
+    with col4:
+        st.metric("Short-Circuited", resilience_stats['short_circuited'],
+                  f"circuit opened {breaker['opened']}x", delta_color="off")
+    
+    st.subheader("🚦 Request Scheduler")
+    scheduler_stats = ai_scheduler.get_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("In Flight", f"{scheduler_stats['active']} / {scheduler_stats['max_concurrent']}")
+    with col2:
+        st.metric("Queued Now", scheduler_stats['queued'],
+                  f"{scheduler_stats['granted']} granted / {scheduler_stats['queued_total']} had to wait", delta_color="off")
+    with col3:
+        st.metric("Turned Away", scheduler_stats['rejected'], "queues full", delta_color="off")
+    with col4:
+        st.metric("Gave Up Waiting", scheduler_stats['timed_out'])
+    if scheduler_stats['wait_by_feature']:
+        wait_df = pd.DataFrame.from_dict(scheduler_stats['wait_by_feature'], orient='index')
+        st.dataframe(wait_df.rename(columns=lambda column: column.replace('_ms', ' (ms)')), use_container_width=True)
+        st.caption("Time requests spent queued for an OpenAI slot")
+    
+    st.subheader("🧭 Model Routing")
+    routing_stats = model_router.get_stats()
+    if routing_stats:
+        routing_df = pd.DataFrame([
+            {'feature': feature, 'model': model, 'escalations': stats_row['escalations'], **model_stats}
+            for feature, stats_row in routing_stats.items() for model, model_stats in stats_row['by_model'].items()
+        ])
+        st.dataframe(routing_df.rename(columns=lambda column: column.replace('_ms', ' (ms)')), use_container_width=True)
+        st.caption("Invalid responses were escalated to the next model of the feature's cascade")
+    else:
+        st.info("No routed AI calls yet")
+    
+    st.subheader("🧩 Structured Output")
+    output_stats = task_plan_parser.get_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Task Plans Checked", output_stats['responses'])
+    with col2:
+        st.metric("Valid As Sent", output_stats['valid'])
+    with col3:
+        st.metric("Repaired Locally", output_stats['repaired'])
+    with col4:
+        st.metric("Unusable", output_stats['invalid'])
+    if output_stats['repairs']:
+        st.write("**Repairs:** " + ", ".join(f"{name} ({count})" for name, count in sorted(output_stats['repairs'].items())))
+    
+    st.subheader("⏳ Deadline Misses")
+    deadline_stats = ai_deadlines.get_stats()
+    if deadline_stats:
+        deadline_df = pd.DataFrame.from_dict(deadline_stats, orient='index')
+        deadline_df = deadline_df.rename(columns={'deadline_seconds': 'deadline (s)', 'miss_rate': 'miss_rate (%)'})
+        st.dataframe(deadline_df, use_container_width=True)
+        st.caption("Calls past their deadline showed rule-based content and finished in the background to fill the cache")
+    else:
+        st.info("No deadline-bounded AI calls yet")
+    
+    st.subheader("⏱️ Lookup Latency")
+    latency = stats['lookup_latency_ms']
+    st.write(f"**Lookups:** {latency['count']} | **Average:** {latency['avg_ms']} ms")
+    if latency['count']:
+        latency_df = pd.DataFrame(list(latency['buckets'].items()), columns=['Latency', 'Lookups'])
+        st.bar_chart(latency_df.set_index('Latency'))
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
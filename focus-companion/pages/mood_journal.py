@@ -96,17 +96,17 @@ else:
     
     # Add mood entries
     for entry in mood_data:
-        entry['type'] = 'mood'
-        entry['display_date'] = datetime.fromisoformat(entry['timestamp']).strftime("%B %d, %Y")
-        entry['display_time'] = datetime.fromisoformat(entry['timestamp']).strftime("%I:%M %p")
-        all_entries.append(entry)
+        logged_at = datetime.fromisoformat(entry['timestamp'])
+        all_entries.append(dict(entry, type='mood',
+                                display_date=logged_at.strftime("%B %d, %Y"),
+                                display_time=logged_at.strftime("%I:%M %p")))
     
     # Add check-in entries
     for entry in checkin_data:
-        entry['type'] = 'checkin'
-        entry['display_date'] = datetime.fromisoformat(entry['timestamp']).strftime("%B %d, %Y")
-        entry['display_time'] = datetime.fromisoformat(entry['timestamp']).strftime("%I:%M %p")
-        all_entries.append(entry)
+        logged_at = datetime.fromisoformat(entry['timestamp'])
+        all_entries.append(dict(entry, type='checkin',
+                                display_date=logged_at.strftime("%B %d, %Y"),
+                                display_time=logged_at.strftime("%I:%M %p")))
     
     # Sort by timestamp (newest first)
     all_entries.sort(key=lambda x: x['timestamp'], reverse=True)
@@ -284,8 +284,8 @@ else:
         if mood_note.strip() and st.session_state.mood_data:
             if st.button("📝 Add Note to Last Entry", type="secondary"):
                 # Update the most recent mood entry with the note
-                latest_entry = st.session_state.mood_data[-1]
-                latest_entry['note'] = mood_note.strip()
+                latest_entry = dict(st.session_state.mood_data[-1], note=mood_note.strip())
+                st.session_state.mood_data[-1] = latest_entry
                 # Update in persistent storage
                 save_mood_data(latest_entry)
                 st.info("📝 Note added to your latest mood entry!")
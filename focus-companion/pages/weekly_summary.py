@@ -6,7 +6,6 @@ AI-generated insights and rewards based on user's weekly data
 import streamlit as st
 import sys
 import os
-from datetime import datetime, timedelta
 from pathlib import Path
 
 # Add the parent directory to Python path
@@ -17,6 +16,7 @@ sys.path.insert(0, str(project_root))
 from data.storage import load_user_profile, load_checkin_data, load_mood_data
 from data.insights import DatabaseInsights
 from assistant.ai_service import AIService
+from assistant.weekly_analysis import get_week_date_range, get_week_data, analyze_weekly_patterns
 from assistant.fallback import FallbackAssistant
 from auth import require_beta_access, get_user_email
 
@@ -86,90 +86,6 @@ with st.sidebar:
 # Require beta access
 require_beta_access()
 
-def get_week_date_range():
-    """Get the date range for the current week (Monday to Sunday)"""
-    today = datetime.now()
-    # Find Monday of current week
-    monday = today - timedelta(days=today.weekday())
-    # Find Sunday of current week
-    sunday = monday + timedelta(days=6)
-    return monday.date(), sunday.date()
-
-def get_week_data(checkin_data, mood_data, start_date, end_date):
-    """Filter data for the current week"""
-    week_checkins = []
-    week_moods = []
-    
-    for checkin in checkin_data:
-        checkin_date = datetime.fromisoformat(checkin['timestamp']).date()
-        if start_date <= checkin_date <= end_date:
-            week_checkins.append(checkin)
-    
-    for mood in mood_data:
-        mood_date = datetime.fromisoformat(mood['timestamp']).date()
-        if start_date <= mood_date <= end_date:
-            week_moods.append(mood)
-    
-    return week_checkins, week_moods
-
-def analyze_weekly_patterns(checkins, moods):
-    """Analyze patterns in weekly data"""
-    if not checkins and not moods:
-        return None
-    
-    analysis = {
-        'total_checkins': len(checkins),
-        'total_mood_entries': len(moods),
-        'checkin_days': [],
-        'mood_days': [],
-        'energy_patterns': {},
-        'mood_patterns': {},
-        'time_periods': {},
-        'accomplishments': [],
-        'challenges': []
-    }
-    
-    # Analyze check-ins
-    for checkin in checkins:
-        date = datetime.fromisoformat(checkin['timestamp']).date()
-        day_name = date.strftime('%A')
-        analysis['checkin_days'].append(day_name)
-        
-        # Energy patterns
-        if 'energy_level' in checkin:
-            energy = checkin['energy_level']
-            if day_name not in analysis['energy_patterns']:
-                analysis['energy_patterns'][day_name] = []
-            analysis['energy_patterns'][day_name].append(energy)
-        
-        # Time periods
-        time_period = checkin.get('time_period', 'unknown')
-        if time_period not in analysis['time_periods']:
-            analysis['time_periods'][time_period] = 0
-        analysis['time_periods'][time_period] += 1
-        
-        # Accomplishments and challenges
-        if 'accomplishments' in checkin and checkin['accomplishments']:
-            analysis['accomplishments'].append(checkin['accomplishments'])
-        if 'challenges' in checkin and checkin['challenges']:
-            analysis['challenges'].append(checkin['challenges'])
-    
-    # Analyze mood data
-    for mood in moods:
-        date = datetime.fromisoformat(mood['timestamp']).date()
-        day_name = date.strftime('%A')
-        analysis['mood_days'].append(day_name)
-        
-        mood_type = mood.get('mood', 'unknown')
-        intensity = mood.get('intensity', 5)
-        
-        if day_name not in analysis['mood_patterns']:
-            analysis['mood_patterns'][day_name] = {'moods': [], 'intensities': []}
-        analysis['mood_patterns'][day_name]['moods'].append(mood_type)
-        analysis['mood_patterns'][day_name]['intensities'].append(intensity)
-    
-    return analysis
-
 def generate_weekly_summary_prompt(user_profile, week_analysis, start_date, end_date):
     """Generate a comprehensive prompt for AI weekly summary with structured questions"""
     
@@ -341,8 +257,14 @@ def main():
         # Generate prompt
         prompt = generate_weekly_summary_prompt(user_profile, week_analysis, start_date, end_date)
         
-        # Get AI summary
-        summary = ai_service.generate_weekly_summary(user_profile, week_analysis, user_email)
+        # Stream the AI summary as it is written; usage is recorded and the text cached when it ends
+        summary = None
+        stream = ai_service.stream_weekly_summary(user_profile, week_analysis, user_email)
+        if stream:
+            status_text.text("✍️ Writing your weekly insights...")
+            draft = st.empty()
+            summary = draft.write_stream(stream)
+            draft.empty()
         
         # Complete progress
         progress_bar.progress(100)
@@ -353,14 +275,6 @@ def main():
             
             # Display structured summary
             display_structured_summary(summary)
-            
-            # Record AI usage
-            ai_service.usage_limiter.record_api_call(
-                user_email=user_email,
-                feature="weekly_summary",
-                tokens_used=None,  # Will be calculated by AI service
-                cost_usd=None
-            )
         else:
             # Fallback to rule-based summary
             st.info("📊 **Your Weekly Summary**")
@@ -571,12 +485,11 @@ def display_gpt_quota_badge(user_email):
         return
     
     try:
-        from assistant.usage_limiter import UsageLimiter
-        usage_limiter = UsageLimiter()
+        from assistant.services import get_usage_limiter
+        usage_limiter = get_usage_limiter()
         
         # Get user's current usage
-        user_usage = usage_limiter.db.get_user_api_usage(user_email, days=1)
-        daily_used = sum(user_usage["daily_usage"].values())
+        daily_used = usage_limiter.counter.get_counts(user_email)["user_daily"]
         daily_limit = usage_limiter.user_daily_limit
         
         # Calculate usage percentage
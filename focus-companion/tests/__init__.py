@@ -10,6 +10,20 @@ __author__ = "Focus Companion Team"
 TEST_CATEGORIES = {
     "unit": [
         "test_storage",
+        "test_database",
+        "test_usage_limiter",
+        "test_timeline",
+        "test_journal",
+        "test_single_flight",
+        "test_services",
+        "test_ai_service",
+        "test_deadlines",
+        "test_resilience",
+        "test_scheduler",
+        "test_prompt_budget",
+        "test_model_router",
+        "test_structured_output",
+        "test_weekly_batch",
         "test_logic", 
         "test_fallback",
         "test_prompts"
@@ -4,6 +4,9 @@ Tests for AI Cache functionality
 
 import unittest
 import tempfile
+import shutil
+import threading
+import time
 import os
 import json
 from datetime import datetime, timedelta
@@ -14,7 +17,9 @@ import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from assistant.ai_cache import AICache, PromptOptimizer
+from assistant.ai_cache import AICache, CacheRefresher, PromptOptimizer
+from assistant.cache_keys import time_of_day, intensity_bucket
+from cache_replay_cli import compare_keys
 
 class TestAICache(unittest.TestCase):
     """Test AI Cache functionality"""
@@ -28,15 +33,12 @@ class TestAICache(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test environment"""
-        # Remove temporary files
-        if os.path.exists(self.cache_file):
-            os.remove(self.cache_file)
-        if os.path.exists(self.temp_dir):
-            os.rmdir(self.temp_dir)
+        # Remove temporary files (cache database and its WAL files)
+        shutil.rmtree(self.temp_dir)
     
     def test_cache_initialization(self):
         """Test cache initialization"""
-        self.assertEqual(len(self.cache.cache), 0)
+        self.assertEqual(self.cache.get_cache_stats()['total_entries'], 0)
         self.assertEqual(self.cache.max_cache_age_hours, 1)
     
     def test_cache_response(self):
@@ -90,13 +92,11 @@ class TestAICache(unittest.TestCase):
         # Cache a response
         self.cache.cache_response(feature, user_email, input_data, response)
         
-        # Manually set the timestamp to be old
-        cache_key = self.cache._generate_cache_key(feature, user_email, input_data)
-        old_time = datetime.now() - timedelta(hours=2)  # 2 hours ago
-        self.cache.cache[cache_key]['timestamp'] = old_time.isoformat()
+        # Look the entry up 2 hours later
+        with patch('assistant.ai_cache.time.time', return_value=time.time() + 2 * 3600):
+            cached_response = self.cache.get_cached_response(feature, user_email, input_data)
         
         # Should not return expired cache
-        cached_response = self.cache.get_cached_response(feature, user_email, input_data)
         self.assertIsNone(cached_response)
     
     def test_cache_ignores_timestamps(self):
@@ -144,6 +144,322 @@ class TestAICache(unittest.TestCase):
         self.cache.clear_cache()
         stats = self.cache.get_cache_stats()
         self.assertEqual(stats['total_entries'], 0)
+    
+    def test_cache_response_upserts(self):
+        """Test caching the same input again replaces the single stored row"""
+        self.cache.cache_response("greeting", "user1@test.com", {"mood": "happy"}, "Hello!")
+        self.cache.cache_response("greeting", "user1@test.com", {"mood": "happy"}, "Hi again!")
+        
+        self.assertEqual(self.cache.get_cache_stats()['total_entries'], 1)
+        self.assertEqual(self.cache.get_cached_response("greeting", "user1@test.com", {"mood": "happy"}), "Hi again!")
+    
+    def test_purge_expired(self):
+        """Test the batched sweep removes only rows past their stale grace period"""
+        self.cache.cache_response("greeting", "user1@test.com", {"mood": "happy"}, "Hello!")
+        with patch('assistant.ai_cache.time.time', return_value=time.time() + 2 * 3600):
+            self.assertEqual(self.cache.purge_expired(), 0)
+        with patch('assistant.ai_cache.time.time', return_value=time.time() + 14 * 3600):
+            self.cache.cache_response("greeting", "user2@test.com", {"mood": "sad"}, "Hi there!")
+            self.assertEqual(self.cache.purge_expired(), 1)
+            self.assertEqual(self.cache.get_cache_stats()['total_entries'], 1)
+    
+    def test_imports_legacy_json_cache(self):
+        """Test entries from the old JSON cache file are carried over"""
+        key = self.cache._generate_cache_key("greeting", "user1@test.com", {"mood": "happy"})
+        with open(self.cache_file, 'w') as f:
+            json.dump({key: {
+                'feature': 'greeting',
+                'user_email': 'user1@test.com',
+                'response': 'Hello from JSON!',
+                'timestamp': datetime.now().isoformat()
+            }}, f)
+        
+        cache = AICache(self.cache_file, max_cache_age_hours=1)
+        
+        self.assertEqual(cache.get_cached_response("greeting", "user1@test.com", {"mood": "happy"}), "Hello from JSON!")
+
+class TestTwoTierCache(unittest.TestCase):
+    """Test the memory tier, its caps and per-feature TTLs"""
+    
+    def setUp(self):
+        """Set up a cache with a small memory tier"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = AICache(os.path.join(self.temp_dir, "test_cache.json"),
+                             max_memory_entries=2, max_memory_bytes=10000)
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_hot_entries_served_from_memory(self):
+        """Test a memory hit does not query the persistent store"""
+        self.cache.cache_response("greeting", "user1@test.com", {"mood": "happy"}, "Hello!")
+        
+        with patch.object(self.cache, "_connection") as connection:
+            self.assertEqual(self.cache.get_cached_response("greeting", "user1@test.com", {"mood": "happy"}), "Hello!")
+            connection.assert_not_called()
+    
+    def test_memory_tier_is_bounded(self):
+        """Test LRU eviction by entry count and by bytes"""
+        for i in range(3):
+            self.cache.cache_response("greeting", "user1@test.com", {"i": i}, "Hello!")
+        self.assertEqual(self.cache.get_cache_stats()['memory_entries'], 2)
+        
+        self.cache.cache_response("weekly_summary", "user1@test.com", {"week": 1}, "x" * 9950)
+        stats = self.cache.get_cache_stats()
+        self.assertEqual(stats['memory_entries'], 1)
+        self.assertLessEqual(stats['memory_bytes'], 10000)
+        
+        # Evicted entries are still served from the persistent tier
+        self.assertEqual(stats['total_entries'], 4)
+        self.assertEqual(self.cache.get_cached_response("greeting", "user1@test.com", {"i": 0}), "Hello!")
+    
+    def test_per_feature_ttls(self):
+        """Test greetings expire within hours while weekly summaries last days"""
+        self.cache.cache_response("greeting", "user1@test.com", {"mood": "happy"}, "Hello!")
+        self.cache.cache_response("weekly_summary", "user1@test.com", {"week": 1}, "Summary!")
+        
+        with patch('assistant.ai_cache.time.time', return_value=time.time() + 48 * 3600):
+            self.assertIsNone(self.cache.get_cached_response("greeting", "user1@test.com", {"mood": "happy"}))
+            # Past its memory TTL, so this one comes back from the persistent tier
+            self.assertEqual(self.cache.get_cached_response("weekly_summary", "user1@test.com", {"week": 1}), "Summary!")
+
+class TestCacheInstrumentation(unittest.TestCase):
+    """Test hit/miss, savings and latency counters"""
+    
+    def setUp(self):
+        """Set up a cache with a one-entry memory tier"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = AICache(os.path.join(self.temp_dir, "test_cache.json"), max_memory_entries=1)
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_hits_misses_and_savings(self):
+        """Test counters per feature and per user, with savings from recorded tokens"""
+        self.cache.get_cached_response("greeting", "user1@test.com", {"mood": "happy"})
+        self.cache.cache_response("greeting", "user1@test.com", {"mood": "happy"}, "Hello!",
+                                  tokens_used=120, cost_usd=0.00024)
+        for _ in range(2):
+            self.cache.get_cached_response("greeting", "user1@test.com", {"mood": "happy"})
+        
+        stats = self.cache.get_cache_stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['tokens_saved'], 240)
+        self.assertAlmostEqual(stats['cost_saved_usd'], 0.00048)
+        self.assertEqual(stats['by_feature']['greeting']['bytes_stored'], 6)
+        self.assertEqual(stats['by_user']['user1@test.com']['hits'], 2)
+        self.assertEqual(stats['lookup_latency_ms']['count'], 3)
+        self.assertEqual(sum(stats['lookup_latency_ms']['buckets'].values()), 3)
+        
+        rate = self.cache.get_cache_hit_rate("user1@test.com")
+        self.assertAlmostEqual(rate['hit_rate'], 66.7)
+    
+    def test_expirations_and_evictions(self):
+        """Test expired lookups and memory evictions are counted"""
+        self.cache.cache_response("greeting", "user1@test.com", {"mood": "happy"}, "Hello!")
+        self.cache.cache_response("greeting", "user1@test.com", {"mood": "sad"}, "Hi there!")
+        
+        with patch('assistant.ai_cache.time.time', return_value=time.time() + 2 * 3600):
+            self.cache.get_cached_response("greeting", "user1@test.com", {"mood": "happy"})
+        
+        stats = self.cache.get_cache_stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['expirations'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+class TestKeyNormalizers(unittest.TestCase):
+    """Test per-feature key normalizers, traffic recording and replay"""
+    
+    def setUp(self):
+        """Set up a cache that records its traffic"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.traffic_log = os.path.join(self.temp_dir, "traffic.jsonl")
+        self.cache = AICache(os.path.join(self.temp_dir, "test_cache.json"), traffic_log=self.traffic_log)
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.temp_dir)
+    
+    def _task_context(self, hour, all_checkins):
+        """A task planning context like generate_ai_task_plan builds"""
+        checkin = {"energy_level": "High", "focus_today": "Write report", "timestamp": f"2024-01-01T{hour:02d}:00:00"}
+        return {
+            "time_period": time_of_day(hour),
+            "current_hour": hour,
+            "user_goal": "Improve focus",
+            "current_checkin": checkin,
+            "recent_moods": [{"mood": "Happy", "intensity": 8}],
+            "recent_checkins": [{"energy_level": "High"}],
+            "all_checkins": all_checkins,
+            "focus_today": "Write report",
+            "energy_level": "High"
+        }
+    
+    def test_buckets(self):
+        """Test hour and intensity buckets"""
+        self.assertEqual([time_of_day(h) for h in (4, 9, 13, 20)], ["evening", "morning", "afternoon", "evening"])
+        self.assertEqual(intensity_bucket([8, 7]), "positive")
+        self.assertEqual(intensity_bucket([5, 6]), "stable")
+        self.assertEqual(intensity_bucket([2]), "challenging")
+        self.assertIsNone(intensity_bucket([]))
+    
+    def test_greeting_ignores_fields_outside_the_prompt(self):
+        """Test greetings share a key when only the raw moods and check-ins differ"""
+        data1 = {"time_context": "morning", "mood_summary": "positive", "checkin_summary": "",
+                 "recent_moods": [{"mood": "Happy", "intensity": 8}], "recent_checkins": []}
+        data2 = {"time_context": "morning", "mood_summary": "positive", "checkin_summary": "Your energy has been high",
+                 "recent_moods": [{"mood": "Calm", "intensity": 7}], "recent_checkins": [{"energy_level": "High"}]}
+        self.assertEqual(self.cache._generate_cache_key("greeting", "u@test.com", data1),
+                         self.cache._generate_cache_key("greeting", "u@test.com", data2))
+        self.assertNotEqual(self.cache._generate_cache_key("greeting", "u@test.com", data1, normalize=False),
+                            self.cache._generate_cache_key("greeting", "u@test.com", data2, normalize=False))
+        
+        data2["time_context"] = "evening"
+        self.assertNotEqual(self.cache._generate_cache_key("greeting", "u@test.com", data1),
+                            self.cache._generate_cache_key("greeting", "u@test.com", data2))
+    
+    def test_profile_edits_change_keys(self):
+        """Test a new goal or tone misses the greetings and weekly summaries written for the old one"""
+        greeting = {"time_context": "morning", "mood_summary": "positive", "user_goal": "Focus", "user_tone": "Friendly"}
+        week = {"total_checkins": 3, "total_mood_entries": 2, "checkin_days": ["Monday"], "energy_patterns": {},
+                "mood_patterns": {}, "user_goal": "Focus", "user_tone": "Friendly"}
+        for feature, data in (("greeting", greeting), ("weekly_summary", week)):
+            key = self.cache.cache_key(feature, "u@test.com", data)
+            self.assertNotEqual(key, self.cache.cache_key(feature, "u@test.com", dict(data, user_goal="Sleep better")))
+            self.assertNotEqual(key, self.cache.cache_key(feature, "u@test.com", dict(data, user_tone="Direct")))
+    
+    def test_unknown_fields_stay_in_the_key(self):
+        """Test fields a normalizer doesn't know are hashed rather than dropped"""
+        for feature in ("greeting", "weekly_summary", "task_planning"):
+            self.assertNotEqual(self.cache.cache_key(feature, "u@test.com", {"mood": "happy"}),
+                                self.cache.cache_key(feature, "u@test.com", {"mood": "sad"}))
+    
+    def test_task_planning_buckets_hour_and_drops_history(self):
+        """Test task plans share a key within a time period regardless of the full check-in history"""
+        key1 = self.cache._generate_cache_key("task_planning", "u@test.com", self._task_context(9, []))
+        key2 = self.cache._generate_cache_key("task_planning", "u@test.com", self._task_context(11, [{"energy_level": "Low"}]))
+        key3 = self.cache._generate_cache_key("task_planning", "u@test.com", self._task_context(14, []))
+        self.assertEqual(key1, key2)
+        self.assertNotEqual(key1, key3)
+    
+    def test_register_key_normalizer(self):
+        """Test custom normalizers, and falling back to the raw input when one fails"""
+        self.cache.register_key_normalizer("encouragement", lambda data: {"energy": data["checkin_summary"]})
+        key1 = self.cache._generate_cache_key("encouragement", "u@test.com", {"checkin_summary": "Good", "extra": 1})
+        key2 = self.cache._generate_cache_key("encouragement", "u@test.com", {"checkin_summary": "Good", "extra": 2})
+        self.assertEqual(key1, key2)
+        
+        key3 = self.cache._generate_cache_key("encouragement", "u@test.com", {"extra": 1})
+        key4 = self.cache._generate_cache_key("encouragement", "u@test.com", {"extra": 2})
+        self.assertNotEqual(key3, key4)
+    
+    def test_replay_reports_gain(self):
+        """Test recorded lookups replay with a higher hit rate on normalized keys"""
+        for hour in (8, 9, 10, 11):
+            self.cache.get_cached_response("task_planning", "u@test.com", self._task_context(hour, [{"hour": hour}]))
+        
+        from data.journal import JsonlJournal
+        records = JsonlJournal(self.traffic_log).read_entries()
+        self.assertEqual(len(records), 4)
+        
+        report = compare_keys(records, self.cache)["task_planning"]
+        self.assertEqual(report["lookups"], 4)
+        self.assertEqual(report["raw_hit_rate"], 0)
+        self.assertEqual(report["normalized_hit_rate"], 75.0)
+        self.assertEqual(report["calls_saved"], 3)
+    
+    def test_replay_honours_ttl(self):
+        """Test a normalized key misses again once its feature TTL has passed"""
+        data = {"time_context": "morning", "mood_summary": "positive"}
+        records = [{"ts": ts, "feature": "greeting", "user_email": "u@test.com", "input": data}
+                   for ts in (0, 600, 2 * 3600)]
+        report = compare_keys(records, self.cache)["greeting"]
+        self.assertEqual(report["normalized_hit_rate"], 33.3)
+
+class TestStaleWhileRevalidate(unittest.TestCase):
+    """Test stale responses and the background refresher"""
+    
+    def setUp(self):
+        """Set up test environment"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = AICache(os.path.join(self.temp_dir, "test_cache.json"))
+        self.data = {"time_context": "morning", "mood_summary": "positive"}
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_stale_within_grace_period(self):
+        """Test expired greetings are served stale until their grace period ends"""
+        self.cache.cache_response("greeting", "u@test.com", self.data, "Good morning!")
+        self.cache.cache_response("task_planning", "u@test.com", {"time_period": "morning"}, "{}")
+        
+        with patch('assistant.ai_cache.time.time', return_value=time.time() + 2 * 3600):
+            self.assertIsNone(self.cache.get_cached_response("greeting", "u@test.com", self.data))
+            self.assertEqual(self.cache.get_cached_or_stale("greeting", "u@test.com", self.data), ("Good morning!", True))
+        with patch('assistant.ai_cache.time.time', return_value=time.time() + 14 * 3600):
+            self.assertEqual(self.cache.get_cached_or_stale("greeting", "u@test.com", self.data), (None, False))
+        with patch('assistant.ai_cache.time.time', return_value=time.time() + 73 * 3600):
+            # No grace period for task plans
+            self.assertEqual(self.cache.get_cached_or_stale("task_planning", "u@test.com", {"time_period": "morning"}), (None, False))
+        
+        self.assertEqual(self.cache.get_cache_stats()['stale_hits'], 1)
+    
+    def test_fresh_entries_are_not_stale(self):
+        """Test a live entry is returned as fresh"""
+        self.cache.cache_response("greeting", "u@test.com", self.data, "Good morning!")
+        self.assertEqual(self.cache.get_cached_or_stale("greeting", "u@test.com", self.data), ("Good morning!", False))
+    
+    def test_refresher_deduplicates_keys(self):
+        """Test only one refresh per key is in flight and the refresh writes back"""
+        refresher = CacheRefresher(max_workers=2)
+        release = threading.Event()
+        
+        def refresh():
+            release.wait(5)
+            self.cache.cache_response("greeting", "u@test.com", self.data, "Fresh greeting!")
+        
+        future = refresher.submit("key", refresh)
+        self.assertIsNone(refresher.submit("key", refresh))
+        self.assertEqual(refresher.get_stats()['in_flight'], 1)
+        release.set()
+        future.result(5)
+        
+        stats = refresher.get_stats()
+        self.assertEqual((stats['scheduled'], stats['deduplicated'], stats['completed'], stats['in_flight']), (1, 1, 1, 0))
+        self.assertEqual(self.cache.get_cached_response("greeting", "u@test.com", self.data), "Fresh greeting!")
+        
+        # The key can be refreshed again once the first refresh is done
+        refresher.submit("key", lambda: None).result(5)
+        self.assertEqual(refresher.get_stats()['scheduled'], 2)
+    
+    def test_service_serves_stale_and_refreshes(self):
+        """Test AIService returns the stale greeting at once and the refresh writes the new one back"""
+        from assistant.ai_service import AIService
+        service = AIService.__new__(AIService)
+        service._chat_completion = MagicMock(return_value="Fresh greeting!")
+        refresher = CacheRefresher(max_workers=1)
+        self.cache.cache_response("greeting", "u@test.com", self.data, "Good morning!")
+        
+        with patch('assistant.ai_service.ai_cache', self.cache), \
+             patch('assistant.ai_service.cache_refresher', refresher), \
+             patch('assistant.ai_cache.time.time', return_value=time.time() + 2 * 3600):
+            response = service._cached_or_revalidate("greeting", "u@test.com", self.data, [], max_tokens=100, temperature=0.7)
+            self.assertEqual(response, "Good morning!")
+            refresher._executor.shutdown(wait=True)
+            self.assertEqual(self.cache.get_cached_response("greeting", "u@test.com", self.data), "Fresh greeting!")
+        service._chat_completion.assert_called_once()
+    
+    def test_refresher_counts_failures(self):
+        """Test a failing refresh is counted and releases its key"""
+        refresher = CacheRefresher(max_workers=1)
+        future = refresher.submit("key", lambda: 1 / 0)
+        future.result(5)
+        self.assertEqual(refresher.get_stats()['failed'], 1)
+        self.assertEqual(refresher.get_stats()['in_flight'], 0)
 
 class TestPromptOptimizer(unittest.TestCase):
     """Test Prompt Optimizer functionality"""
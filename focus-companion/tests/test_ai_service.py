@@ -0,0 +1,140 @@
+"""
+Tests for AIService request paths
+"""
+
+import unittest
+import unittest.mock
+import threading
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+# Add the parent directory to Python path
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from assistant.ai_service import AIService
+
+def make_chunk(content=None, prompt_tokens=None, completion_tokens=None):
+    """A streamed completion chunk; the usage-only final chunk has no choices"""
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                            total_tokens=prompt_tokens + completion_tokens) if prompt_tokens else None
+    return SimpleNamespace(choices=choices, usage=usage)
+
+WEEK_ANALYSIS = {
+    "total_checkins": 3, "total_mood_entries": 2, "checkin_days": ["Monday", "Tuesday"],
+    "energy_patterns": {"Monday": ["High"]}, "mood_patterns": {"Monday": {"moods": ["Happy"], "intensities": [8]}}
+}
+
+class TestStreaming(unittest.TestCase):
+    """Test streamed responses are yielded incrementally, then recorded and cached"""
+
+    def setUp(self):
+        """Build a service with a fake client, limiter and cache"""
+        self.service = AIService.__new__(AIService)
+        self.service.can_use_feature = MagicMock(return_value=(True, ""))
+        self.service.usage_limiter = MagicMock()
+        self.reservation = object()
+        self.service.usage_limiter.reserve_api_call.return_value = (self.reservation, "")
+        self.create = MagicMock()
+        self.service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=self.create)))
+        self.cache = MagicMock()
+        self.cache.get_cached_response.return_value = None
+        self.cache_patch = patch('assistant.ai_service.ai_cache', self.cache)
+        self.cache_patch.start()
+
+    def tearDown(self):
+        """Remove patches"""
+        self.cache_patch.stop()
+
+    def test_weekly_summary_streams_then_records_and_caches(self):
+        """Test chunks arrive one by one and usage and cache are written only at the end"""
+        self.create.return_value = iter([make_chunk("Great "), make_chunk("week!"), make_chunk(prompt_tokens=30, completion_tokens=12)])
+
+        stream = self.service.stream_weekly_summary({}, WEEK_ANALYSIS, "u@test.com")
+        self.assertEqual(next(stream), "Great ")
+        self.service.usage_limiter.commit_api_call.assert_not_called()
+        self.cache.cache_response.assert_not_called()
+
+        self.assertEqual(list(stream), ["week!"])
+        self.assertTrue(self.create.call_args.kwargs['stream'])
+        # Prompt and completion tokens are priced at the routed model's rates
+        cost = (30 * 0.15 + 12 * 0.60) / 1_000_000
+        self.assertEqual(self.create.call_args.kwargs['model'], "gpt-4o-mini")
+        self.service.usage_limiter.commit_api_call.assert_called_once_with(
+            self.reservation, tokens_used=42, cost_usd=cost, tokens_saved=unittest.mock.ANY,
+            model="gpt-4o-mini", latency_ms=unittest.mock.ANY, error_message=None)
+        # The profile's goal and tone are part of the cache input, since the prompt embeds them
+        input_data = {**WEEK_ANALYSIS, "user_goal": "Improve focus and productivity", "user_tone": "Friendly"}
+        self.cache.cache_response.assert_called_once_with(
+            "weekly_summary", "u@test.com", input_data, "Great week!", tokens_used=42, cost_usd=cost)
+
+    def test_cached_response_comes_back_whole(self):
+        """Test a cache hit is a single chunk and makes no request"""
+        self.cache.get_cached_response.return_value = "Cached summary"
+        stream = self.service.stream_weekly_summary({}, WEEK_ANALYSIS, "u@test.com")
+        self.assertEqual(list(stream), ["Cached summary"])
+        self.create.assert_not_called()
+
+    def test_failed_request_releases_reservation(self):
+        """Test an error before streaming starts releases the slot and returns None"""
+        self.create.side_effect = RuntimeError("connection refused")
+        self.assertIsNone(self.service.stream_weekly_summary({}, WEEK_ANALYSIS, "u@test.com"))
+        self.service.usage_limiter.release_api_call.assert_called_once_with(self.reservation)
+        self.service.usage_limiter.commit_api_call.assert_not_called()
+
+    def test_identical_stream_in_flight_is_shared(self):
+        """Test a second identical request waits for the first stream's text instead of calling the API"""
+        self.create.return_value = iter([make_chunk("Great "), make_chunk("week!"), make_chunk(prompt_tokens=30, completion_tokens=12)])
+        leader = self.service.stream_weekly_summary({}, WEEK_ANALYSIS, "u@test.com")
+        self.assertEqual(next(leader), "Great ")
+
+        followers = []
+        follower = threading.Thread(target=lambda: followers.append(
+            list(self.service.stream_weekly_summary({}, WEEK_ANALYSIS, "u@test.com"))))
+        follower.start()
+        self.assertEqual(list(leader), ["week!"])
+        follower.join(5)
+
+        self.assertEqual(followers, [["Great week!"]])
+        self.create.assert_called_once()
+        self.service.usage_limiter.commit_api_call.assert_called_once()
+
+    def test_abandoned_stream_releases_waiters(self):
+        """Test closing a stream part-way fails its waiters and lets the next request call the API"""
+        self.create.return_value = iter([make_chunk("Great "), make_chunk("week!")])
+        leader = self.service.stream_weekly_summary({}, WEEK_ANALYSIS, "u@test.com")
+        next(leader)
+        leader.close()
+
+        self.create.return_value = iter([make_chunk("Fresh")])
+        self.assertEqual(list(self.service.stream_weekly_summary({}, WEEK_ANALYSIS, "u@test.com")), ["Fresh"])
+        self.assertEqual(self.create.call_count, 2)
+
+    def test_task_plan_streams_and_validates(self):
+        """Test a streamed task plan is cached when valid, and an unusable draft is re-asked on the next model"""
+        checkin = {"energy_level": "High", "focus_today": "Write report"}
+        self.create.return_value = iter([make_chunk('{"tasks": '), make_chunk('["Draft"]}'), make_chunk(prompt_tokens=6, completion_tokens=4)])
+        self.assertEqual("".join(self.service.stream_ai_task_plan({}, checkin, [], "u@test.com")), '{"tasks": ["Draft"]}')
+        self.assertEqual(self.create.call_args.kwargs['response_format'], {"type": "json_object"})
+        self.assertEqual(self.cache.cache_response.call_args.args[3], '{"tasks": ["Draft"]}')
+
+        reasked = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='{"tasks": ["Outline"]}'))],
+                                  usage=SimpleNamespace(prompt_tokens=6, completion_tokens=4, total_tokens=10))
+        self.create.side_effect = [iter([make_chunk("Sorry, I can't"), make_chunk(prompt_tokens=3, completion_tokens=2)]), reasked]
+        self.assertEqual("".join(self.service.stream_ai_task_plan({}, checkin, [], "u@test.com")), "Sorry, I can't")
+
+        # The draft is recorded as a failed call and the next model's answer is cached
+        self.assertEqual(self.create.call_args.kwargs['model'], "gpt-4o")
+        self.assertFalse(self.create.call_args.kwargs.get('stream', False))
+        commits = self.service.usage_limiter.commit_api_call.call_args_list
+        self.assertEqual([c.kwargs['error_message'] for c in commits[-2:]], ["Invalid structured output", None])
+        self.assertEqual(self.cache.cache_response.call_args.args[3], '{"tasks": ["Outline"]}')
+
+        self.cache.get_cached_response.return_value = '{"tasks": ["Outline"]}'
+        plan = self.service.cached_task_plan({}, checkin, [], "u@test.com")
+        self.assertEqual(plan['tasks'], ["Outline"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,341 @@
+"""
+Tests for the SQLite database manager
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+import threading
+import time
+from unittest.mock import patch
+
+# Add the parent directory to Python path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from data.database import DatabaseManager, days_ago_epoch
+
+class TestDatabaseConnectionPool(unittest.TestCase):
+    """Test pooled connections and WAL configuration"""
+
+    def setUp(self):
+        """Set up a temporary database"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.temp_dir, "test.db"), pool_size=4)
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_wal_mode_enabled(self):
+        """Test connections use WAL journaling and the configured pragmas"""
+        with self.db.connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], DatabaseManager.BUSY_TIMEOUT_MS)
+
+    def test_connections_are_reused(self):
+        """Test sequential operations reuse the same pooled connection"""
+        with self.db.connection() as conn1:
+            pass
+        self.db.save_mood_log("test@example.com", "😊 Happy", 8)
+        with self.db.connection() as conn2:
+            pass
+
+        self.assertIs(conn1, conn2)
+        self.assertEqual(self.db._connections_created, 1)
+
+    def test_rollback_on_error(self):
+        """Test a failing block does not leave partial writes behind"""
+        with self.assertRaises(RuntimeError):
+            with self.db.connection() as conn:
+                conn.execute("INSERT INTO mood_logs (user_email, mood, intensity) VALUES ('a@b.com', 'Calm', 5)")
+                raise RuntimeError("boom")
+
+        self.assertEqual(self.db.get_mood_logs("a@b.com"), [])
+
+    def test_concurrent_reads_and_writes(self):
+        """Test many threads share the bounded pool without errors"""
+        errors = []
+
+        def worker(index):
+            try:
+                email = f"user{index % 5}@example.com"
+                for _ in range(10):
+                    self.db.save_mood_log(email, "😌 Calm", 6)
+                    self.db.get_mood_logs(email)
+                    self.db.get_user_api_usage(email, days=1)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertLessEqual(self.db._connections_created, 4)
+        self.assertEqual(self.db.get_database_stats()["mood_logs_count"], 200)
+
+class TestWriteBehind(unittest.TestCase):
+    """Test write-behind batching of mood logs, check-ins and API usage"""
+
+    def setUp(self):
+        """Set up a temporary database with write-behind enabled"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "test.db")
+        # Long interval so only size triggers and explicit flushes write
+        self.db = DatabaseManager(self.db_path, write_behind=True, batch_size=50, flush_interval=60)
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def _count_rows(self, table):
+        """Count rows directly, bypassing the read-side flush"""
+        with self.db.connection() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_writes_are_queued_until_flush(self):
+        """Test events are buffered and committed in one batch"""
+        self.db.save_mood_log("test@example.com", "😊 Happy", 8)
+        self.db.save_checkin("test@example.com", {"time_period": "morning", "energy_level": "High"})
+        self.db.record_api_usage("test@example.com", "greeting", tokens_used=50, cost_usd=0.0001)
+
+        self.assertEqual(self._count_rows("mood_logs"), 0)
+        self.assertEqual(self.db.get_write_behind_stats()["queue_depth"], 3)
+
+        self.assertEqual(self.db.flush(), 3)
+        self.assertEqual(self._count_rows("mood_logs"), 1)
+        self.assertEqual(self._count_rows("checkins"), 1)
+        self.assertEqual(self._count_rows("api_usage"), 1)
+
+        stats = self.db.get_write_behind_stats()
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["flush_count"], 1)
+        self.assertEqual(stats["rows_flushed"], 3)
+        self.assertGreater(stats["last_flush_ms"], 0)
+
+    def test_reads_see_queued_writes(self):
+        """Test reads flush pending writes first"""
+        self.db.save_mood_log("test@example.com", "😌 Calm", 6, "note")
+
+        logs = self.db.get_mood_logs("test@example.com")
+        self.assertEqual(len(logs), 1)
+        self.assertEqual(logs[0]["notes"], "note")
+
+    def test_batch_size_triggers_background_flush(self):
+        """Test the flusher wakes up once a full batch is queued"""
+        for i in range(50):
+            self.db.record_api_usage("test@example.com", "greeting")
+
+        for _ in range(100):
+            if self._count_rows("api_usage") == 50:
+                break
+            time.sleep(0.05)
+        self.assertEqual(self._count_rows("api_usage"), 50)
+
+    def test_close_flushes_pending_writes(self):
+        """Test nothing is lost on clean shutdown"""
+        for i in range(10):
+            self.db.save_mood_log("test@example.com", "😊 Happy", i)
+        self.db.close()
+
+        reopened = DatabaseManager(self.db_path, write_behind=False)
+        self.assertEqual(len(reopened.get_mood_logs("test@example.com")), 10)
+        reopened.close()
+
+    def test_reads_wait_for_in_flight_flush(self):
+        """Test a read waits for a batch the flusher has taken off the queue but not yet committed"""
+        self.db.save_mood_log("test@example.com", "😌 Calm", 6)
+        queue = self.db._write_queue
+        committing, release = threading.Event(), threading.Event()
+        commit = queue._commit
+
+        def slow_commit(batch):
+            committing.set()
+            release.wait(5)
+            commit(batch)
+
+        reads = []
+        with patch.object(queue, "_commit", side_effect=slow_commit):
+            flusher = threading.Thread(target=queue.flush)
+            flusher.start()
+            committing.wait(5)
+            self.assertEqual(queue.pending_count(), 0)
+
+            reader = threading.Thread(target=lambda: reads.append(self.db.get_mood_logs("test@example.com")))
+            reader.start()
+            reader.join(0.2)
+            self.assertTrue(reader.is_alive())
+            release.set()
+            flusher.join(5)
+            reader.join(5)
+
+        self.assertEqual(len(reads[0]), 1)
+
+    def test_failed_rows_are_dead_lettered(self):
+        """Test a bad row doesn't hold back its batch or get retried forever"""
+        self.db.save_mood_log("test@example.com", "😊 Happy", 8)
+        self.db._write_queue.enqueue("INSERT INTO missing_table (x) VALUES (?)", (1,))
+        self.db.save_mood_log("test@example.com", "😌 Calm", 6)
+
+        self.assertEqual(self.db.flush(), 2)
+        self.assertEqual(self._count_rows("mood_logs"), 2)
+        stats = self.db.get_write_behind_stats()
+        self.assertEqual((stats["queue_depth"], stats["failed_flushes"], stats["dead_letters"]), (0, 1, 1))
+        dead = self.db._write_queue.get_dead_letters()
+        self.assertEqual(dead[0]["params"], (1,))
+        self.assertIn("missing_table", dead[0]["error"])
+        self.assertEqual(self.db.flush(), 0)
+
+class TestUsageRollup(unittest.TestCase):
+    """Test the trigger-maintained daily API usage rollup"""
+
+    def setUp(self):
+        """Set up a temporary database"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "test.db")
+        self.db = DatabaseManager(self.db_path, write_behind=False)
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def _rollup(self):
+        """All rollup rows keyed by (user, feature)"""
+        with self.db.connection() as conn:
+            rows = conn.execute(
+                "SELECT user_email, feature, call_count, tokens_used, cost_usd FROM api_usage_daily"
+            ).fetchall()
+        return {(r[0], r[1]): r[2:] for r in rows}
+
+    def test_insert_trigger_aggregates_calls(self):
+        """Test inserts are folded into one row per user, day and feature"""
+        self.db.record_api_usage("a@test.com", "greeting", tokens_used=100, cost_usd=0.25)
+        self.db.record_api_usage("a@test.com", "greeting", tokens_used=50, cost_usd=0.5)
+        self.db.record_api_usage("a@test.com", "task_planning")
+
+        rollup = self._rollup()
+        self.assertEqual(rollup[("a@test.com", "greeting")], (2, 150, 0.75))
+        self.assertEqual(rollup[("a@test.com", "task_planning")], (1, 0, 0))
+
+    def test_delete_trigger_removes_user_rows(self):
+        """Test deleting a user's usage also clears their rollup rows"""
+        self.db.record_api_usage("a@test.com", "greeting", tokens_used=100, cost_usd=0.25)
+        self.db.record_api_usage("b@test.com", "greeting", tokens_used=100, cost_usd=0.25)
+
+        self.db.delete_user_data("a@test.com")
+
+        self.assertEqual(list(self._rollup()), [("b@test.com", "greeting")])
+
+    def test_readers_use_rollup(self):
+        """Test usage readers report the same numbers as the raw table"""
+        for feature in ["greeting", "greeting", "weekly_summary"]:
+            self.db.record_api_usage("a@test.com", feature, tokens_used=10, cost_usd=0.5)
+
+        usage = self.db.get_user_api_usage("a@test.com", days=1)
+        self.assertEqual(sum(usage["daily_usage"].values()), 3)
+        self.assertEqual(usage["feature_usage"], {"greeting": 2, "weekly_summary": 1})
+        self.assertAlmostEqual(usage["total_cost"], 1.5)
+
+        global_usage = self.db.get_global_api_usage(days=30)
+        self.assertEqual(sum(global_usage["monthly_usage"].values()), 3)
+
+    def test_backfill_matches_raw_rows(self):
+        """Test the backfill rebuilds history written before the rollup existed"""
+        with self.db.connection() as conn:
+            conn.execute("DROP TRIGGER trg_api_usage_rollup_insert")
+            conn.executemany(
+                "INSERT INTO api_usage (user_email, feature, tokens_used, cost_usd, created_at) "
+                "VALUES (?, ?, ?, ?, datetime('now', ?))",
+                [("a@test.com", "greeting", 10, 0.5, f"-{i} days") for i in range(5)]
+            )
+        self.assertEqual(self._rollup(), {})
+
+        self.assertEqual(self.db.backfill_usage_rollup(), 5)
+        self.assertEqual(sum(self.db.get_user_api_usage("a@test.com", days=30)["daily_usage"].values()), 5)
+
+    def test_insights_reports_read_rollup(self):
+        """Test the cost and feature adoption reports run against the rollup"""
+        from data.insights import DatabaseInsights
+        self.db.save_user_profile("a@test.com", {"goal": "Focus"})
+        self.db.record_api_usage("a@test.com", "greeting", tokens_used=100, cost_usd=0.25)
+        self.db.record_api_usage("a@test.com", "task_planning", tokens_used=50, cost_usd=0.5)
+        insights = DatabaseInsights(db=self.db)
+
+        costs = insights.get_cost_analysis(days=7)
+        self.assertEqual(costs["total_calls"], 2)
+        self.assertAlmostEqual(costs["total_cost"], 0.75)
+        self.assertEqual(costs["costliest_feature"], "task_planning")
+
+        adoption = insights.get_feature_adoption_analysis(days=7)
+        self.assertEqual(adoption["total_users"], 1)
+        self.assertEqual(adoption["feature_adoption"]["greeting"]["adoption_rate"], 100.0)
+
+class TestHistoryQueryPlans(unittest.TestCase):
+    """Test history reads use index range scans on the epoch columns"""
+
+    ROWS = 1_000_000
+
+    @classmethod
+    def setUpClass(cls):
+        """Seed a large mood log table spread over 50 users and a year of history"""
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.db = DatabaseManager(os.path.join(cls.temp_dir, "test.db"), pool_size=1, write_behind=False)
+        now = days_ago_epoch(0)
+        with cls.db.connection() as conn:
+            conn.execute("""
+                WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+                INSERT INTO mood_logs (user_email, mood, intensity, created_at, created_at_epoch)
+                SELECT 'user' || (n % 50) || '@test.com', 'Calm', n % 10,
+                       datetime(? - n * 30, 'unixepoch'), ? - n * 30
+                FROM seq
+            """, (cls.ROWS - 1, now, now))
+            conn.execute("ANALYZE")
+
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up the temporary database"""
+        cls.db.close()
+        shutil.rmtree(cls.temp_dir)
+
+    def _query_plan(self, read):
+        """Run a reader, capture its SELECT and return the EXPLAIN QUERY PLAN details"""
+        statements = []
+        with self.db.connection() as conn:
+            conn.set_trace_callback(statements.append)
+        try:
+            read()
+        finally:
+            with self.db.connection() as conn:
+                conn.set_trace_callback(None)
+
+        selects = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+        with self.db.connection() as conn:
+            return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + selects[0])]
+
+    def test_mood_history_uses_index_range_scan(self):
+        """Test the mood history read is a range search on (user_email, created_at_epoch)"""
+        plan = self._query_plan(lambda: self.db.get_mood_logs("user7@test.com", days=7))
+
+        self.assertTrue(any("SEARCH mood_logs USING INDEX idx_mood_logs_user_epoch" in step
+                            and "created_at_epoch>?" in step for step in plan), plan)
+        self.assertFalse(any("TEMP B-TREE" in step for step in plan), plan)
+
+    def test_range_results(self):
+        """Test the range predicate returns the expected window, newest first"""
+        logs = self.db.get_mood_logs("user7@test.com", days=1)
+
+        # One row every 30s round-robin over 50 users: 2880 rows per day, 57-58 per user
+        self.assertIn(len(logs), (57, 58))
+        self.assertEqual(logs, sorted(logs, key=lambda log: log["created_at"], reverse=True))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""
+Tests for deadline-bounded AI calls
+"""
+
+import unittest
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+# Add the parent directory to Python path
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from assistant.deadlines import DeadlineRunner, DeadlineExceeded
+
+def wait_for(condition, timeout=5):
+    """Poll until condition() holds or the timeout passes"""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+class TestDeadlineRunner(unittest.TestCase):
+    """Test calls are abandoned at their deadline but keep running"""
+
+    def setUp(self):
+        """Set up a runner with short deadlines"""
+        self.runner = DeadlineRunner({'weekly_summary': 0.1, 'greeting': 0.1})
+
+    def test_fast_call_returns_result(self):
+        """Test a call within its deadline returns normally and counts as a hit"""
+        self.assertEqual(self.runner.run('greeting', lambda: "Hello!"), "Hello!")
+        stats = self.runner.get_stats()['greeting']
+        self.assertEqual((stats['calls'], stats['misses'], stats['miss_rate']), (1, 0, 0))
+
+    def test_slow_call_raises_and_finishes_late(self):
+        """Test a slow call raises at the deadline and hands its result to on_late"""
+        release = threading.Event()
+        late_results = []
+
+        started = time.perf_counter()
+        with self.assertRaises(DeadlineExceeded):
+            self.runner.run('weekly_summary', lambda: release.wait(5) and "Summary!", on_late=late_results.append)
+        self.assertLess(time.perf_counter() - started, 1)
+
+        release.set()
+        self.assertTrue(wait_for(lambda: late_results == ["Summary!"]))
+        self.runner.run('weekly_summary', lambda: "Fast")
+        stats = self.runner.get_stats()['weekly_summary']
+        self.assertEqual((stats['calls'], stats['misses'], stats['miss_rate']), (2, 1, 50.0))
+
+    def test_errors_within_deadline_propagate(self):
+        """Test a call that fails in time raises its own error and is not a miss"""
+        def fail():
+            raise RuntimeError("API down")
+
+        with self.assertRaises(RuntimeError):
+            self.runner.run('greeting', fail)
+        self.assertEqual(self.runner.get_stats()['greeting']['misses'], 0)
+
+    def test_features_without_deadline_run_inline(self):
+        """Test a feature with no deadline runs on the caller's thread"""
+        self.runner.deadlines.pop('greeting')
+        self.assertIs(self.runner.run('greeting', threading.current_thread), threading.current_thread())
+
+class TestServiceDeadlines(unittest.TestCase):
+    """Test AIService falls back past a deadline and caches the late response"""
+
+    def setUp(self):
+        """Build a service with a slow fake completion and a short weekly summary deadline"""
+        from assistant.ai_service import AIService
+        self.service = AIService.__new__(AIService)
+        self.service.can_use_feature = MagicMock(return_value=(True, ""))
+        self.release = threading.Event()
+        self.service._chat_completion = MagicMock(side_effect=lambda *args, **kwargs: self.release.wait(5) and "Great week!")
+        self.cache = MagicMock()
+        self.cache.get_cached_response.return_value = None
+        self.cache.cache_key.return_value = "summary-key"
+        self.runner = DeadlineRunner({'weekly_summary': 0.1})
+        self.patches = [patch('assistant.ai_service.ai_cache', self.cache),
+                        patch('assistant.ai_service.ai_deadlines', self.runner)]
+        for p in self.patches:
+            p.start()
+        self.week_analysis = {
+            "total_checkins": 2, "total_mood_entries": 1, "checkin_days": ["Monday"],
+            "energy_patterns": {}, "mood_patterns": {}
+        }
+
+    def tearDown(self):
+        """Remove patches"""
+        self.release.set()
+        for p in self.patches:
+            p.stop()
+
+    def test_weekly_summary_falls_back_then_caches(self):
+        """Test a slow summary returns None at the deadline and is cached once it arrives"""
+        started = time.perf_counter()
+        self.assertIsNone(self.service.generate_weekly_summary({}, self.week_analysis, "u@test.com"))
+        self.assertLess(time.perf_counter() - started, 1)
+        self.cache.cache_response.assert_not_called()
+
+        self.release.set()
+        self.assertTrue(wait_for(lambda: self.cache.cache_response.called))
+        self.cache.cache_response.assert_called_once_with(
+            "weekly_summary", "u@test.com", self.service._weekly_summary_request({}, self.week_analysis)['input_data'],
+            "Great week!")
+        self.assertEqual(self.runner.get_stats()['weekly_summary']['misses'], 1)
+
+    def test_stream_deadline_covers_first_token(self):
+        """Test a stream with no first token by the deadline falls back and is cached in the background"""
+        def chunks():
+            self.release.wait(5)
+            yield "Great "
+            yield "week!"
+
+        self.service._chat_completion_stream = MagicMock(return_value=chunks())
+        self.assertIsNone(self.service.stream_weekly_summary({}, self.week_analysis, "u@test.com"))
+
+        self.release.set()
+        self.assertTrue(wait_for(lambda: self.cache.cache_response.called))
+        self.assertEqual(self.cache.cache_response.call_args.args[3], "Great week!")
+
+if __name__ == "__main__":
+    unittest.main()
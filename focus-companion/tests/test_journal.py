@@ -0,0 +1,89 @@
+"""
+Tests for the append-only JSONL journal behind the JSON backups
+"""
+
+import unittest
+import tempfile
+import shutil
+import json
+import os
+
+# Add the parent directory to Python path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from data.journal import JsonlJournal
+
+class TestJsonlJournal(unittest.TestCase):
+    """Test appends, tombstones, compaction and the legacy JSON view"""
+
+    def setUp(self):
+        """Set up a journal in a temporary directory"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.legacy_path = os.path.join(self.temp_dir, "mood_data.json")
+        self.journal = JsonlJournal(os.path.join(self.temp_dir, "mood_data.jsonl"),
+                                    legacy_path=self.legacy_path, compact_threshold=3)
+
+    def tearDown(self):
+        """Clean up the temporary directory"""
+        shutil.rmtree(self.temp_dir)
+
+    def _line_count(self):
+        """Number of records in the journal file"""
+        with open(self.journal.path) as f:
+            return len(f.readlines())
+
+    def test_append_writes_one_line(self):
+        """Test each save appends a single record without rewriting earlier ones"""
+        for i in range(5):
+            self.journal.append({"timestamp": f"t{i}", "mood": "😌 Calm"})
+
+        self.assertEqual(self._line_count(), 5)
+        self.assertEqual([e["timestamp"] for e in self.journal.read_entries()], ["t0", "t1", "t2", "t3", "t4"])
+
+    def test_delete_and_compaction(self):
+        """Test tombstones hide entries and trigger compaction once enough pile up"""
+        for i in range(5):
+            self.journal.append({"timestamp": f"t{i}"})
+
+        self.journal.delete("t1")
+        self.journal.delete("t3")
+        self.assertEqual(self._line_count(), 7)
+        self.assertEqual([e["timestamp"] for e in self.journal.read_entries()], ["t0", "t2", "t4"])
+
+        self.journal.delete("t0")
+        self.assertEqual(self.journal.get_stats()["compactions"], 1)
+        self.assertEqual(self._line_count(), 2)
+        self.assertEqual([e["timestamp"] for e in self.journal.read_entries()], ["t2", "t4"])
+
+    def test_imports_existing_legacy_json(self):
+        """Test history from an existing JSON backup is carried into a new journal"""
+        with open(self.legacy_path, "w") as f:
+            json.dump([{"timestamp": "old"}], f)
+
+        self.journal.append({"timestamp": "new"})
+
+        self.assertEqual([e["timestamp"] for e in self.journal.read_entries()], ["old", "new"])
+
+    def test_export_legacy_json(self):
+        """Test the legacy JSON array can be rebuilt on demand"""
+        self.journal.replace([{"timestamp": "a"}, {"timestamp": "b"}])
+        self.journal.delete("a")
+
+        path = self.journal.export_legacy_json()
+
+        with open(path) as f:
+            self.assertEqual(json.load(f), [{"timestamp": "b"}])
+
+    def test_torn_line_is_skipped(self):
+        """Test a partial line left by a crash mid-append does not break reads"""
+        self.journal.append({"timestamp": "a"})
+        with open(self.journal.path, "a") as f:
+            f.write('{"op": "add", "entry": {"timest')
+
+        self.journal.append({"timestamp": "b"})
+
+        self.assertEqual(self.journal.read_entries(), [{"timestamp": "a"}, {"timestamp": "b"}])
+
+if __name__ == "__main__":
+    unittest.main()
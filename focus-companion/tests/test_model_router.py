@@ -0,0 +1,156 @@
+"""
+Tests for per-feature model routing, pricing and the escalation cascade
+"""
+
+import unittest
+import tempfile
+import shutil
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+# Add the parent directory to Python path
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from assistant.model_router import ModelRouter, ModelPolicy, DEFAULT_POLICY
+from assistant.deadlines import DEFAULT_DEADLINES_SECONDS
+from data.database import DatabaseManager
+from assistant.usage_limiter import UsageLimiter
+
+def completion(content, prompt_tokens=100, completion_tokens=50):
+    """A chat completion response with a prompt/completion token split"""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                              total_tokens=prompt_tokens + completion_tokens)
+    )
+
+class TestModelRouter(unittest.TestCase):
+    """Test policies, pricing and routing statistics"""
+
+    def setUp(self):
+        """Set up a router with a routing log"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.temp_dir, "routing.jsonl")
+        self.router = ModelRouter(routing_log=self.log_path)
+
+    def tearDown(self):
+        """Clean up the routing log"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_policies(self):
+        """Test features get their policy, unknown features the default"""
+        self.assertEqual(self.router.sampling('weekly_summary'), {'max_tokens': 400, 'temperature': 0.8})
+        self.assertEqual(self.router.policy('task_planning').models, ['gpt-4o-mini', 'gpt-4o'])
+        self.assertIs(self.router.policy('unknown'), DEFAULT_POLICY)
+        router = ModelRouter(policies={'greeting': ModelPolicy(['gpt-4o'], max_tokens=50, temperature=0.2)})
+        self.assertEqual(router.policy('greeting').model, 'gpt-4o')
+
+    def test_deadlines_follow_latency_slos(self):
+        """Test the deadline runner uses the policies' latency SLOs"""
+        self.assertEqual(DEFAULT_DEADLINES_SECONDS['greeting'], self.router.policy('greeting').latency_slo)
+        self.assertNotIn('mood_analysis', DEFAULT_DEADLINES_SECONDS)
+
+    def test_cost(self):
+        """Test prompt and completion tokens are priced separately per model"""
+        self.assertAlmostEqual(self.router.cost('gpt-4o-mini', 1000, 1000), (0.15 + 0.60) / 1000)
+        self.assertAlmostEqual(self.router.cost('gpt-4o', 1000, 0), 2.50 / 1000)
+        # No split: the total is priced at the completion rate; unknown models at the flat default
+        self.assertAlmostEqual(self.router.cost('gpt-4o', None, None, 1000), 10.00 / 1000)
+        self.assertAlmostEqual(self.router.cost('some-new-model', 500, 500), 2.00 / 1000)
+        self.assertIsNone(self.router.cost('gpt-4o', None, None))
+
+    def test_decisions_are_recorded_and_logged(self):
+        """Test latencies, invalid responses and escalations show in stats and the log"""
+        self.router.record('task_planning', 'gpt-4o-mini', 800)
+        self.router.record_invalid('task_planning', 'gpt-4o-mini', 'gpt-4o')
+        self.router.record('task_planning', 'gpt-4o', 2000, step=1)
+
+        stats = self.router.get_stats()['task_planning']
+        self.assertEqual((stats['calls'], stats['escalations']), (2, 1))
+        self.assertEqual(stats['by_model']['gpt-4o-mini']['invalid'], 1)
+        self.assertEqual(stats['by_model']['gpt-4o']['avg_latency_ms'], 2000)
+
+        entries = self.router._log.read_entries()
+        self.assertEqual([entry['model'] for entry in entries], ['gpt-4o-mini', 'gpt-4o-mini', 'gpt-4o'])
+        self.assertEqual(entries[1]['escalated_to'], 'gpt-4o')
+
+class TestCascade(unittest.TestCase):
+    """Test AIService escalates only responses that fail validation"""
+
+    def setUp(self):
+        """Build a service with a fake client and limiter, and a fresh router"""
+        from assistant.ai_service import AIService
+        self.service = AIService.__new__(AIService)
+        self.service.client = MagicMock()
+        self.service.usage_limiter = MagicMock()
+        self.service.usage_limiter.reserve_api_call.return_value = (object(), "")
+        self.router = ModelRouter()
+        self.router_patch = patch('assistant.ai_service.model_router', self.router)
+        self.router_patch.start()
+
+    def tearDown(self):
+        """Remove patches"""
+        self.router_patch.stop()
+
+    def _complete(self, validate=None):
+        """Run a task planning completion"""
+        return self.service._chat_completion("task_planning", "u@test.com", messages=[], max_tokens=600,
+                                             temperature=0.7, validate=validate)
+
+    def test_valid_response_is_not_escalated(self):
+        """Test a valid plan from the cheap model is the only call"""
+        self.service.client.chat.completions.create.return_value = completion('{"tasks": ["Draft the intro"]}')
+        self.assertEqual(self._complete(self.service._is_task_plan), '{"tasks": ["Draft the intro"]}')
+        self.service.client.chat.completions.create.assert_called_once()
+        self.assertEqual(self.service.client.chat.completions.create.call_args.kwargs['model'], 'gpt-4o-mini')
+        self.assertEqual(self.router.get_stats()['task_planning']['escalations'], 0)
+
+    def test_invalid_response_is_escalated(self):
+        """Test a plan that doesn't parse is retried on the next model, and both calls are costed"""
+        self.service.client.chat.completions.create.side_effect = [completion("Sorry, I can't make a plan today."),
+                                                                   completion('{"tasks": ["Draft the intro"]}')]
+        self.assertEqual(self._complete(self.service._is_task_plan), '{"tasks": ["Draft the intro"]}')
+
+        models = [call.kwargs['model'] for call in self.service.client.chat.completions.create.call_args_list]
+        self.assertEqual(models, ['gpt-4o-mini', 'gpt-4o'])
+        commits = self.service.usage_limiter.commit_api_call.call_args_list
+        self.assertEqual([call.kwargs['model'] for call in commits], ['gpt-4o-mini', 'gpt-4o'])
+        self.assertAlmostEqual(commits[1].kwargs['cost_usd'], (100 * 2.50 + 50 * 10.00) / 1_000_000)
+        stats = self.router.get_stats()['task_planning']
+        self.assertEqual((stats['escalations'], stats['by_model']['gpt-4o-mini']['invalid']), (1, 1))
+
+    def test_without_validation_no_cascade(self):
+        """Test unvalidated requests use only the first model, whatever they return"""
+        self.service.client.chat.completions.create.return_value = completion("Sorry")
+        self.assertEqual(self._complete(), "Sorry")
+        self.service.client.chat.completions.create.assert_called_once()
+
+class TestModelUsageRecorded(unittest.TestCase):
+    """Test the model and latency are stored with the API call"""
+
+    def setUp(self):
+        """Set up a temporary database"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.temp_dir, "test.db"), write_behind=False)
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_model_usage_rolls_up(self):
+        """Test committed calls roll up per feature and model"""
+        limiter = UsageLimiter(db=self.db)
+        for model, latency in (('gpt-4o-mini', 800), ('gpt-4o-mini', 1200), ('gpt-4o', 3000)):
+            reservation, _ = limiter.reserve_api_call("u@test.com", "task_planning")
+            limiter.commit_api_call(reservation, tokens_used=150, cost_usd=0.001, model=model, latency_ms=latency)
+
+        usage = self.db.get_model_usage(days=1)["task_planning"]
+        self.assertEqual(usage['gpt-4o-mini']['calls'], 2)
+        self.assertEqual(usage['gpt-4o-mini']['avg_latency_ms'], 1000.0)
+        self.assertEqual(usage['gpt-4o']['calls'], 1)
+
+if __name__ == "__main__":
+    unittest.main()
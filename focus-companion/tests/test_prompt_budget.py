@@ -0,0 +1,155 @@
+"""
+Tests for prompt token budgets
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+
+# Add the parent directory to Python path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from assistant.prompt_budget import (
+    PromptBudget, PromptSection, REQUIRED, estimate_tokens, estimate_message_tokens,
+    truncate_to_tokens, summarize_moods, summarize_energy
+)
+from data.database import DatabaseManager
+from assistant.usage_limiter import UsageLimiter
+
+class TestTokenEstimates(unittest.TestCase):
+    """Test local token estimates and the compaction helpers"""
+
+    def test_estimate_tokens(self):
+        """Test words and punctuation count, long words count extra"""
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("Plan my day."), 4)
+        self.assertGreater(estimate_tokens("internationalization"), 1)
+        # Roughly four characters per token on ordinary prose
+        prose = "Write two encouraging paragraphs that celebrate the progress made this week. " * 10
+        self.assertAlmostEqual(estimate_tokens(prose) / len(prose), 0.25, delta=0.08)
+
+    def test_truncate_to_tokens(self):
+        """Test long text is cut at a word boundary and marked"""
+        text = "finish the report then review the slides and email the team " * 10
+        truncated = truncate_to_tokens(text, 20)
+        self.assertLessEqual(estimate_tokens(truncated), 20)
+        self.assertTrue(truncated.endswith("…"))
+        self.assertTrue(text.startswith(truncated[:-1]))
+        self.assertEqual(truncate_to_tokens("short", 20), "short")
+
+    def test_history_summaries(self):
+        """Test mood and energy history become short statistics"""
+        moods = [{"mood": "Calm", "intensity": 6}, {"mood": "Calm", "intensity": 7}, {"moods": ["Tired"], "intensity": 4}]
+        self.assertEqual(summarize_moods(moods), "Calm x2, Tired x1 (avg intensity 5.7/10)")
+        self.assertEqual(summarize_moods([]), "No recent moods")
+        self.assertEqual(summarize_energy([{"energy_level": "High"}, {"energy_level": "Low"}]), "High -> Low (falling)")
+        self.assertEqual(summarize_energy([]), "No recent check-ins")
+
+class TestPromptBudget(unittest.TestCase):
+    """Test sections are fitted under the ceiling by priority"""
+
+    def setUp(self):
+        """Set up a budget with a tight ceiling"""
+        self.budget = PromptBudget({'task_planning': 60})
+        self.required = PromptSection("Return a JSON plan for: " + "write report " * 5)
+        self.history = PromptSection("Recent moods: Calm x2", priority=1, raw="Recent moods: " + str([{"mood": "Calm"}] * 20))
+        self.guidance = PromptSection("\n".join(f"- Guideline number {i} about pacing" for i in range(10)), priority=2)
+
+    def test_fits_when_under_budget(self):
+        """Test nothing is dropped when the prompt fits"""
+        prompt = PromptBudget({'task_planning': 1000}).fit("task_planning", [self.required, self.history, self.guidance])
+        self.assertEqual(prompt.dropped, 0)
+        self.assertIn("Guideline number 9", prompt.text)
+        # The history summary alone saves tokens against the raw history
+        self.assertGreater(prompt.tokens_saved, 0)
+
+    def test_lowest_priority_goes_first(self):
+        """Test guidance is shortened by whole lines before history is touched"""
+        prompt = self.budget.fit("task_planning", [self.required, self.history, self.guidance])
+        self.assertLessEqual(prompt.tokens, 60)
+        self.assertIn("Recent moods: Calm x2", prompt.text)
+        self.assertIn(self.required.text, prompt.text)
+        self.assertNotIn("Guideline number 9", prompt.text)
+        self.assertTrue(all(line.endswith("pacing") for line in prompt.text.splitlines() if "Guideline" in line))
+        self.assertEqual(prompt.tokens_saved, prompt.raw_tokens - prompt.tokens)
+
+    def test_required_sections_are_kept(self):
+        """Test required sections stay even when they alone exceed the ceiling"""
+        prompt = PromptBudget({'task_planning': 5}).fit("task_planning", [self.required, self.guidance])
+        self.assertEqual(prompt.text, self.required.text)
+        self.assertEqual(prompt.dropped, 1)
+
+    def test_system_message_counts(self):
+        """Test the system message uses up part of the ceiling"""
+        without = self.budget.fit("task_planning", [self.required, self.guidance])
+        with_system = self.budget.fit("task_planning", [self.required, self.guidance], system="You are a coach. " * 5)
+        self.assertLess(len(with_system.text), len(without.text))
+
+class TestServicePrompts(unittest.TestCase):
+    """Test AIService prompts respect their budgets and report savings"""
+
+    def setUp(self):
+        """Build a bare service"""
+        from assistant.ai_service import AIService
+        self.service = AIService.__new__(AIService)
+        self.profile = {"goal": "Finish my thesis", "tone": "Friendly", "situation": "PhD student",
+                        "energy_drainers": ["Meetings"], "joy_sources": ["Music"], "small_habit": "Drink water"}
+
+    def test_task_plan_prompt_is_capped(self):
+        """Test long free text and history stay under the task planning ceiling"""
+        checkin = {"energy_level": "Moderate", "focus_today": "chapter " * 400, "current_feeling": "anxious " * 100,
+                   "sleep_quality": "Good", "day_progress": "Just started"}
+        moods = [{"mood": "Calm", "intensity": 6, "notes": "long note " * 50}] * 10
+        request = self.service._task_plan_request(dict(self.profile, situation="busy " * 200), checkin, moods)
+
+        self.assertLessEqual(estimate_message_tokens(request['messages']), 900)
+        self.assertGreater(request['tokens_saved'], 400)
+        self.assertIn("FORMAT: Return a JSON object", request['messages'][1]['content'])
+        self.assertIn("Calm x3", request['messages'][1]['content'])
+
+    def test_weekly_summary_reports_savings(self):
+        """Test the weekly summary only reports savings for what it actually compacts, the goal"""
+        week_analysis = {
+            "total_checkins": 5, "total_mood_entries": 3, "checkin_days": ["Monday", "Tuesday"],
+            "energy_patterns": {"Monday": ["High"]}, "mood_patterns": {"Monday": {"moods": ["Happy"], "intensities": [8]}},
+            "accomplishments": ["Finished the first draft of the literature review chapter"] * 5,
+            "challenges": ["Kept getting distracted by notifications in the afternoon"] * 5
+        }
+        request = self.service._weekly_summary_request({"goal": "Finish thesis", "tone": "Friendly"}, week_analysis)
+        self.assertEqual(request['tokens_saved'], 0)
+        self.assertIn("5 check-ins", request['messages'][1]['content'])
+        self.assertNotIn("literature review", request['messages'][1]['content'])
+
+        long_goal = "Finish my thesis on renewable energy policy " * 20
+        request = self.service._weekly_summary_request({"goal": long_goal, "tone": "Friendly"}, week_analysis)
+        self.assertGreater(request['tokens_saved'], 100)
+
+class TestSavingsRecorded(unittest.TestCase):
+    """Test tokens saved are stored with the API call"""
+
+    def setUp(self):
+        """Set up a temporary database"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.temp_dir, "test.db"), write_behind=False)
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_commit_records_tokens_saved(self):
+        """Test committed calls store tokens_saved and roll up per feature"""
+        limiter = UsageLimiter(db=self.db)
+        for saved in (120, 80, None):
+            reservation, _ = limiter.reserve_api_call("u@test.com", "task_planning")
+            limiter.commit_api_call(reservation, tokens_used=700, cost_usd=0.0014, tokens_saved=saved)
+
+        savings = self.db.get_prompt_savings(days=1)
+        self.assertEqual(savings["task_planning"]["calls"], 2)
+        self.assertEqual(savings["task_planning"]["tokens_saved"], 200)
+        self.assertEqual(savings["task_planning"]["avg_tokens_saved"], 100.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+Tests for the OpenAI retry policy and circuit breaker
+"""
+
+import unittest
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+import httpx
+import openai
+
+# Add the parent directory to Python path
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from assistant.resilience import (
+    CircuitBreaker, CircuitOpenError, ResilientCaller, RetryPolicy, is_retryable
+)
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+def status_error(status_code, headers=None, code=None):
+    """An OpenAI error for an HTTP status"""
+    response = httpx.Response(status_code, request=REQUEST, headers=headers)
+    body = {"code": code} if code else None
+    return openai.APIStatusError(f"HTTP {status_code}", response=response, body=body)
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestRetryPolicy(unittest.TestCase):
+    """Test which errors are retried and how long to wait"""
+
+    def test_retryable_errors(self):
+        """Test connection errors, 429 and 5xx are transient and other 4xx are not"""
+        self.assertTrue(is_retryable(openai.APIConnectionError(request=REQUEST)))
+        self.assertTrue(is_retryable(openai.APITimeoutError(request=REQUEST)))
+        self.assertTrue(is_retryable(status_error(429)))
+        self.assertTrue(is_retryable(status_error(503)))
+        self.assertFalse(is_retryable(status_error(400)))
+        self.assertFalse(is_retryable(status_error(401)))
+        self.assertFalse(is_retryable(status_error(429, code="insufficient_quota")))
+        self.assertFalse(is_retryable(ValueError("bad input")))
+
+    def test_backoff_is_jittered_and_capped(self):
+        """Test delays stay within the growing, capped backoff window"""
+        policy = RetryPolicy(base_delay=0.5, max_delay=2.0)
+        for attempt, ceiling in [(0, 0.5), (1, 1.0), (2, 2.0), (6, 2.0)]:
+            delays = [policy.delay(attempt) for _ in range(50)]
+            self.assertTrue(all(0 <= delay <= ceiling for delay in delays))
+            self.assertGreater(len(set(delays)), 1)
+
+    def test_retry_after_header_wins(self):
+        """Test the server's Retry-After is honoured within the cap"""
+        policy = RetryPolicy(max_delay=5.0)
+        self.assertEqual(policy.delay(0, status_error(429, headers={"retry-after": "3"})), 3.0)
+        self.assertEqual(policy.delay(0, status_error(429, headers={"retry-after": "60"})), 5.0)
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test the closed, open and half-open transitions"""
+
+    def setUp(self):
+        """Set up a breaker on a fake clock"""
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=self.clock)
+
+    def test_opens_after_consecutive_failures(self):
+        """Test the circuit opens at the threshold and a success resets the count"""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open())
+        self.assertFalse(self.breaker.allow_request())
+        stats = self.breaker.get_stats()
+        self.assertEqual((stats['state'], stats['opened'], stats['rejected']), ("open", 1, 1))
+
+    def test_half_open_probe(self):
+        """Test one probe is let through after the timeout and its outcome decides the state"""
+        for _ in range(3):
+            self.breaker.record_failure()
+
+        self.clock.now += 31
+        self.assertFalse(self.breaker.is_open())
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open())
+
+        self.clock.now += 31
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+class TestResilientCaller(unittest.TestCase):
+    """Test calls are retried, short-circuited and counted"""
+
+    def setUp(self):
+        """Set up a caller that doesn't really sleep"""
+        self.clock = FakeClock()
+        self.sleep = MagicMock()
+        self.caller = ResilientCaller(RetryPolicy(max_attempts=3),
+                                      CircuitBreaker(failure_threshold=4, reset_timeout=30, clock=self.clock),
+                                      sleep=self.sleep)
+
+    def test_transient_error_is_retried(self):
+        """Test a call succeeding on the third attempt returns its result after two backoffs"""
+        fn = MagicMock(side_effect=[status_error(503), openai.APIConnectionError(request=REQUEST), "ok"])
+        self.assertEqual(self.caller.call(fn), "ok")
+        self.assertEqual(fn.call_count, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+        stats = self.caller.get_stats()
+        self.assertEqual((stats['retries'], stats['breaker']['consecutive_failures']), (2, 0))
+
+    def test_permanent_error_is_not_retried(self):
+        """Test a 400 is raised at once and doesn't count against the breaker"""
+        fn = MagicMock(side_effect=status_error(400))
+        with self.assertRaises(openai.APIStatusError):
+            self.caller.call(fn)
+        fn.assert_called_once()
+        self.assertEqual(self.caller.get_stats()['breaker']['consecutive_failures'], 0)
+
+    def test_outage_opens_circuit_and_fails_fast(self):
+        """Test repeated failures open the circuit, then calls fail without reaching OpenAI"""
+        fn = MagicMock(side_effect=status_error(502))
+        with self.assertRaises(openai.APIStatusError):
+            self.caller.call(fn)
+        # The fourth consecutive failure opens the circuit and stops the retries
+        with self.assertRaises(openai.APIStatusError):
+            self.caller.call(fn)
+        self.assertEqual(fn.call_count, 4)
+
+        with self.assertRaises(CircuitOpenError):
+            self.caller.call(fn)
+        self.assertEqual(fn.call_count, 4)
+
+        # After the reset timeout a single probe closes it again
+        self.clock.now += 31
+        self.assertEqual(self.caller.call(lambda: "recovered"), "recovered")
+        stats = self.caller.get_stats()
+        self.assertEqual((stats['short_circuited'], stats['breaker']['state']), (1, "closed"))
+
+    def test_async_calls_are_retried(self):
+        """Test acall retries with a fresh coroutine per attempt"""
+        attempts = []
+
+        async def create():
+            attempts.append(1)
+            if len(attempts) < 2:
+                raise status_error(429, headers={"retry-after": "0"})
+            return "ok"
+
+        self.assertEqual(asyncio.run(self.caller.acall(create)), "ok")
+        self.assertEqual(len(attempts), 2)
+
+class TestServiceCircuit(unittest.TestCase):
+    """Test AIService routes to the fallback while the circuit is open"""
+
+    def test_open_circuit_disables_ai(self):
+        """Test an open circuit makes features unavailable without an API call"""
+        from assistant.ai_service import AIService
+        service = AIService.__new__(AIService)
+        service.client = MagicMock()
+        service.usage_limiter = MagicMock()
+        breaker = CircuitBreaker(failure_threshold=1)
+        breaker.record_failure()
+
+        with patch('assistant.ai_service.openai_resilience', ResilientCaller(breaker=breaker)):
+            self.assertFalse(service.is_available())
+            allowed, reason = service.can_use_feature("greeting", "u@test.com")
+            self.assertFalse(allowed)
+            self.assertIn("temporarily unavailable", reason)
+            self.assertIsNone(service.generate_mood_analysis([], "Focus"))
+        service.client.chat.completions.create.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
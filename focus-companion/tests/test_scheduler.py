@@ -0,0 +1,185 @@
+"""
+Tests for the fair OpenAI request scheduler
+"""
+
+import unittest
+import asyncio
+import threading
+import time
+from unittest.mock import patch, MagicMock
+
+# Add the parent directory to Python path
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from assistant.scheduler import RequestScheduler, SchedulerBusy
+
+def wait_for(condition, timeout=5):
+    """Poll until condition() holds or the timeout passes"""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+class TestRequestScheduler(unittest.TestCase):
+    """Test slots are bounded, fairly ordered and backpressured"""
+
+    def setUp(self):
+        """Set up a single-slot scheduler"""
+        self.scheduler = RequestScheduler(max_concurrent=1, max_queued=4, max_queued_per_user=2, max_wait=5)
+        self.order = []
+        self.threads = []
+
+    def tearDown(self):
+        """Let every queued request finish"""
+        for thread in self.threads:
+            thread.join(5)
+
+    def _queue(self, user, feature):
+        """Start a request that records its turn and waits until it is queued"""
+        queued = self.scheduler.get_stats()['queued']
+
+        def run():
+            with self.scheduler.slot(user, feature):
+                self.order.append((user, feature))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.threads.append(thread)
+        self.assertTrue(wait_for(lambda: self.scheduler.get_stats()['queued'] == queued + 1))
+
+    def test_concurrency_is_bounded(self):
+        """Test no more than max_concurrent requests hold a slot at once"""
+        scheduler = RequestScheduler(max_concurrent=2, max_wait=5)
+        running, peak = [0], [0]
+        lock = threading.Lock()
+
+        def request():
+            with scheduler.slot("u@test.com", "greeting"):
+                with lock:
+                    running[0] += 1
+                    peak[0] = max(peak[0], running[0])
+                time.sleep(0.05)
+                with lock:
+                    running[0] -= 1
+
+        threads = [threading.Thread(target=request) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(peak[0], 2)
+        stats = scheduler.get_stats()
+        self.assertEqual((stats['active'], stats['granted'], stats['queued']), (0, 6, 0))
+
+    def test_priority_then_round_robin(self):
+        """Test greetings go before summaries, and users take turns within a priority"""
+        self.scheduler.acquire("holder@test.com", "greeting")
+        self._queue("heavy@test.com", "task_planning")
+        self._queue("heavy@test.com", "task_planning")
+        self._queue("light@test.com", "task_planning")
+        self._queue("light@test.com", "greeting")
+        self.scheduler.release()
+        self.assertTrue(wait_for(lambda: len(self.order) == 4))
+
+        self.assertEqual(self.order, [
+            ("light@test.com", "greeting"),
+            ("heavy@test.com", "task_planning"),
+            ("light@test.com", "task_planning"),
+            ("heavy@test.com", "task_planning"),
+        ])
+
+    def test_full_queues_turn_requests_away(self):
+        """Test the per-user and overall queue bounds raise SchedulerBusy"""
+        self.scheduler.acquire("holder@test.com", "greeting")
+        self._queue("heavy@test.com", "task_planning")
+        self._queue("heavy@test.com", "task_planning")
+        with self.assertRaises(SchedulerBusy):
+            self.scheduler.acquire("heavy@test.com", "task_planning")
+
+        self._queue("a@test.com", "greeting")
+        self._queue("b@test.com", "greeting")
+        with self.assertRaises(SchedulerBusy):
+            self.scheduler.acquire("c@test.com", "greeting")
+        self.assertEqual(self.scheduler.get_stats()['rejected'], 2)
+        self.scheduler.release()
+
+    def test_waiting_too_long_gives_up(self):
+        """Test a queued request raises after max_wait and leaves the queue"""
+        scheduler = RequestScheduler(max_concurrent=1, max_wait=0.05)
+        scheduler.acquire("holder@test.com", "greeting")
+        with self.assertRaises(SchedulerBusy):
+            scheduler.acquire("u@test.com", "weekly_summary")
+        stats = scheduler.get_stats()
+        self.assertEqual((stats['queued'], stats['timed_out']), (0, 1))
+        scheduler.release()
+        self.assertEqual(scheduler.get_stats()['active'], 0)
+
+    def test_queue_waits_are_exported(self):
+        """Test granted requests record their queue wait per feature"""
+        self.scheduler.acquire("holder@test.com", "greeting")
+        self._queue("u@test.com", "weekly_summary")
+        time.sleep(0.05)
+        self.scheduler.release()
+        self.assertTrue(wait_for(lambda: len(self.order) == 1))
+
+        waits = self.scheduler.get_stats()['wait_by_feature']
+        self.assertEqual(waits['greeting']['max_ms'], 0)
+        self.assertGreaterEqual(waits['weekly_summary']['max_ms'], 40)
+
+    def test_async_slots_share_the_bound(self):
+        """Test aslot waits without blocking the loop and shares slots with threads"""
+        scheduler = RequestScheduler(max_concurrent=1, max_wait=5)
+        scheduler.acquire("holder@test.com", "greeting")
+
+        async def request():
+            async with scheduler.aslot("u@test.com", "greeting"):
+                return "done"
+
+        async def main():
+            task = asyncio.ensure_future(request())
+            await asyncio.sleep(0.05)
+            self.assertFalse(task.done())
+            threading.Timer(0.05, scheduler.release).start()
+            return await task
+
+        self.assertEqual(asyncio.run(main()), "done")
+        self.assertEqual(scheduler.get_stats()['active'], 0)
+
+class TestServiceScheduling(unittest.TestCase):
+    """Test AIService requests hold a scheduler slot and fall back when busy"""
+
+    def setUp(self):
+        """Build a service with a fake client and limiter"""
+        from assistant.ai_service import AIService
+        self.service = AIService.__new__(AIService)
+        self.service.client = MagicMock()
+        self.service.usage_limiter = MagicMock()
+        self.reservation = object()
+        self.service.usage_limiter.reserve_api_call.return_value = (self.reservation, "")
+
+    def test_busy_scheduler_releases_reservation(self):
+        """Test a turned-away request gives back its usage slot without calling OpenAI"""
+        scheduler = RequestScheduler(max_concurrent=1, max_queued=0)
+        scheduler.acquire("holder@test.com", "greeting")
+        with patch('assistant.ai_service.ai_scheduler', scheduler):
+            with self.assertRaises(SchedulerBusy):
+                self.service._chat_completion("greeting", "u@test.com", messages=[], max_tokens=10, temperature=0.7)
+        self.service.usage_limiter.release_api_call.assert_called_once_with(self.reservation)
+        self.service.client.chat.completions.create.assert_not_called()
+
+    def test_stream_holds_slot_until_it_ends(self):
+        """Test a streamed response keeps its slot until the last chunk"""
+        scheduler = RequestScheduler(max_concurrent=1)
+        self.service.client.chat.completions.create.return_value = iter([])
+        with patch('assistant.ai_service.ai_scheduler', scheduler):
+            chunks = self.service._chat_completion_stream("weekly_summary", "u@test.com", messages=[],
+                                                          max_tokens=10, temperature=0.7)
+            self.assertEqual(scheduler.get_stats()['active'], 1)
+            self.assertEqual(list(chunks), [])
+        self.assertEqual(scheduler.get_stats()['active'], 0)
+
+if __name__ == "__main__":
+    unittest.main()
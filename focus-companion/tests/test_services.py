@@ -0,0 +1,151 @@
+"""
+Tests for the process-wide service registry
+"""
+
+import unittest
+import unittest.mock
+import asyncio
+import tempfile
+import shutil
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+# Add the parent directory to Python path
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from assistant import services
+from assistant.ai_service import AIService
+from data.database import DatabaseManager
+
+class TestServiceRegistry(unittest.TestCase):
+    """Test the shared OpenAI client, usage limiter and database"""
+
+    def setUp(self):
+        """Start from an empty registry backed by a temporary database"""
+        services.reset_services()
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.temp_dir, "test.db"), pool_size=2)
+        self.db_patch = patch('assistant.services.get_database', return_value=self.db)
+        self.db_patch.start()
+
+    def tearDown(self):
+        """Clean up test environment"""
+        self.db_patch.stop()
+        services.reset_services()
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_client_is_shared(self):
+        """Test every caller and thread gets the same lazily created client"""
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'sk-test'}):
+            clients = []
+            threads = [threading.Thread(target=lambda: clients.append(services.get_openai_client())) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len({id(client) for client in clients}), 1)
+            self.assertIs(clients[0], services.get_openai_client())
+
+    def test_no_client_without_api_key(self):
+        """Test the client stays unset until a key is configured"""
+        with patch.dict(os.environ, {'OPENAI_API_KEY': ''}):
+            self.assertIsNone(services.get_openai_client())
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'sk-test'}):
+            self.assertIsNotNone(services.get_openai_client())
+
+    def test_ai_services_share_client_and_limiter(self):
+        """Test creating AIService on every rerun reuses the shared client, limiter and database"""
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'sk-test'}), \
+             patch.object(DatabaseManager, 'init_database') as init_database:
+            first, second = AIService(), AIService()
+            self.assertIs(first.client, second.client)
+            self.assertIs(first.usage_limiter, second.usage_limiter)
+            self.assertIs(first.usage_limiter.db, self.db)
+            init_database.assert_not_called()
+
+class FakeAsyncCompletions:
+    """Async chat completions that take a fixed time per feature prompt"""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.calls = 0
+
+    async def create(self, model, messages, max_tokens, temperature):
+        self.calls += 1
+        await asyncio.sleep(self.delays.get(max_tokens, 0.3))
+        return SimpleNamespace(
+            usage=SimpleNamespace(total_tokens=50),
+            choices=[SimpleNamespace(message=SimpleNamespace(content=f" reply {max_tokens} "))]
+        )
+
+class TestHomeContentFanOut(unittest.TestCase):
+    """Test the home page generations run concurrently with per-call timeouts"""
+
+    def setUp(self):
+        """Build a service with a fake limiter and cache"""
+        self.service = AIService.__new__(AIService)
+        self.service.can_use_feature = MagicMock(return_value=(True, ""))
+        self.service.usage_limiter = MagicMock()
+        self.service.usage_limiter.reserve_api_call.return_value = (object(), "")
+        self.cache = MagicMock()
+        self.cache.get_cached_or_stale.return_value = (None, False)
+        self.profile = {"goal": "Focus", "tone": "Friendly"}
+
+    def _generate(self, completions, **kwargs):
+        """Run generate_home_content against fake async completions"""
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        with patch('assistant.ai_service.get_async_openai_client', return_value=client), \
+             patch('assistant.ai_service.ai_cache', self.cache):
+            return self.service.generate_home_content(self.profile, [], [], "u@test.com", **kwargs)
+
+    def test_generations_run_concurrently(self):
+        """Test three 0.3s calls finish in about the time of one and are cached"""
+        completions = FakeAsyncCompletions({})
+        started = time.perf_counter()
+        results = self._generate(completions)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(results, {"greeting": "reply 100", "encouragement": "reply 80", "productivity_tip": "reply 150"})
+        self.assertEqual(completions.calls, 3)
+        self.assertLess(elapsed, 0.8)
+        self.assertEqual(self.cache.cache_response.call_count, 3)
+        self.assertEqual(self.service.usage_limiter.commit_api_call.call_count, 3)
+
+    def test_slow_call_misses_deadline_alone(self):
+        """Test a call past its deadline maps to None but finishes in the background and is cached"""
+        completions = FakeAsyncCompletions({100: 0.05, 80: 0.05, 150: 1})
+        with patch('assistant.ai_service.ai_cache', self.cache):
+            results = self._generate(completions, timeout=0.5)
+
+            self.assertEqual(results["greeting"], "reply 100")
+            self.assertEqual(results["encouragement"], "reply 80")
+            self.assertIsNone(results["productivity_tip"])
+            self.assertEqual(self.cache.cache_response.call_count, 2)
+
+            deadline = time.time() + 5
+            while self.cache.cache_response.call_count < 3 and time.time() < deadline:
+                time.sleep(0.05)
+
+        self.cache.cache_response.assert_called_with(
+            "productivity_tip", "u@test.com", unittest.mock.ANY, "reply 150", tokens_used=50,
+            # Without a prompt/completion split the total is priced at the completion rate
+            cost_usd=50 * 0.60 / 1_000_000)
+        self.service.usage_limiter.release_api_call.assert_not_called()
+        self.assertEqual(self.service.usage_limiter.commit_api_call.call_count, 3)
+
+    def test_cached_content_skips_api(self):
+        """Test cached features are served without a request"""
+        self.cache.get_cached_or_stale.return_value = ("Cached!", False)
+        completions = FakeAsyncCompletions({})
+        results = self._generate(completions, features=["greeting"])
+
+        self.assertEqual(results, {"greeting": "Cached!"})
+        self.assertEqual(completions.calls, 0)
+
+if __name__ == "__main__":
+    unittest.main()
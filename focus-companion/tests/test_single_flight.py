@@ -0,0 +1,139 @@
+"""
+Tests for single-flight request coalescing
+"""
+
+import unittest
+import threading
+import time
+from unittest.mock import patch, MagicMock
+
+# Add the parent directory to Python path
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from assistant.single_flight import SingleFlight
+
+class TestSingleFlight(unittest.TestCase):
+    """Test concurrent identical calls share one execution"""
+
+    def setUp(self):
+        """Set up a fresh single-flight group"""
+        self.flight = SingleFlight()
+
+    def _run_concurrently(self, key, fn, callers=5):
+        """Call do() from several threads while fn blocks; returns results and errors"""
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(self.flight.do(key, fn, feature="weekly_summary"))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        # Wait until every follower is parked on the leader's future
+        deadline = time.time() + 5
+        while self.flight.get_stats()['calls'] < callers and time.time() < deadline:
+            time.sleep(0.01)
+        return threads, results, errors
+
+    def test_concurrent_calls_are_coalesced(self):
+        """Test five concurrent callers share one call and its result"""
+        release = threading.Event()
+        fn = MagicMock(side_effect=lambda: release.wait(5) and "Summary!")
+
+        threads, results, errors = self._run_concurrently("key", fn)
+        self.assertEqual(self.flight.get_stats()['in_flight'], 1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        fn.assert_called_once()
+        self.assertEqual(results, ["Summary!"] * 5)
+        self.assertEqual(errors, [])
+        stats = self.flight.get_stats()
+        self.assertEqual((stats['calls'], stats['executed'], stats['coalesced'], stats['in_flight']), (5, 1, 4, 0))
+        self.assertEqual(stats['by_feature']['weekly_summary']['coalesced'], 4)
+
+    def test_errors_are_shared(self):
+        """Test waiters get the leader's exception and the key is released"""
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise RuntimeError("API down")
+
+        threads, results, errors = self._run_concurrently("key", fail, callers=3)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(all(isinstance(e, RuntimeError) for e in errors))
+        self.assertEqual(self.flight.get_stats()['failed'], 1)
+        self.assertEqual(self.flight.do("key", lambda: "Recovered"), "Recovered")
+
+    def test_sequential_and_distinct_keys_run_separately(self):
+        """Test only overlapping calls for the same key are coalesced"""
+        self.assertEqual(self.flight.do("a", lambda: 1), 1)
+        self.assertEqual(self.flight.do("a", lambda: 2), 2)
+        self.assertEqual(self.flight.do("b", lambda: 3), 3)
+        stats = self.flight.get_stats()
+        self.assertEqual((stats['executed'], stats['coalesced']), (3, 0))
+
+    def test_begin_and_finish(self):
+        """Test a call begun by hand is shared until finished, and finishing twice is harmless"""
+        call, leader = self.flight.begin("key", feature="weekly_summary")
+        follower, follows = self.flight.begin("key", feature="weekly_summary")
+        self.assertTrue(leader)
+        self.assertFalse(follows)
+        self.assertIs(follower, call)
+
+        self.flight.finish("key", call, "Streamed summary", feature="weekly_summary")
+        self.flight.finish("key", call, error=RuntimeError("late"), feature="weekly_summary")
+        self.assertEqual(follower.result(1), "Streamed summary")
+        stats = self.flight.get_stats()
+        self.assertEqual((stats['executed'], stats['coalesced'], stats['failed'], stats['in_flight']), (1, 1, 0, 0))
+
+class TestServiceCoalescing(unittest.TestCase):
+    """Test AIService shares one OpenAI call between identical weekly summary requests"""
+
+    def test_weekly_summary_coalesced(self):
+        """Test concurrent identical weekly summaries make one API call"""
+        from assistant.ai_service import AIService
+        service = AIService.__new__(AIService)
+        service.can_use_feature = MagicMock(return_value=(True, ""))
+        release = threading.Event()
+        service._chat_completion = MagicMock(side_effect=lambda *args, **kwargs: release.wait(5) and "Great week!")
+        cache = MagicMock()
+        cache.get_cached_response.return_value = None
+        cache.cache_key.return_value = "summary-key"
+        flight = SingleFlight()
+
+        week_analysis = {
+            "total_checkins": 2, "total_mood_entries": 1, "checkin_days": ["Monday"],
+            "energy_patterns": {}, "mood_patterns": {}
+        }
+        results = []
+        with patch('assistant.ai_service.ai_cache', cache), patch('assistant.ai_service.ai_single_flight', flight):
+            threads = [threading.Thread(target=lambda: results.append(
+                service.generate_weekly_summary({}, week_analysis, "u@test.com"))) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            deadline = time.time() + 5
+            while flight.get_stats()['calls'] < 3 and time.time() < deadline:
+                time.sleep(0.01)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+
+        service._chat_completion.assert_called_once()
+        cache.cache_response.assert_called_once()
+        self.assertEqual(results, ["Great week!"] * 3)
+        self.assertEqual(flight.get_stats()['coalesced'], 2)
+
+if __name__ == "__main__":
+    unittest.main()
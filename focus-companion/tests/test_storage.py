@@ -338,5 +338,91 @@ class TestStorageSystem(unittest.TestCase):
         self.assertTrue(os.path.exists(os.path.join(self.test_dir, "user_profile.json")))
 
 
+class TestUserDataCache(unittest.TestCase):
+    """Test cases for the version-stamped per-user data cache"""
+    
+    def setUp(self):
+        """Set up test environment with an empty cache"""
+        import data.storage as storage_module
+        self.storage = storage_module
+        self.test_dir = tempfile.mkdtemp()
+        self.original_paths = (storage_module.PROFILE_PATH, storage_module.MOOD_DATA_PATH,
+                               storage_module.CHECKIN_DATA_PATH)
+        storage_module.PROFILE_PATH = os.path.join(self.test_dir, "user_profile.json")
+        storage_module.MOOD_DATA_PATH = os.path.join(self.test_dir, "mood_data.json")
+        storage_module.CHECKIN_DATA_PATH = os.path.join(self.test_dir, "checkin_data.json")
+        storage_module.user_data_cache.clear()
+    
+    def tearDown(self):
+        """Clean up test environment"""
+        (self.storage.PROFILE_PATH, self.storage.MOOD_DATA_PATH,
+         self.storage.CHECKIN_DATA_PATH) = self.original_paths
+        shutil.rmtree(self.test_dir)
+    
+    def test_repeated_loads_hit_cache(self):
+        """Test unchanged data is served without reading storage again"""
+        save_mood_data({"timestamp": "2024-01-15T10:30:00", "mood": "😊 Happy"})
+        load_mood_data()
+        
+        with patch.object(self.storage, "_read_mood_data") as read:
+            for _ in range(3):
+                self.assertEqual(len(load_mood_data()), 1)
+            read.assert_not_called()
+        
+        stats = self.storage.get_cache_stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 3)
+    
+    def test_save_bumps_version(self):
+        """Test saving invalidates the cached snapshot"""
+        save_checkin_data({"timestamp": "2024-01-15T08:00:00", "time_period": "morning"})
+        self.assertEqual(len(load_checkin_data()), 1)
+        
+        save_checkin_data({"timestamp": "2024-01-15T14:00:00", "time_period": "afternoon"})
+        self.assertEqual(len(load_checkin_data()), 2)
+        self.assertEqual(self.storage.get_cache_stats()["misses"], 2)
+    
+    def test_callers_cannot_change_snapshot(self):
+        """Test mutating a loaded list, entry or profile does not leak into the cache"""
+        save_user_profile({"goal": "Focus"})
+        save_mood_data({"timestamp": "2024-01-15T10:30:00", "mood": "😌 Calm"})
+        save_checkin_data({"timestamp": "2024-01-15T09:00:00", "energy_level": "High"})
+        
+        load_user_profile()["goal"] = "Changed"
+        load_mood_data().append({"mood": "extra"})
+        load_mood_data()[0]["note"] = "Edited"
+        load_checkin_data()[0]["type"] = "checkin"
+        
+        self.assertEqual(load_user_profile(), {"goal": "Focus"})
+        self.assertEqual(load_mood_data(), [{"timestamp": "2024-01-15T10:30:00", "mood": "😌 Calm"}])
+        self.assertEqual(load_checkin_data(), [{"timestamp": "2024-01-15T09:00:00", "energy_level": "High"}])
+    
+    def test_nested_values_are_not_shared(self):
+        """Test editing a loaded entry's nested plan or list does not leak into the cache"""
+        save_checkin_data({"timestamp": "2024-01-15T09:00:00", "task_plan": {"tasks": ["Draft"]},
+                           "task_completion": {"Draft": False}})
+        
+        entry = load_checkin_data()[0]
+        entry["task_plan"]["tasks"].append("Extra")
+        entry["task_completion"]["Draft"] = True
+        
+        reloaded = load_checkin_data()[0]
+        self.assertEqual(reloaded["task_plan"], {"tasks": ["Draft"]})
+        self.assertEqual(reloaded["task_completion"], {"Draft": False})
+    
+    def test_lru_eviction(self):
+        """Test the cache stays bounded and evicts least recently used users"""
+        self.storage.user_data_cache.max_entries = 2
+        try:
+            for user in ["a@test.com", "b@test.com", "c@test.com"]:
+                self.storage.user_data_cache.get("mood", user, list)
+            
+            stats = self.storage.get_cache_stats()
+            self.assertEqual(stats["entries"], 2)
+            self.assertEqual(stats["evictions"], 1)
+        finally:
+            self.storage.user_data_cache.max_entries = 256
+
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
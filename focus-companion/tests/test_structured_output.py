@@ -0,0 +1,203 @@
+"""
+Tests for schema-validated task plan output and its local repair
+"""
+
+import unittest
+import tempfile
+import shutil
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+# Add the parent directory to Python path
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from assistant.structured_output import (
+    StructuredOutputParser, TASK_PLAN_SCHEMA, repair_json, fit_schema, partial_list
+)
+from assistant.model_router import ModelRouter
+from data.database import DatabaseManager
+from assistant.usage_limiter import UsageLimiter
+
+def completion(content):
+    """A chat completion response"""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(prompt_tokens=100, completion_tokens=50, total_tokens=150)
+    )
+
+class TestRepairJson(unittest.TestCase):
+    """Test the usual JSON slips are repaired without a model call"""
+
+    def test_clean_json_needs_no_repair(self):
+        """Test valid JSON parses as is"""
+        self.assertEqual(repair_json('{"tasks": ["a"]}'), ({"tasks": ["a"]}, []))
+
+    def test_code_fence_and_prose(self):
+        """Test fenced output and prose around the object are stripped"""
+        value, repairs = repair_json('```json\n{"tasks": ["a"]}\n```')
+        self.assertEqual((value, repairs), ({"tasks": ["a"]}, ["code_fence"]))
+        value, repairs = repair_json('Here is your plan: {"tasks": ["a"]} Good luck!')
+        self.assertEqual((value, repairs), ({"tasks": ["a"]}, ["surrounding_text"]))
+
+    def test_trailing_commas(self):
+        """Test trailing commas in objects and lists are removed"""
+        value, repairs = repair_json('{"tasks": ["a", "b",], "estimated_duration": "1 hour",}')
+        self.assertEqual(value, {"tasks": ["a", "b"], "estimated_duration": "1 hour"})
+        self.assertEqual(repairs, ["trailing_comma"])
+
+    def test_beyond_repair(self):
+        """Test prose and non-object JSON are rejected"""
+        self.assertIsNone(repair_json("Sorry, I can't help with that.")[0])
+        self.assertIsNone(repair_json('["a", "b"]')[0])
+        self.assertIsNone(repair_json('{"tasks": ["a"')[0])
+
+class TestFitSchema(unittest.TestCase):
+    """Test parsed plans are coerced to the task plan schema"""
+
+    def test_missing_fields_come_from_defaults(self):
+        """Test optional fields are filled from defaults, which are only built when needed"""
+        defaults = MagicMock(return_value={"recommendations": ["Rest"], "estimated_duration": "2 hours",
+                                           "priority_order": "energy_based"})
+        plan, repairs = fit_schema({"tasks": ["a"], "personalized_note": "You got this"}, TASK_PLAN_SCHEMA, defaults)
+        self.assertEqual(plan["recommendations"], ["Rest"])
+        self.assertEqual(plan["personalized_note"], "You got this")
+        self.assertIn("default_estimated_duration", repairs)
+        defaults.assert_called_once()
+
+        complete = {"tasks": ["a"], "recommendations": ["b"], "estimated_duration": "1h",
+                    "priority_order": "goal_based", "personalized_note": "Hi"}
+        defaults.reset_mock()
+        self.assertEqual(fit_schema(complete, TASK_PLAN_SCHEMA, defaults), (complete, []))
+        defaults.assert_not_called()
+
+    def test_items_are_coerced_to_text(self):
+        """Test task objects and bulleted text become lists of strings"""
+        plan, repairs = fit_schema({"tasks": [{"title": "Draft"}, "Review", 3, None],
+                                    "recommendations": "- Take breaks\n- Drink water"}, TASK_PLAN_SCHEMA)
+        self.assertEqual(plan["tasks"], ["Draft", "Review", "3"])
+        self.assertEqual(plan["recommendations"], ["Take breaks", "Drink water"])
+        self.assertEqual(repairs, ["recommendations_as_list"])
+
+    def test_tasks_are_required(self):
+        """Test a plan without tasks can't be repaired"""
+        self.assertIsNone(fit_schema({"recommendations": ["b"]}, TASK_PLAN_SCHEMA)[0])
+        self.assertIsNone(fit_schema({"tasks": []}, TASK_PLAN_SCHEMA)[0])
+
+class TestPartialList(unittest.TestCase):
+    """Test list items are read from JSON that is still streaming"""
+
+    def test_only_complete_items(self):
+        """Test items appear once complete, objects give their text"""
+        self.assertEqual(partial_list('{"tasks": ["Draft", {"task": "Outline"}, "Rev', 'tasks'), ["Draft", "Outline"])
+        self.assertEqual(partial_list('{"tasks": ["Draft"], "note": "x"}', 'tasks'), ["Draft"])
+        self.assertEqual(partial_list('{"tas', 'tasks'), [])
+
+class TestParser(unittest.TestCase):
+    """Test checked responses are counted by outcome"""
+
+    def test_stats(self):
+        """Test valid, repaired and invalid responses and their repairs are counted"""
+        parser = StructuredOutputParser(TASK_PLAN_SCHEMA)
+        self.assertTrue(parser.check('{"tasks": ["a"], "recommendations": [], "estimated_duration": "1h"}'))
+        self.assertTrue(parser.check('```json\n{"tasks": ["a"],}\n```'))
+        self.assertFalse(parser.check("Sorry"))
+        # parse() is for cached responses and isn't counted
+        self.assertEqual(parser.parse('{"tasks": ["a"]}'), {"tasks": ["a"]})
+
+        stats = parser.get_stats()
+        self.assertEqual((stats['responses'], stats['valid'], stats['repaired'], stats['invalid']), (3, 1, 1, 1))
+        self.assertEqual(stats['repairs'], {'code_fence': 1, 'trailing_comma': 1})
+
+class TestServiceTaskPlans(unittest.TestCase):
+    """Test AIService repairs plans locally and re-asks only as a last resort"""
+
+    def setUp(self):
+        """Build a service with a fake client, limiter and cache"""
+        from assistant.ai_service import AIService
+        self.service = AIService.__new__(AIService)
+        self.service.can_use_feature = MagicMock(return_value=(True, ""))
+        self.service.client = MagicMock()
+        self.service.usage_limiter = MagicMock()
+        self.service.usage_limiter.reserve_api_call.return_value = (object(), "")
+        self.cache = MagicMock()
+        self.cache.get_cached_response.return_value = None
+        self.checkin = {"time_period": "morning", "energy_level": "High", "sleep_quality": "Good",
+                        "focus_today": "Write report"}
+        self.patches = [patch('assistant.ai_service.ai_cache', self.cache),
+                        patch('assistant.ai_service.model_router', ModelRouter()),
+                        patch('assistant.ai_service.st', MagicMock())]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        """Remove patches"""
+        for p in self.patches:
+            p.stop()
+
+    def _plan(self, *responses):
+        """Generate a task plan against canned responses"""
+        self.service.client.chat.completions.create.side_effect = [completion(r) for r in responses]
+        return self.service.generate_ai_task_plan({"goal": "Focus"}, self.checkin, [], "u@test.com")
+
+    def test_json_mode_is_requested(self):
+        """Test task plans ask for a JSON object"""
+        self._plan('{"tasks": ["Outline the report"]}')
+        kwargs = self.service.client.chat.completions.create.call_args.kwargs
+        self.assertEqual(kwargs['response_format'], {"type": "json_object"})
+
+    def test_repairable_plan_is_not_re_asked(self):
+        """Test a fenced plan with a trailing comma is repaired, filled in and cached in one call"""
+        plan = self._plan('```json\n{"tasks": ["Outline the report", "Write the intro",],}\n```')
+
+        self.assertEqual(plan["tasks"], ["Outline the report", "Write the intro"])
+        # Missing fields come from the rule-based plan for the same check-in
+        self.assertTrue(plan["recommendations"])
+        self.assertEqual(plan["priority_order"], "energy_based")
+        self.service.client.chat.completions.create.assert_called_once()
+        self.assertIsNone(self.service.usage_limiter.commit_api_call.call_args.kwargs['error_message'])
+        self.cache.cache_response.assert_called_once()
+
+    def test_unusable_plan_is_recorded_and_re_asked(self):
+        """Test a response beyond repair is recorded as failed and re-asked on the next model"""
+        plan = self._plan("I'm sorry, I can't create a plan.", '{"tasks": ["Outline the report"]}')
+
+        self.assertEqual(plan["tasks"], ["Outline the report"])
+        commits = self.service.usage_limiter.commit_api_call.call_args_list
+        self.assertEqual([call.kwargs['error_message'] for call in commits], ["Invalid structured output", None])
+
+    def test_cached_plan_is_repaired_on_read(self):
+        """Test a cached plan in a code fence is served without a request"""
+        self.cache.get_cached_response.return_value = '```json\n{"tasks": ["Cached task"]}\n```'
+        plan = self.service.generate_ai_task_plan({"goal": "Focus"}, self.checkin, [], "u@test.com")
+        self.assertEqual(plan["tasks"], ["Cached task"])
+        self.service.client.chat.completions.create.assert_not_called()
+
+class TestFailuresRecorded(unittest.TestCase):
+    """Test unusable responses are stored as failed calls"""
+
+    def setUp(self):
+        """Set up a temporary database"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.temp_dir, "test.db"), write_behind=False)
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_failures_roll_up(self):
+        """Test failed calls still count against limits and roll up per feature"""
+        limiter = UsageLimiter(db=self.db)
+        for error in (None, None, None, "Invalid structured output"):
+            reservation, _ = limiter.reserve_api_call("u@test.com", "task_planning")
+            limiter.commit_api_call(reservation, tokens_used=150, cost_usd=0.001, error_message=error)
+
+        failures = self.db.get_output_failures(days=1)["task_planning"]
+        self.assertEqual((failures["calls"], failures["failed"], failures["failure_rate"]), (4, 1, 25.0))
+        self.assertAlmostEqual(failures["wasted_cost_usd"], 0.001)
+        self.assertEqual(limiter.counter.get_counts("u@test.com")["user_daily"], 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Tests for incrementally loaded user timelines
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+from unittest.mock import patch
+
+# Add the parent directory to Python path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from data.database import DatabaseManager
+from data.timeline import UserTimeline
+
+class TestDeltaQueries(unittest.TestCase):
+    """Test the id-based delta reads on DatabaseManager"""
+
+    def setUp(self):
+        """Set up a temporary database"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.temp_dir, "test.db"), write_behind=False)
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_mood_logs_since(self):
+        """Test only rows after the given id are returned, oldest first"""
+        for intensity in range(3):
+            self.db.save_mood_log("a@test.com", "😌 Calm", intensity)
+        self.db.save_mood_log("b@test.com", "😊 Happy", 9)
+
+        logs = self.db.get_mood_logs_since("a@test.com")
+        self.assertEqual([log["intensity"] for log in logs], [0, 1, 2])
+
+        newer = self.db.get_mood_logs_since("a@test.com", last_id=logs[0]["id"])
+        self.assertEqual([log["intensity"] for log in newer], [1, 2])
+
+    def test_checkins_since(self):
+        """Test check-in deltas decode the task columns"""
+        self.db.save_checkin("a@test.com", {"time_period": "morning", "task_plan": {"tasks": ["write"]}})
+
+        checkins = self.db.get_checkins_since("a@test.com")
+        self.assertEqual(checkins[0]["task_plan"], {"tasks": ["write"]})
+        self.assertEqual(self.db.get_checkins_since("a@test.com", last_id=checkins[0]["id"]), [])
+
+    def test_delta_query_uses_id_index(self):
+        """Test the delta read is an index range search on (user_email, id)"""
+        with self.db.connection() as conn:
+            plan = conn.execute("""
+                EXPLAIN QUERY PLAN
+                SELECT id FROM mood_logs WHERE user_email = ? AND id > ? AND created_at_epoch >= ? ORDER BY id
+            """, ("a@test.com", 10, 0)).fetchall()
+
+        self.assertIn("USING INDEX idx_mood_logs_user_id (user_email=? AND id>?)", plan[0][3])
+
+class TestUserTimeline(unittest.TestCase):
+    """Test the per-user timeline only fetches new rows"""
+
+    def setUp(self):
+        """Set up a timeline on a temporary database"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.temp_dir, "test.db"), write_behind=False)
+        self.timeline = UserTimeline(self.db, "a@test.com")
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_entries_newest_first_in_legacy_format(self):
+        """Test entries match the legacy JSON format and order"""
+        self.db.save_mood_log("a@test.com", "😌 Calm", 4, "first")
+        self.db.save_mood_log("a@test.com", "😊 Happy", 8, "second")
+
+        entries = self.timeline.mood_entries()
+
+        self.assertEqual([e["notes"] for e in entries], ["second", "first"])
+        self.assertEqual(set(entries[0]), {"mood", "intensity", "notes", "timestamp"})
+
+    def test_repeated_reads_only_fetch_new_rows(self):
+        """Test later reads ask for rows after the last seen id"""
+        self.db.save_checkin("a@test.com", {"time_period": "morning"})
+        self.assertEqual(len(self.timeline.checkin_entries()), 1)
+        first_id = self.timeline._last_checkin_id
+
+        self.db.save_checkin("a@test.com", {"time_period": "evening"})
+        fetched = []
+        real_since = self.db.get_checkins_since
+
+        def since(*args):
+            rows = real_since(*args)
+            fetched.extend(rows)
+            return rows
+
+        with patch.object(self.db, "get_checkins_since", side_effect=since) as mock_since:
+            entries = self.timeline.checkin_entries()
+
+        self.assertEqual(mock_since.call_args[0][1], first_id)
+        self.assertEqual([row["time_period"] for row in fetched], ["evening"])
+        self.assertEqual([e["time_period"] for e in entries], ["evening", "morning"])
+
+    def test_reset_reloads_after_delete(self):
+        """Test a reset timeline drops rows deleted from the database"""
+        self.db.save_mood_log("a@test.com", "😌 Calm", 4)
+        self.assertEqual(len(self.timeline.mood_entries()), 1)
+
+        self.db.delete_user_data("a@test.com")
+        self.timeline.reset()
+
+        self.assertEqual(self.timeline.mood_entries(), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,235 @@
+"""
+Tests for the usage limiter and its in-memory usage counters
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+# Add the parent directory to Python path
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from data.database import DatabaseManager
+from assistant.usage_limiter import UsageLimiter, UsageCounter
+
+class TestUsageCounter(unittest.TestCase):
+    """Test the rolling day/month counters"""
+
+    def setUp(self):
+        """Set up a temporary database"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.temp_dir, "test.db"), write_behind=False)
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_seeded_from_database(self):
+        """Test counters start from existing api_usage rows"""
+        self.db.record_api_usage("a@test.com", "greeting")
+        self.db.record_api_usage("a@test.com", "greeting")
+        self.db.record_api_usage("b@test.com", "weekly_summary")
+
+        counts = UsageCounter(self.db).get_counts("a@test.com")
+
+        self.assertEqual(counts["global_daily"], 3)
+        self.assertEqual(counts["global_monthly"], 3)
+        self.assertEqual(counts["user_daily"], 2)
+        self.assertEqual(counts["user_monthly"], 2)
+
+    def test_increment_does_not_query_database(self):
+        """Test checks after seeding are answered from memory"""
+        counter = UsageCounter(self.db)
+        counter.get_counts()
+
+        with patch.object(self.db, "get_api_call_counts") as query:
+            counter.increment("a@test.com")
+            counts = counter.get_counts("a@test.com")
+            query.assert_not_called()
+
+        self.assertEqual(counts["user_daily"], 1)
+        self.assertEqual(counts["global_monthly"], 1)
+
+    def test_periodic_reconciliation(self):
+        """Test rows written elsewhere are picked up on reconciliation"""
+        counter = UsageCounter(self.db, reconcile_interval=0)
+        self.assertEqual(counter.get_counts()["global_daily"], 0)
+
+        self.db.record_api_usage("a@test.com", "greeting")
+
+        self.assertEqual(counter.get_counts()["global_daily"], 1)
+
+    def test_day_rollover_resets_daily_counts(self):
+        """Test daily buckets reset while monthly buckets carry over"""
+        counter = UsageCounter(self.db)
+        with patch.object(UsageCounter, "_current_periods", return_value=("2024-01-15", "2024-01")):
+            counter.reconcile()
+            counter.increment("a@test.com")
+        with patch.object(UsageCounter, "_current_periods", return_value=("2024-01-16", "2024-01")):
+            counts = counter.get_counts("a@test.com")
+
+        self.assertEqual(counts["user_daily"], 0)
+        self.assertEqual(counts["user_monthly"], 1)
+
+class TestUsageLimiter(unittest.TestCase):
+    """Test limit enforcement"""
+
+    def setUp(self):
+        """Set up a limiter on a temporary database"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.temp_dir, "test.db"), write_behind=False)
+        self.limiter = UsageLimiter(db=self.db)
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_user_daily_limit(self):
+        """Test a user is blocked once their daily limit is used"""
+        for _ in range(self.limiter.user_daily_limit):
+            allowed, _ = self.limiter.can_make_api_call("user@test.com")
+            self.assertTrue(allowed)
+            self.limiter.record_api_call("user@test.com", "greeting")
+
+        allowed, reason = self.limiter.can_make_api_call("user@test.com")
+        self.assertFalse(allowed)
+        self.assertIn("daily limit", reason)
+
+        # Other users are unaffected
+        allowed, _ = self.limiter.can_make_api_call("other@test.com")
+        self.assertTrue(allowed)
+
+    def test_usage_stats_counts(self):
+        """Test usage stats report counter values"""
+        self.limiter.record_api_call("user@test.com", "greeting", tokens_used=10, cost_usd=0.5)
+
+        stats = self.limiter.get_usage_stats("user@test.com")
+
+        self.assertEqual(stats["global"]["daily_used"], 1)
+        self.assertEqual(stats["user"]["monthly_used"], 1)
+        self.assertAlmostEqual(stats["user"]["total_cost"], 0.5)
+
+class TestUsageReservations(unittest.TestCase):
+    """Test the atomic check-and-reserve API"""
+
+    def setUp(self):
+        """Set up a limiter on a temporary database"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.temp_dir, "test.db"), write_behind=False)
+        self.limiter = UsageLimiter(db=self.db)
+
+    def tearDown(self):
+        """Clean up the temporary database"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_commit_records_call(self):
+        """Test a committed reservation becomes an api_usage row"""
+        reservation, _ = self.limiter.reserve_api_call("user@test.com", "greeting")
+        self.assertIsNotNone(reservation)
+        self.assertEqual(self.limiter.counter.get_counts("user@test.com")["user_daily"], 1)
+
+        self.limiter.commit_api_call(reservation, tokens_used=42, cost_usd=0.01)
+
+        usage = self.db.get_user_api_usage("user@test.com", days=1)
+        self.assertEqual(usage["feature_usage"], {"greeting": 1})
+        self.assertEqual(self.limiter.counter.get_counts("user@test.com")["user_daily"], 1)
+        self.assertEqual(self.limiter.counter.pending_reservations(), 0)
+
+    def test_release_frees_slot(self):
+        """Test a released reservation gives its slot back without recording"""
+        reservation, _ = self.limiter.reserve_api_call("user@test.com", "greeting")
+        self.limiter.release_api_call(reservation)
+
+        self.assertEqual(self.limiter.counter.get_counts("user@test.com")["user_daily"], 0)
+        self.assertEqual(self.db.get_database_stats()["api_usage_count"], 0)
+
+    def test_reservations_survive_reconciliation(self):
+        """Test in-flight reservations still count after the counters are rebuilt"""
+        reservation, _ = self.limiter.reserve_api_call("user@test.com", "greeting")
+        self.limiter.counter.reconcile()
+
+        self.assertEqual(self.limiter.counter.get_counts("user@test.com")["user_daily"], 1)
+        self.limiter.release_api_call(reservation)
+
+    def test_commit_writes_outside_the_lock(self):
+        """Test other callers can check limits while a commit is writing to the database"""
+        reservation, _ = self.limiter.reserve_api_call("user@test.com", "greeting")
+        counter = self.limiter.counter
+        checked = []
+
+        def write():
+            # Runs on another thread so a held lock would time out instead of deadlocking the test
+            reader = threading.Thread(target=lambda: checked.append(counter.get_counts("user@test.com")))
+            reader.start()
+            reader.join(2)
+            return True
+
+        counter.commit(reservation, write)
+
+        self.assertEqual(checked, [{"global_daily": 1, "global_monthly": 1, "user_daily": 1, "user_monthly": 1}])
+        self.assertEqual(counter.get_counts("user@test.com")["user_daily"], 1)
+        self.assertEqual(counter.pending_reservations(), 0)
+
+    def test_reconcile_queries_outside_the_lock(self):
+        """Test calls recorded while the reconcile query runs are neither blocked nor lost"""
+        counter = self.limiter.counter
+        counter.get_counts()
+        query = self.db.get_api_call_counts
+
+        def record_call():
+            reservation, _ = self.limiter.reserve_api_call("user@test.com", "greeting")
+            self.limiter.commit_api_call(reservation)
+
+        def slow_query(since):
+            rows = query(since=since)
+            # Another thread records a call after the query has read the table
+            recorder = threading.Thread(target=record_call)
+            recorder.start()
+            recorder.join(2)
+            self.assertFalse(recorder.is_alive())
+            return rows
+
+        with patch.object(self.db, "get_api_call_counts", side_effect=slow_query):
+            counter.reconcile()
+
+        self.assertEqual(counter.get_counts("user@test.com")["user_daily"], 1)
+        self.assertEqual(counter.pending_reservations(), 0)
+
+    def test_parallel_reservations_never_exceed_limits(self):
+        """Stress test: hundreds of concurrent reservations respect every limit"""
+        users = [f"user{i}@test.com" for i in range(10)]
+        granted = []
+        lock = threading.Lock()
+
+        def attempt(index):
+            user = users[index % len(users)]
+            reservation, _ = self.limiter.reserve_api_call(user, "task_planning")
+            if reservation is None:
+                return
+            # Fail every fifth call to exercise release alongside commit
+            if index % 5 == 0:
+                self.limiter.release_api_call(reservation)
+            else:
+                self.limiter.commit_api_call(reservation, tokens_used=100, cost_usd=0.0002)
+                with lock:
+                    granted.append(user)
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            list(pool.map(attempt, range(500)))
+
+        self.assertEqual(len(granted), self.limiter.daily_limit)
+        for user in users:
+            self.assertLessEqual(granted.count(user), self.limiter.user_daily_limit)
+        self.assertEqual(self.db.get_database_stats()["api_usage_count"], self.limiter.daily_limit)
+        self.assertEqual(self.limiter.counter.pending_reservations(), 0)
+
+if __name__ == "__main__":
+    unittest.main()
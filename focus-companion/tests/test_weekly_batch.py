@@ -0,0 +1,145 @@
+"""
+Tests for batch pre-generation of weekly summaries
+"""
+
+import unittest
+import asyncio
+import tempfile
+import shutil
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+# Add the parent directory to Python path
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from assistant.weekly_analysis import build_week_analysis, get_week_date_range
+from assistant.ai_cache import AICache
+from assistant.ai_service import AIService
+from data.database import DatabaseManager
+from weekly_summary_batch_cli import collect_jobs
+
+def week_analysis(checkins):
+    """The analysis of a week with the given number of check-ins today"""
+    now = datetime.now().isoformat()
+    return build_week_analysis([{"timestamp": now, "energy_level": "High"}] * checkins, [])
+
+class FakeAsyncCompletions:
+    """Async chat completions that track how many run at once"""
+
+    def __init__(self, fail_for=None):
+        self.fail_for = fail_for
+        self.running = 0
+        self.peak = 0
+
+    async def create(self, model, messages, max_tokens, temperature):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(0.05)
+            if self.fail_for and self.fail_for in messages[1]['content']:
+                raise RuntimeError("model error")
+            return SimpleNamespace(
+                usage=SimpleNamespace(prompt_tokens=200, completion_tokens=100, total_tokens=300),
+                choices=[SimpleNamespace(message=SimpleNamespace(content=" Great week! "))]
+            )
+        finally:
+            self.running -= 1
+
+class TestWeekAnalysis(unittest.TestCase):
+    """Test the shared week analysis"""
+
+    def test_only_the_week_of_today_counts(self):
+        """Test entries outside Monday-Sunday of the given day are left out"""
+        today = datetime(2025, 3, 12)  # A Wednesday
+        self.assertEqual(get_week_date_range(today), (datetime(2025, 3, 10).date(), datetime(2025, 3, 16).date()))
+        checkins = [{"timestamp": "2025-03-10T09:00:00", "energy_level": "High", "time_period": "morning"},
+                    {"timestamp": "2025-03-09T09:00:00", "energy_level": "Low", "time_period": "morning"}]
+        moods = [{"timestamp": "2025-03-11T18:00:00", "mood": "Calm", "intensity": 7}]
+
+        analysis = build_week_analysis(checkins, moods, today)
+        self.assertEqual((analysis['total_checkins'], analysis['total_mood_entries']), (1, 1))
+        self.assertEqual(analysis['energy_patterns'], {"Monday": ["High"]})
+        self.assertIsNone(build_week_analysis(checkins[1:], [], today))
+
+class TestWeeklyBatch(unittest.TestCase):
+    """Test summaries are pre-generated for active users and served from the cache"""
+
+    def setUp(self):
+        """Set up a database with two users, one active this week, and a fresh cache"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.temp_dir, "test.db"), write_behind=False)
+        for user_email in ("active@test.com", "idle@test.com", "busy@test.com"):
+            self.db.save_user_profile(user_email, {"goal": "Focus", "tone": "Friendly"})
+        for user_email in ("active@test.com", "busy@test.com"):
+            self.db.save_checkin(user_email, {"time_period": "morning", "energy_level": "High",
+                                              "focus_today": "Write"})
+            self.db.save_mood_log(user_email, "Calm", 7)
+
+        self.cache = AICache(os.path.join(self.temp_dir, "ai_cache.json"))
+        self.service = AIService.__new__(AIService)
+        self.service.can_use_feature = MagicMock(return_value=(True, ""))
+        self.service.usage_limiter = MagicMock()
+        self.service.usage_limiter.reserve_api_call.return_value = (object(), "")
+
+    def tearDown(self):
+        """Clean up the database and cache"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def _pregenerate(self, completions, jobs, **kwargs):
+        """Run the batch against fake async completions and the test cache"""
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        with patch('assistant.ai_service.get_async_openai_client', return_value=client), \
+             patch('assistant.ai_service.ai_cache', self.cache):
+            return self.service.pregenerate_weekly_summaries(jobs, **kwargs)
+
+    def test_jobs_cover_active_users(self):
+        """Test users without activity this week are left out"""
+        jobs = collect_jobs(self.db, self.db.get_user_emails())
+        self.assertEqual([job['user_email'] for job in jobs], ["active@test.com", "busy@test.com"])
+        self.assertEqual(jobs[0]['week_analysis']['total_checkins'], 1)
+
+    def test_summaries_are_cached_for_the_page(self):
+        """Test generated summaries are hits for the page's request, and reruns skip them"""
+        jobs = collect_jobs(self.db, self.db.get_user_emails())
+        outcomes = self._pregenerate(FakeAsyncCompletions(), jobs)
+        self.assertEqual({status for status, _ in outcomes.values()}, {"generated"})
+
+        for job in jobs:
+            request = self.service._weekly_summary_request(job['user_profile'], job['week_analysis'])
+            self.assertEqual(self.cache.get_cached_response("weekly_summary", job['user_email'], request['input_data']),
+                             "Great week!")
+        self.assertEqual(self.service.usage_limiter.commit_api_call.call_count, 2)
+
+        outcomes = self._pregenerate(FakeAsyncCompletions(), jobs)
+        self.assertEqual({status for status, _ in outcomes.values()}, {"cached"})
+        self.assertEqual(self.service.usage_limiter.commit_api_call.call_count, 2)
+
+    def test_parallelism_is_bounded(self):
+        """Test no more than concurrency summaries are generated at once"""
+        jobs = [{'user_email': f"u{i}@test.com", 'user_profile': {"goal": "Focus"},
+                 'week_analysis': week_analysis(i + 1)} for i in range(6)]
+        completions = FakeAsyncCompletions()
+        outcomes = self._pregenerate(completions, jobs, concurrency=2)
+        self.assertEqual(len(outcomes), 6)
+        self.assertEqual(completions.peak, 2)
+
+    def test_failures_and_limits_are_reported(self):
+        """Test a failed call and a limited user are reported without stopping the batch"""
+        self.service.can_use_feature = MagicMock(side_effect=lambda feature, user_email: (
+            (False, "Daily limit reached") if user_email == "busy@test.com" else (True, "")))
+        jobs = collect_jobs(self.db, self.db.get_user_emails())
+        jobs.append({'user_email': "broken@test.com", 'user_profile': {"goal": "Broken"},
+                     'week_analysis': week_analysis(9)})
+
+        outcomes = self._pregenerate(FakeAsyncCompletions(fail_for="9 check-ins"), jobs)
+        self.assertEqual(outcomes["active@test.com"][0], "generated")
+        self.assertEqual(outcomes["busy@test.com"], ("skipped", "Daily limit reached"))
+        self.assertEqual(outcomes["broken@test.com"], ("failed", "model error"))
+        self.service.usage_limiter.release_api_call.assert_called_once()
+
+if __name__ == "__main__":
+    unittest.main()
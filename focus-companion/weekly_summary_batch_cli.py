@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Command-line batch pre-generation of weekly summaries
+Generates the week's summary for every user with activity and stores it in the
+AI cache, so opening the weekly summary page is a cache hit instead of a slow
+OpenAI call. Run it on a schedule, e.g. nightly from cron.
+"""
+
+import sys
+import os
+import argparse
+from datetime import datetime
+from typing import Dict, Any, List
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from data.database import DatabaseManager
+from data.timeline import UserTimeline
+from assistant.weekly_analysis import build_week_analysis, get_week_date_range
+
+def collect_jobs(db: DatabaseManager, user_emails: List[str], today: datetime = None) -> List[Dict[str, Any]]:
+    """Build each user's week analysis from the database, like the weekly summary page; inactive users are left out"""
+    jobs = []
+    for user_email in user_emails:
+        user_profile = db.get_user_profile(user_email)
+        if not user_profile:
+            continue
+        # Same history window as data.storage, so the analysis (and its cache key) matches the page's
+        timeline = UserTimeline(db, user_email, days=365)
+        week_analysis = build_week_analysis(timeline.checkin_entries(), timeline.mood_entries(), today)
+        if week_analysis:
+            jobs.append({'user_email': user_email, 'user_profile': user_profile, 'week_analysis': week_analysis})
+    return jobs
+
+def main():
+    parser = argparse.ArgumentParser(description='Focus Companion Weekly Summary Pre-generation')
+    parser.add_argument('--user', '-u', action='append', help='Only this user (repeatable)')
+    parser.add_argument('--date', '-d', help='A day in the week to summarize, YYYY-MM-DD (default: today)')
+    parser.add_argument('--concurrency', '-c', type=int, default=4, help='Summaries generated at once (default: 4)')
+    parser.add_argument('--force', '-f', action='store_true', help='Regenerate summaries that are already cached')
+    parser.add_argument('--dry-run', action='store_true', help='List the users that would be summarized')
+
+    args = parser.parse_args()
+
+    today = datetime.strptime(args.date, "%Y-%m-%d") if args.date else None
+    start_date, end_date = get_week_date_range(today)
+
+    from assistant.services import get_database
+    db = get_database()
+    user_emails = args.user or db.get_user_emails()
+    jobs = collect_jobs(db, user_emails, today)
+
+    print("🗓️ Weekly Summary Pre-generation")
+    print("=" * 60)
+    print(f"Week of {start_date.strftime('%B %d')} - {end_date.strftime('%B %d, %Y')}: "
+          f"{len(jobs)} of {len(user_emails)} users with activity")
+
+    if args.dry_run or not jobs:
+        for job in jobs:
+            analysis = job['week_analysis']
+            print(f"   • {job['user_email']}: {analysis['total_checkins']} check-ins, "
+                  f"{analysis['total_mood_entries']} mood entries")
+        return
+
+    from assistant.ai_service import AIService
+    outcomes = AIService().pregenerate_weekly_summaries(jobs, concurrency=args.concurrency, force=args.force)
+
+    counts = {}
+    for user_email, (status, detail) in sorted(outcomes.items()):
+        counts[status] = counts.get(status, 0) + 1
+        print(f"   • {user_email}: {status}" + (f" ({detail})" if detail else ""))
+
+    print("=" * 60)
+    print(f"✅ {counts.get('generated', 0)} generated, {counts.get('cached', 0)} already cached, "
+          f"{counts.get('skipped', 0)} skipped, {counts.get('failed', 0)} failed")
+
+if __name__ == "__main__":
+    main()